@@ -1,9 +1,18 @@
+import time
+LOAD_START = time.perf_counter()
+
 from . import commands
+from . import config
 from .lib import fusionAddInUtils as futil
 
 def run(context):
     try:
         commands.start()
+        # Time Fusion waits for the add-in, see STARTUP_BUDGET in config.py
+        startup_time = time.perf_counter() - LOAD_START
+        over_budget = startup_time > config.STARTUP_BUDGET
+        futil.log(f"{config.ADDIN_NAME} started in {startup_time * 1000:.0f} ms"
+                  f"{f' (budget {config.STARTUP_BUDGET * 1000:.0f} ms)' if over_budget else ''}", force_console=over_budget)
     except:
         futil.handle_error('run')
 
@@ -0,0 +1,134 @@
+"""Loopback stand-in for a DNC server, to test streaming without a machine.
+
+Accepts one connection and writes everything it receives to a file. The
+machine is emulated by a buffer drained at a fixed rate: the server sends
+XOFF when the buffer passes its high-water mark and XON once it has drained
+below the low-water mark, like a control with a small tape buffer.
+
+    python -m benchmarks.dnc_server --port 5001 --output received.nc --rate 9600
+    python -m benchmarks.dnc_server --port 5001 --output received.nc --drop-after 1000   # test resuming
+"""
+import sys
+import time
+import socket
+import argparse
+import threading
+
+from lib.smartPostUtils.dnc import XON, XOFF
+
+
+class LoopbackDncServer:
+    """Receives one DNC transfer on 127.0.0.1 in a background thread.
+
+    Arguments:
+    output_path -- File the received bytes are written (or appended, with append) to.
+    port -- Port to listen on, 0 picks a free one (see self.port).
+    rate -- Bytes per second the emulated machine consumes, 0 for no limit.
+    buffer_size -- Emulated buffer size; XOFF is sent at 3/4 full and XON at 1/4.
+    drop_after -- Close the connection after this many lines, to test resuming.
+    """
+
+    def __init__(self, output_path, port=0, rate=0, buffer_size=4096, drop_after=None, append=False):
+        self.output_path = output_path
+        self.rate = rate
+        self.buffer_size = buffer_size
+        self.drop_after = drop_after
+        self.append = append
+        self.received = 0
+        self.lines = 0
+        self.xoff_count = 0
+        self.first_byte_time = None
+        self.error = None
+        self._listener = socket.create_server(('127.0.0.1', port))
+        self.port = self._listener.getsockname()[1]
+        self._done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='LoopbackDncServer', daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run(self):
+        try:
+            connection, _ = self._listener.accept()
+            with connection, open(self.output_path, 'ab' if self.append else 'wb') as out:
+                self._receive(connection, out)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._listener.close()
+            self._done.set()
+
+    def _receive(self, connection, out):
+        buffered = 0
+        paused = False
+        last_drain = time.time()
+        connection.settimeout(0.05)
+        while True:
+            # The machine consumes the buffer at the configured rate
+            now = time.time()
+            if self.rate:
+                buffered = max(0, buffered - int((now - last_drain) * self.rate))
+            else:
+                buffered = 0
+            last_drain = now
+
+            if paused and buffered <= self.buffer_size // 4:
+                connection.sendall(XON)
+                paused = False
+            if paused:
+                time.sleep(0.01)
+                continue
+
+            try:
+                data = connection.recv(min(1024, self.buffer_size))
+            except socket.timeout:
+                continue
+            if not data:
+                break
+            if self.first_byte_time is None:
+                self.first_byte_time = now
+
+            if self.drop_after is not None and self.lines + data.count(b'\n') >= self.drop_after:
+                # Keep the lines up to the drop point, then hang up like a control that was reset
+                keep = self.drop_after - self.lines
+                data = b''.join(data.splitlines(keepends=True)[:keep])
+                out.write(data)
+                self.received += len(data)
+                self.lines += keep
+                break
+
+            out.write(data)
+            self.received += len(data)
+            self.lines += data.count(b'\n')
+            buffered += len(data)
+            if self.rate and buffered >= self.buffer_size * 3 // 4:
+                connection.sendall(XOFF)
+                self.xoff_count += 1
+                paused = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Loopback DNC server stand-in")
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--output', required=True, help="File to write the received program to")
+    parser.add_argument('--append', action='store_true', help="Append to the output, e.g. when resuming")
+    parser.add_argument('--rate', type=float, default=0, help="Bytes per second the emulated machine consumes")
+    parser.add_argument('--buffer', type=int, default=4096, help="Emulated machine buffer in bytes")
+    parser.add_argument('--drop-after', type=int, help="Hang up after this many lines")
+    args = parser.parse_args(argv)
+
+    server = LoopbackDncServer(args.output, args.port, args.rate, args.buffer, args.drop_after, args.append).start()
+    print(f"Listening on 127.0.0.1:{server.port}", flush=True)
+    server.wait()
+    if server.error:
+        print(f"Error: {server.error}", file=sys.stderr)
+        return 1
+    print(f"Received {server.lines} lines ({server.received} bytes), sent XOFF {server.xoff_count} times")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
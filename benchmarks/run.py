@@ -0,0 +1,274 @@
+"""Benchmarks the Personal-mode pipeline stages on synthetic intermediate XML.
+
+Run from the add-in folder:
+
+    python -m benchmarks.run --operations 20 --moves 50000 --output results.json
+    python -m benchmarks.run --baseline baseline.json          # exits 1 on a regression
+    python -m benchmarks.run --output baseline.json            # record a new baseline
+
+Each stage runs in a fresh process so its peak RSS is not hidden by an earlier
+stage. The post stage goes through the same command builder and process runner
+as generate_gcode, with post.exe replaced by benchmarks/stub_post.py unless
+--post-exe points at another executable.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from lib.smartPostUtils import pipeline, toolpath, compaction
+from lib.smartPostUtils.post_runner import PostProcessRun
+from benchmarks import synthetic
+
+RESULTS_FORMAT_VERSION = 1
+
+STAGES = ('merge', 'parse', 'compact', 'post')
+DEFAULT_STAGES = ('merge', 'parse', 'post')
+
+# Stages faster than this are reported but not flagged, timer noise dominates them
+MINIMUM_COMPARABLE_SECONDS = 0.05
+
+STUB_POST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_post.py')
+
+
+def peak_rss():
+    """Peak resident set size in bytes of this process and of its finished children (None when unknown)."""
+    try:
+        import resource
+    except ImportError:
+        return windows_peak_rss(), None
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS, KB elsewhere
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def windows_peak_rss():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def run_stage(stage, work, options):
+    """Runs one stage in the current process and returns its measurements."""
+    merged_xml = os.path.join(work, 'merged.xml')
+    measurement = {}
+
+    if stage == 'merge':
+        output = os.path.join(work, 'merge_output.xml')
+        start_time = time.perf_counter()
+        pipeline.merge_xml_files(options['inputs'], output)
+        measurement['seconds'] = time.perf_counter() - start_time
+        measurement['bytes'] = sum(os.path.getsize(path) for path in options['inputs'])
+        measurement['moves'] = options['moves']
+        os.remove(output)
+
+    elif stage == 'parse':
+        toolpath.require_numpy()
+        start_time = time.perf_counter()
+        parsed = toolpath.Toolpath.parse(merged_xml)
+        measurement['seconds'] = time.perf_counter() - start_time
+        measurement['bytes'] = os.path.getsize(merged_xml)
+        measurement['moves'] = len(parsed)
+
+    elif stage == 'compact':
+        output = os.path.join(work, 'compact_output.xml')
+        start_time = time.perf_counter()
+        stats = compaction.compact_toolpath(merged_xml, output, options['tolerance'])
+        measurement['seconds'] = time.perf_counter() - start_time
+        measurement['bytes'] = os.path.getsize(merged_xml)
+        measurement['moves'] = stats['blocks_in']
+        measurement['reduction'] = stats['reduction']
+        os.remove(output)
+
+    elif stage == 'post':
+        nc_file = os.path.join(work, 'program.nc')
+        log_path = os.path.join(work, 'post.log')
+        params = pipeline.build_post_command(options['post_exe'], options['post'], merged_xml, nc_file,
+                                             options['properties'], log_path)
+        xml_size = os.path.getsize(merged_xml)
+        start_time = time.perf_counter()
+        run = PostProcessRun(params, os.path.join(work, 'post_stdout.log'), pipeline.post_timeout(xml_size),
+                             poll_interval=0.01).start()
+        run.wait()
+        measurement['seconds'] = time.perf_counter() - start_time
+        if not run.succeeded:
+            raise RuntimeError(f"Post stage {pipeline.describe_run(run)}")
+        measurement['bytes'] = xml_size
+        measurement['moves'] = options['moves']
+        measurement['output_bytes'] = os.path.getsize(nc_file)
+        os.remove(nc_file)
+
+    measurement['peak_rss'], measurement['peak_child_rss'] = peak_rss()
+    return measurement
+
+
+def measure_stage(stage, work, options, repeat):
+    """Runs a stage repeat times, each in a fresh process, and summarizes the runs."""
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            runs.append(executor.submit(run_stage, stage, work, options).result())
+
+    times = [run['seconds'] for run in runs]
+    best = min(times)
+    result = dict(runs[times.index(best)])
+    result.update({
+        'seconds': best,
+        'median_seconds': statistics.median(times),
+        'runs': len(runs),
+        'mb_per_second': result['bytes'] / 1024 ** 2 / best if best else None,
+        'moves_per_second': result['moves'] / best if best else None,
+        'peak_rss': max((run['peak_rss'] or 0 for run in runs), default=0) or None,
+        'peak_child_rss': max((run['peak_child_rss'] or 0 for run in runs), default=0) or None,
+    })
+    return result
+
+
+def machine_description():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy_version,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compares stage throughput and memory against a baseline. Returns (report lines, regressed)."""
+    lines = []
+    regressed = False
+    if baseline.get('scale') != results['scale']:
+        lines.append("Warning: baseline was recorded at a different scale, comparison is approximate")
+
+    for stage, current in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous or 'error' in current or 'error' in previous:
+            lines.append(f"  {stage:8} not comparable")
+            continue
+        speed = current['mb_per_second'] / previous['mb_per_second'] if previous['mb_per_second'] else 1.0
+        flags = []
+        if speed < 1 - threshold and max(current['seconds'], previous['seconds']) >= MINIMUM_COMPARABLE_SECONDS:
+            flags.append("SLOWER")
+        if current['peak_rss'] and previous['peak_rss'] and current['peak_rss'] > previous['peak_rss'] * (1 + threshold):
+            flags.append("MORE MEMORY")
+        regressed = regressed or bool(flags)
+        memory = f"{current['peak_rss'] / previous['peak_rss'] - 1:+.1%}" if current['peak_rss'] and previous['peak_rss'] else "n/a"
+        lines.append(f"  {stage:8} throughput {speed - 1:+.1%}, peak RSS {memory} {' '.join(flags)}".rstrip())
+    return lines, regressed
+
+
+def format_stage(stage, result):
+    if 'error' in result:
+        return f"  {stage:8} skipped: {result['error']}"
+    rss = f"{result['peak_rss'] / 1024 ** 2:.0f} MB" if result['peak_rss'] else "n/a"
+    return (f"  {stage:8} {result['seconds']:8.3f} s (median {result['median_seconds']:.3f} s) "
+            f"{result['mb_per_second']:8.1f} MB/s {result['moves_per_second']:12,.0f} moves/s  peak RSS {rss}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description="SmartPost pipeline benchmarks")
+    parser.add_argument('--operations', type=int, default=10, help="Intermediate XML files (operations)")
+    parser.add_argument('--moves', type=int, default=20000, help="Moves per operation")
+    parser.add_argument('--arc-fraction', type=float, default=0.3, help="Share of move runs written as arcs")
+    parser.add_argument('--tools', type=int, default=4, help="Distinct tools across the operations")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES), help=f"Comma separated, from {', '.join(STAGES)}")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage, the fastest is reported")
+    parser.add_argument('--post-exe', default=STUB_POST, help="post.exe or a stand-in (default: benchmarks/stub_post.py)")
+    parser.add_argument('--post', default='benchmark.cps', help="Post processor passed to the post executable")
+    parser.add_argument('--property', nargs=2, action='append', metavar=('NAME', 'VALUE'), default=[])
+    parser.add_argument('--tolerance', type=float, default=0.01, help="Tolerance for the compact stage")
+    parser.add_argument('--output', default='benchmark_results.json', help="Results JSON file to write")
+    parser.add_argument('--baseline', help="Results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed slowdown / memory growth (0.1 = 10%%)")
+    parser.add_argument('--work-dir', help="Folder for the generated files (default: a temporary folder)")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated files")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    work = args.work_dir or tempfile.mkdtemp(prefix='smartpost_bench_')
+    os.makedirs(work, exist_ok=True)
+    try:
+        start_time = time.perf_counter()
+        inputs, moves, size = synthetic.generate_operations(
+            os.path.join(work, 'operations'), args.operations, args.moves, args.arc_fraction, args.tools, args.seed
+        )
+        pipeline.merge_xml_files(inputs, os.path.join(work, 'merged.xml'))
+        print(f"Generated {args.operations} operations, {moves:,} moves, {size / 1024 ** 2:.1f} MB "
+              f"in {time.perf_counter() - start_time:.1f} seconds")
+
+        properties = []
+        for name, value in args.property:
+            properties.extend(["--property", name, value])
+        options = {'inputs': inputs, 'moves': moves, 'post_exe': args.post_exe, 'post': args.post,
+                   'properties': properties, 'tolerance': args.tolerance}
+
+        results = {
+            'version': RESULTS_FORMAT_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': machine_description(),
+            'scale': {'operations': args.operations, 'moves': args.moves, 'arc_fraction': args.arc_fraction,
+                      'tools': args.tools, 'seed': args.seed, 'xml_bytes': size, 'total_moves': moves},
+            'stages': {},
+        }
+        for stage in stages:
+            try:
+                results['stages'][stage] = measure_stage(stage, work, options, max(1, args.repeat))
+            except Exception as e:
+                results['stages'][stage] = {'error': str(e)}
+            print(format_stage(stage, results['stages'][stage]), flush=True)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressed = compare(results, baseline, args.threshold)
+        print(f"Compared with {args.baseline} ({baseline.get('created', 'unknown date')}):")
+        for line in lines:
+            print(line)
+        if regressed:
+            return 1
+    return 1 if any('error' in result for result in results['stages'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Stand-in for post.exe with the same command line: [options] post.cps input.xml output.nc
+
+Streams the intermediate XML and writes one G-code block per move, so the
+output size and I/O pattern resemble a real post. Behaviour is tuned with
+environment variables:
+
+STUB_POST_SECONDS_PER_MB -- Extra processing time per MB of input (default 0).
+STUB_POST_EXIT_CODE -- Exit code to return (default 0).
+"""
+import os
+import sys
+import time
+
+MOVE_CODES = {b'rapid': b'G0', b'linear': b'G1', b'arc-cw': b'G2', b'arc-ccw': b'G3', b'circular': b'G2'}
+
+
+def main(args):
+    positional = []
+    log_path = None
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg == '--log':
+            log_path = args[index + 1]
+            index += 2
+        elif arg == '--property':
+            index += 3
+        elif arg == '--lang':
+            index += 2
+        elif arg.startswith('--'):
+            index += 1
+        else:
+            positional.append(arg)
+            index += 1
+    _, xml_path, nc_path = positional[-3:]
+
+    start_time = time.time()
+    blocks = 0
+    with open(xml_path, 'rb') as src, open(nc_path, 'wb') as out:
+        out.write(b"%\nO1001\n")
+        for line in src:
+            end = line.find(b' ')
+            code = MOVE_CODES.get(line[1:end]) if end > 0 else None
+            if code is None:
+                continue
+            x, y, z = line.split(b"'")[1].split()
+            blocks += 1
+            out.write(b"N%d %s X%s Y%s Z%s\n" % (blocks, code, x, y, z))
+        out.write(b"M30\n%\n")
+
+    delay = float(os.environ.get('STUB_POST_SECONDS_PER_MB', '0')) * os.path.getsize(xml_path) / 1024 ** 2
+    if delay:
+        time.sleep(delay)
+
+    if log_path:
+        with open(log_path, 'w') as log:
+            log.write(f"Stub post: {blocks} blocks in {time.time() - start_time:.3f} seconds\n")
+    return int(os.environ.get('STUB_POST_EXIT_CODE', '0'))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+"""Generates synthetic xml.cps intermediate files for benchmarking.
+
+The files follow xml.cps output: one element per line, operation parameters
+(including the areBothSpindlesGrabbed marker the merge looks for), <context>,
+<tool> with a holder, then one <section> of moves. Moves alternate between
+straight linear passes and runs of XY arcs, so the arc fraction, tool
+count and size are all controlled by the caller. Output is deterministic for a
+given seed.
+"""
+import os
+import math
+import random
+
+HEADER = (
+    "<?xml version='1.0' encoding='utf-8' standalone='yes'?>\n"
+    "<nc xmlns='http://www.hsmworks.com/xml/2008/nc' version='1.0'>\n"
+    "<!-- http://cam.autodesk.com -->\n"
+)
+
+TOOL_TYPES = ('flat end mill', 'ball end mill', 'bull nose end mill', 'drill', 'chamfer mill')
+
+
+def number(value):
+    """Formats like xml.cps mainFormat (6 decimals, no trailing zeros)."""
+    text = f"{value:.6f}".rstrip('0').rstrip('.')
+    return '0' if text in ('-0', '') else text
+
+
+def point(x, y, z):
+    return f"{number(x)} {number(y)} {number(z)}"
+
+
+def write_operation(file, index, moves, arc_fraction, tool_number, rng):
+    """Writes one operation of about moves moves, arc_fraction of them arcs."""
+    diameter = 2 + tool_number % 10
+    file.write(f"<parameter name='operation-comment' value='Operation{index + 1}' type='string'/>\n")
+    file.write("<parameter name='areBothSpindlesGrabbed' value='0' type='integer'/>\n")
+    file.write("<parameter name='operation:tolerance' value='0.01' type='float'/>\n")
+    file.write("<context unit='millimeters' origin='0 0 0' plane='1 0 0 0 1 0 0 0 1' work-offset='0'/>\n")
+    file.write(f"<tool type='{TOOL_TYPES[tool_number % len(TOOL_TYPES)]}' number='{tool_number}' "
+               f"diameter='{diameter}' corner-radius='0' flute-length='{diameter * 3}' "
+               f"spindle-rpm='{6000 + 500 * tool_number}' coolant='flood'>\n")
+    file.write(f"<holder>\n<section diameter='{diameter * 4}' length='20'/>\n</holder>\n</tool>\n")
+    file.write("<section>\n")
+
+    x, y, z = rng.uniform(0, 100), rng.uniform(0, 100), -rng.uniform(0.5, 5)
+    file.write(f"<rapid to='{point(x, y, 15)}'/>\n")
+    file.write(f"<rapid to='{point(x, y, 2)}'/>\n")
+    file.write(f"<linear to='{point(x, y, z)}' feed='300'/>\n")
+
+    feed = rng.choice((800, 1000, 1500, 2000))
+    first_feed = True
+    written = 3
+    while written < moves:
+        run = min(moves - written, rng.randint(8, 64))
+        if rng.random() < arc_fraction:
+            # Chain of short XY arcs around a common center
+            radius = rng.uniform(2, 20)
+            cx, cy = x - radius, y
+            angle = 0.0
+            step = rng.uniform(0.05, 0.4) * (1 if rng.random() < 0.5 else -1)
+            tag = 'arc-ccw' if step > 0 else 'arc-cw'
+            for _ in range(run):
+                angle += step
+                x, y = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+                feed_text = f" feed='{feed}'" if first_feed else ""
+                file.write(f"<{tag} to='{point(x, y, z)}' center='{point(cx, cy, z)}'{feed_text}/>\n")
+                first_feed = False
+        else:
+            dx, dy = rng.uniform(-2, 2), rng.uniform(-2, 2)
+            for _ in range(run):
+                x, y = x + dx + rng.uniform(-0.01, 0.01), y + dy + rng.uniform(-0.01, 0.01)
+                feed_text = f" feed='{feed}'" if first_feed else ""
+                file.write(f"<linear to='{point(x, y, z)}'{feed_text}/>\n")
+                first_feed = False
+        written += run
+
+    file.write(f"<rapid to='{point(x, y, 15)}'/>\n")
+    file.write("</section>\n")
+    return written + 1
+
+
+def generate_operations(folder, operations=10, moves=10000, arc_fraction=0.3, tools=4, seed=1):
+    """Writes operations numbered XML files into folder, one tool change every operations / tools files.
+
+    Returns (paths, total moves, total bytes).
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    per_tool = max(1, math.ceil(operations / max(1, tools)))
+    paths = []
+    total_moves = 0
+    total_bytes = 0
+    for index in range(operations):
+        path = os.path.join(folder, f"{index + 1:03d}_Operation{index + 1}.xml")
+        with open(path, 'w', newline='\r\n', encoding='utf-8') as f:
+            f.write(HEADER)
+            f.write("<parameter name='generated-by' value='SmartPost benchmark' type='string'/>\n")
+            total_moves += write_operation(f, index, moves, arc_fraction, index // per_tool + 1, rng)
+            f.write("</nc>\n")
+        paths.append(path)
+        total_bytes += os.path.getsize(path)
+    return paths, total_moves, total_bytes
@@ -1,6 +1,7 @@
-import os, shutil, json, glob, subprocess, logging, time
+import os, shutil, json, glob, subprocess, logging, time, threading, functools, random, urllib.parse
 import adsk.core, adsk.cam, adsk.fusion
 from ...lib import fusionAddInUtils as futil
+from ...lib import smartPostUtils as sputil
 from ... import config
 
 # =============================================================================
@@ -32,9 +33,6 @@ COMMAND_BESIDE_ID = ''
 ICON_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), './resources/icon', '')
 BUTTON_ICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), './resources/open_button', '')
 
-# Path to the postprocessor
-POST_PATH = ''
-
 # Default xml postprocessor path
 XML_POST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "xml.cps")
 
@@ -46,6 +44,10 @@ HIGH_FEED_MAPPING_ITEMS = [
     'Always use high feed'
 ]
 
+# Setup dropdown entries besides the setup names
+SELECTED_OPERATIONS_ITEM = 'Selected Operations'
+ALL_SETUPS_ITEM = 'All Setups'
+
 # List of available units for the postprocessor
 UNIT_ITEMS = [
     'Inches',
@@ -53,28 +55,60 @@ UNIT_ITEMS = [
     'Document Unit'
 ]
 
-# Error codes for postprocessing (post.exe)
-ERROR_CODES = {
-    0: "Successful processing.",
-    1: "Unspecified failure.",
-    100: "Failed to load post configuration.",
-    101: "Empty configuration.",
-    102: "Failed to initialize.",
-    103: "Failed to evaluate configuration.",
-    104: "Invalid machine configuration.",
-    200: "Failed to load intermediate NC data.",
-    201: "Unknown format.",
-    300: "Failed to open output file.",
-    400: "Failed to open log file.",
-    500: "Post processing failed.",
-    501: "Post processing was aborted.",
-    502: "Post processing timed out.",
-}
+# Numeric inputs checked by command_validate_input
+FLOAT_INPUT_IDS = (
+    'minimum_chord_length_input',
+    'high_feedrate_input',
+    'maximum_circular_radius_input',
+    'minimum_circular_radius_input',
+    'tolerance_input'
+)
+
+# Cached results of filesystem checks made during validation: {path: (checked_at, exists)}
+PATH_EXISTS_CACHE = {}
 
 # Path to the configuration file
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
 # Global variable to store cached configuration data
 CONFIG_DATA = None
+# Write-behind state: keys changed since the last save and last saved file content
+CONFIG_DIRTY_KEYS = set()
+CONFIG_SAVED_CONTENT = None
+CONFIG_LOCK = threading.RLock()
+
+# Deferred startup work: done on the first command use, or earlier by the warm-up timer
+STARTUP_DONE = False
+WARMUP_TIMER = None
+
+# Setups and operations of each open document by creationId, see get_operation_index
+OPERATION_INDEXES = {}
+
+# Commands that never change operations, their end keeps the operation indexes (selection and view commands)
+INDEX_NEUTRAL_COMMANDS = {CMD_ID, 'SelectCommand', 'PanCommand', 'OrbitCommand', 'FreeOrbitCommand', 'ZoomCommand',
+                          'FitCommand', 'ZoomWindowCommand', 'LookAtCommand'}
+
+# Path to the cached post.exe location
+POST_EXE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "post_exe.json")
+
+# Index of the local post library, invalidated by the library folder modification time
+POST_LIBRARY_INDEX = {'mtime': None, 'urls': {}, 'configurations': {}}
+
+# Shared artifact cache (created on first use)
+ARTIFACT_CACHE = None
+
+# Parsed toolpaths of merged programs for the cycle time estimate (created on first use)
+TOOLPATH_CACHE = None
+
+# Instrumentation record of the post run in progress
+RUN_TRACE = None
+
+# NC file transfer to the DNC server, it may still be running after the post run
+DNC_STREAM = None
+
+# Progress dialog resolution and the weight of each Personal-mode stage in its bar
+PROGRESS_STEPS = 1000
+BATCH_PROGRESS_STAGES = (('xml', 60), ('merge', 5), ('post', 35))
+SETUPS_PROGRESS_STAGES = (('xml', 60), ('post', 40))
 
 #endregion
 
@@ -85,9 +119,12 @@ CONFIG_DATA = None
 
 def load_config():
     """Load configuration from file or return default settings."""
+    global CONFIG_SAVED_CONTENT
     if os.path.exists(CONFIG_FILE):
         with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+            loaded_config = json.load(f)
+        CONFIG_SAVED_CONTENT = serialize_config(loaded_config)
+        return loaded_config
     return {
         'PERSONAL_LICENSE': config.DEFAULT_PERSONAL_LICENSE,
         'PROGRAM_NAME': config.DEFAULT_PROGRAM_NAME,
@@ -107,28 +144,39 @@ def load_config():
         'TOLERANCE': config.DEFAULT_TOLERANCE
     }
 
-def save_config(new_config):
-    """Save configuration to file with error handling and atomic write."""
+def serialize_config(config_data):
+    """Serializes configuration exactly as it is written to the config file."""
+    return json.dumps(config_data, indent=4, ensure_ascii=False)
+
+def save_config(new_config, show_errors=True):
+    """Save configuration to file with error handling and atomic write, skipping unchanged content."""
+    global CONFIG_SAVED_CONTENT
+    temp_file = f"{CONFIG_FILE}.tmp"
     try:
+        content = serialize_config(new_config)
+        if content == CONFIG_SAVED_CONTENT and os.path.exists(CONFIG_FILE):
+            futil.log("Config unchanged, skipping save")
+            return True
+
         # Ensure config directory exists
         config_dir = os.path.dirname(CONFIG_FILE)
         if config_dir:
             os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
         
         # Atomic write using temp file
-        temp_file = f"{CONFIG_FILE}.tmp"
         with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(new_config, f, indent=4, ensure_ascii=False)
+            f.write(content)
         
         # Replace existing config atomically
-        if os.path.exists(CONFIG_FILE):
-            os.remove(CONFIG_FILE)
-            futil.log(f"Replacing existing config at: {normalize_path(CONFIG_FILE)}")
-        os.rename(temp_file, CONFIG_FILE)
+        os.replace(temp_file, CONFIG_FILE)
+        CONFIG_SAVED_CONTENT = content
         futil.log("Config successfully saved")
         return True
     except Exception as e:
-        ui.messageBox(f"Failed to save settings:\n{str(e)}")
+        if show_errors:
+            ui.messageBox(f"Failed to save settings:\n{str(e)}")
+        else:
+            futil.log(f"Failed to save settings: {str(e)}", adsk.core.LogLevels.ErrorLogLevel)
 
         # Clean up temp file if it exists
         if os.path.exists(temp_file):
@@ -139,25 +187,45 @@ def save_config(new_config):
                 futil.log(f"Failed to clean up temp file: {str(cleanup_e)}")
         return False
 
+def get_config_data():
+    """Returns the dialog configuration, loading it on first use. Safe to call from any thread."""
+    global CONFIG_DATA
+    with CONFIG_LOCK:
+        if CONFIG_DATA is None:
+            CONFIG_DATA = load_config()
+        return CONFIG_DATA
+
 def config_value(key, value=None):
     """Safe get/set for config values with validation."""
-    global CONFIG_DATA
     if value is None:
-        return CONFIG_DATA.get(key)
+        return get_config_data().get(key)
     try:
         # Normalize path-style values
         if key.endswith('_PATH') or key.endswith('_FOLDER'):
             value = normalize_path(str(value))
-        # Update the config dictionary with the new value
-        CONFIG_DATA[key] = value
+        # Update the config dictionary with the new value, the file is written when the command ends
+        with CONFIG_LOCK:
+            get_config_data()[key] = value
+            CONFIG_DIRTY_KEYS.add(key)
         futil.log(f"Updated config key '{key}' with value: {value}")
-        if not save_config(CONFIG_DATA):
-            ui.messageBox(f"Failed to save config for key: {key}")
         return value
     except Exception as e:
         ui.messageBox(f"Config update failed for {key}: {str(e)}")
         return None
 
+def flush_config(show_errors=True):
+    """Writes pending config changes in a single atomic save.
+    Called from the main thread only (execute, destroy and stop), as saving logs through the Fusion API."""
+    with CONFIG_LOCK:
+        if CONFIG_DATA is None:
+            return True
+        if CONFIG_DIRTY_KEYS:
+            futil.log(f"Saving config keys: {', '.join(sorted(CONFIG_DIRTY_KEYS))}")
+        if not save_config(CONFIG_DATA, show_errors):
+            return False
+        CONFIG_DIRTY_KEYS.clear()
+        return True
+
 def save_command_configuration(inputs):
     """Save all configuration values from UI inputs."""
     try:
@@ -200,9 +268,10 @@ def save_command_configuration(inputs):
                 updated_config['POST_FOLDER'] = post_folder
 
         # Save updated configuration
-        CONFIG_DATA = updated_config
+        with CONFIG_LOCK:
+            CONFIG_DATA = updated_config
 
-        if save_config(CONFIG_DATA):
+        if flush_config():
             futil.log("Configuration saved successfully")
         else:
             futil.log("Failed to persist configuration")
@@ -221,18 +290,7 @@ def save_command_configuration(inputs):
 #region
 
 def start():
-    """Initialize the add-in."""
-    global CONFIG_DATA
-    
-    # Load configuration from file
-    CONFIG_DATA = load_config()
-    futil.log("Configuration loaded")
-    
-    # Save default config if config file does not exist
-    if not os.path.exists(CONFIG_FILE):
-        save_config(CONFIG_DATA)
-        futil.log(f"Created default config file at {normalize_path(CONFIG_FILE)}")
-
+    """Initialize the add-in. Only the button is registered here, Fusion waits for this at startup."""
     # Attach event handler to command creation
     cmd_def = ui.commandDefinitions.addButtonDefinition(CMD_ID, CMD_NAME, CMD_Description, ICON_FOLDER)
     futil.add_handler(cmd_def.commandCreated, command_created)
@@ -255,8 +313,58 @@ def start():
     control.isPromoted = IS_PROMOTED
     futil.log(f"Added command control to panel with promotion = {IS_PROMOTED}")
 
+    # Configuration and post.exe discovery wait until Fusion has finished starting
+    schedule_warm_up()
+
+def schedule_warm_up():
+    """Runs warm_up in the background config.STARTUP_WARMUP_DELAY seconds after startup"""
+    global WARMUP_TIMER
+    if not config.STARTUP_WARMUP_DELAY:
+        return
+    WARMUP_TIMER = threading.Timer(config.STARTUP_WARMUP_DELAY, warm_up)
+    WARMUP_TIMER.daemon = True
+    WARMUP_TIMER.start()
+
+def warm_up():
+    """Background part of the deferred startup work. Logs to the log module only, the Fusion API is not used."""
+    try:
+        get_config_data()
+        if not config.FAST_POST_ENGINE:
+            find_fusion_post_exe(log=lambda message, **kwargs: logging.info(message))
+        if config.STAGING:
+            sputil.staging.clean_stale_workspaces(config.STAGING_FOLDER)
+    except Exception as e:
+        logging.warning(f"Startup warm-up failed: {str(e)}")
+
+def finish_startup():
+    """Deferred startup work that needs the main thread, done on the first command use"""
+    global STARTUP_DONE
+    if STARTUP_DONE:
+        return
+    STARTUP_DONE = True
+    start_time = time.perf_counter()
+    get_config_data()
+    futil.log("Configuration loaded")
+
+    # Operation indexes are dropped when a command may have changed a document
+    futil.add_handler(ui.commandTerminated, operation_index_command_terminated)
+    futil.add_handler(app.documentClosed, operation_index_document_closed)
+
+    # Save default config if config file does not exist
+    if not os.path.exists(CONFIG_FILE):
+        save_config(CONFIG_DATA)
+        futil.log(f"Created default config file at {normalize_path(CONFIG_FILE)}")
+    futil.log(f"Deferred startup work done in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+
 def stop():
     """Remove the command and UI elements from Fusion 360"""
+    if WARMUP_TIMER:
+        WARMUP_TIMER.cancel()
+    flush_config(show_errors=False)
+    if DNC_STREAM and not DNC_STREAM.wait(0):
+        DNC_STREAM.cancel()
+        futil.log(f"Stopped the DNC transfer of {DNC_STREAM.nc_path} after line {DNC_STREAM.lines_sent}", force_console=True)
+
     workspace = ui.workspaces.itemById(WORKSPACE_ID)
     if not workspace:
         futil.log(f"Workspace '{WORKSPACE_ID}' not found")
@@ -286,6 +394,7 @@ def stop():
 
 def command_created(args: adsk.core.CommandCreatedEventArgs):
     """Handles the event when the command is created."""
+    finish_startup()
     inputs = args.command.commandInputs
 
     # Get the active document and CAM product
@@ -307,14 +416,19 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     )
     
     # Populate setups dropdown with available setups
+    index = get_operation_index(cam)
     first_item = True
-    for setup in cam.setups:
-        setups_combo.listItems.add(setup.name, first_item)
+    for setup in index['setups']:
+        setups_combo.listItems.add(setup['name'], first_item)
         first_item = False
     
     # Add "Selected Operations" option if any operations are selected
-    has_select_op = any(op.isSelected for op in cam.allOperations)
-    setups_combo.listItems.add('Selected Operations', has_select_op)
+    has_select_op = bool(get_selected_operations(index))
+    setups_combo.listItems.add(SELECTED_OPERATIONS_ITEM, has_select_op)
+
+    # Add "All Setups" option to post every setup to its own NC file
+    if len(index['setups']) > 1:
+        setups_combo.listItems.add(ALL_SETUPS_ITEM, False)
 
     # Add program information inputs
     inputs.addStringValueInput('program_name_input', 'Program Name', config_value('PROGRAM_NAME'))
@@ -381,55 +495,64 @@ def command_created(args: adsk.core.CommandCreatedEventArgs):
     futil.log("Command created event completed successfully")
 
 def command_validate_input(args: adsk.core.ValidateInputsEventArgs):
-    """Validates inputs and blocks OK button if invalid."""
+    """Validates inputs and blocks OK button if invalid. Has no side effects and does no disk writes."""
     inputs = args.inputs
-    args.areInputsValid = True
 
+    float_values = tuple(
+        inputs.itemById(field_id).value if inputs.itemById(field_id) else None
+        for field_id in FLOAT_INPUT_IDS
+    )
+    post_name = inputs.itemById('post_name_input').value
+
+    args.areInputsValid = (
+        are_input_values_valid(
+            inputs.itemById('program_name_input').value,
+            inputs.itemById('program_number_input').value,
+            float_values
+        )
+        # Validate post processor exists
+        and bool(post_name.strip())
+        and cached_path_exists(get_post_path(post_name))
+    )
+
+@functools.lru_cache(maxsize=256)
+def are_input_values_valid(program_name, program_number, float_values):
+    """Validates program and numeric input values, memoized on the values themselves."""
     # Validate program name (must not be empty)
-    if not inputs.itemById('program_name_input').value.strip():
-        args.areInputsValid = False
+    if not program_name.strip():
+        return False
 
-    program_number = inputs.itemById('program_number_input').value
+    # Validate program number (must be positive integer)
     if not (program_number.isdigit() and int(program_number) >= 0):
-        args.areInputsValid = False
+        return False
+
+    # Validate all numeric fields, in FLOAT_INPUT_IDS order
+    validators = (is_positive_float, is_non_negative_float, is_positive_float, is_positive_float, is_positive_float)
+    for value, validator in zip(float_values, validators):
+        if value is None:
+            continue
+        try:
+            if not validator(float(value)):
+                return False
+        except (ValueError, TypeError):
+            return False
+
+    return True
+
+def cached_path_exists(path):
+    """os.path.exists with results cached per path for config.VALIDATION_PATH_TTL seconds."""
+    now = time.monotonic()
+    cached = PATH_EXISTS_CACHE.get(path)
+    if cached and now - cached[0] < config.VALIDATION_PATH_TTL:
+        return cached[1]
+    exists = os.path.exists(path)
+    PATH_EXISTS_CACHE[path] = (now, exists)
+    return exists
+
+def get_post_path(post_name):
+    """Returns the full path of the selected postprocessor."""
+    return os.path.join(config_value("POST_FOLDER") or config.DEFAULT_POST_FOLDER, post_name)
 
-    # Validate program number (must be positive integer)
-    post_name = inputs.itemById('post_name_input').value
-    
-    global POST_PATH
-    POST_PATH = os.path.join(config_value("POST_FOLDER"), post_name)
-
-    # Validate post processor exists
-    if not post_name.strip() or not os.path.exists(POST_PATH):
-        inputs.itemById('post_name_input').value = ''
-        POST_PATH = ''
-        config_value("POST_NAME", '')
-        config_value("POST_FOLDER", config.DEFAULT_POST_FOLDER)
-        futil.log("Post processor not found and resetting to default: {POST_PATH}")
-        args.areInputsValid = False
-
-    # List of float fields
-    float_fields = [
-        ('minimum_chord_length_input', is_positive_float),
-        ('high_feedrate_input', is_non_negative_float),
-        ('maximum_circular_radius_input', is_positive_float),
-        ('minimum_circular_radius_input', is_positive_float),
-        ('tolerance_input', is_positive_float)
-    ]
-
-    # Validate all numeric fields
-    for field_id, validator in float_fields:
-        input_item = inputs.itemById(field_id)
-        if input_item:
-            try:
-                value = float(input_item.value)
-                if not validator(value):
-                    args.areInputsValid = False
-                    break
-            except (ValueError, TypeError):
-                args.areInputsValid = False
-                break
-    
 def command_input_changed(args: adsk.core.InputChangedEventArgs):
     """Handles changes in input fields within the command dialog."""
     changed_input = args.input
@@ -449,17 +572,14 @@ def command_input_changed(args: adsk.core.InputChangedEventArgs):
             file_path = normalize_path(file_dlg.filename)
             file_name = normalize_path(os.path.basename(file_path))
             file_folder = normalize_path(os.path.dirname(file_path))
-            
-            global POST_PATH
 
             # Validate selected file exists
             if not os.path.exists(file_path):
                 ui.messageBox("Selected postprocessor file does not exist!")
                 inputs.itemById('post_name_input').value = ''
-                POST_PATH = ''
                 config_value("POST_NAME", '')
                 config_value("POST_FOLDER", config.DEFAULT_POST_FOLDER)
-                futil.log("Post processor not found and resetting to default: {POST_PATH}")
+                futil.log(f"Post processor not found and resetting to default: {config.DEFAULT_POST_FOLDER}")
                 return
             
             # Update UI and configuration
@@ -490,9 +610,10 @@ def command_input_changed(args: adsk.core.InputChangedEventArgs):
     futil.log('Input changed event processed successfully')
 
 def command_destroy(args: adsk.core.CommandEventArgs):
-    """Cleans up event handlers when the command is destroyed."""
+    """Cleans up event handlers and saves pending config changes when the command is destroyed."""
     global local_handlers
     local_handlers = []
+    flush_config()
     futil.log('Command destroy event completed - handlers cleaned up')
 
 def command_execute(args: adsk.core.CommandEventArgs):
@@ -512,10 +633,18 @@ def command_execute(args: adsk.core.CommandEventArgs):
             return
 
         # Determine selected operations
+        index = get_operation_index(cam)
         setup_selector = inputs.itemById('setup_selector_input').selectedItem.name
-        if setup_selector == "Selected Operations":
+        setup_batches = None
+        if setup_selector == ALL_SETUPS_ITEM:
+            # Get operations of every setup, each setup is posted to its own NC file
+            setup_batches = [(setup['name'], operations_with_toolpath(setup['operations'])) for setup in index['setups']]
+            setup_batches = [(name, ops) for name, ops in setup_batches if ops]
+            operations = [op for _, ops in setup_batches for op in ops]
+            futil.log(f'Found {len(operations)} operations in {len(setup_batches)} setups')
+        elif setup_selector == SELECTED_OPERATIONS_ITEM:
             # Get operations from selected operations
-            operations = [op for op in cam.allOperations if op.isSelected]
+            operations = [entry['op'] for entry in get_selected_operations(index, scan=True)]
             if not operations:
                 ui.messageBox("No operations selected")
                 return
@@ -523,11 +652,11 @@ def command_execute(args: adsk.core.CommandEventArgs):
             futil.log(f'Found {len(operations)} selected operations')
         else:
             # Get operations from specific setup
-            setup_number = get_setup_number(setup_selector, cam)
+            setup_number = get_setup_number(setup_selector, index)
             if setup_number is None:
                 ui.messageBox(f"Setup '{setup_selector}' not found")
                 return
-            operations = [op for op in cam.setups.item(setup_number).allOperations if op.hasToolpath]
+            operations = operations_with_toolpath(index['setups'][setup_number]['operations'])
             futil.log(f'Found {len(operations)} operations in setup {setup_selector}')
 
         if not operations:
@@ -542,7 +671,11 @@ def command_execute(args: adsk.core.CommandEventArgs):
         # Execute appropriate workflow based on license type
         # if params['personal_license'] and is_hobbyist_license():
         if params['personal_license']:
-            execute_personal_workflow(cam, operations, params)
+            execute_personal_workflow(cam, operations, params, setup_batches)
+        elif setup_batches:
+            for setup_name, setup_operations in setup_batches:
+                setup_params = dict(params, program_name=f"{params['program_name']}_{safe_file_name(setup_name)}")
+                execute_standard_workflow(cam, setup_operations, setup_params)
         else:
             execute_standard_workflow(cam, operations, params)
 
@@ -556,6 +689,23 @@ def command_execute(args: adsk.core.CommandEventArgs):
 # =============================================================================
 #region
 
+def create_progress(title, stages):
+    """Shows a cancellable progress dialog driven by a rate-limited sputil.progress.Progress"""
+    dialog = ui.createProgressDialog()
+    dialog.isCancelButtonShown = True
+    dialog.show(title, 'Initializing...', 0, PROGRESS_STEPS)
+
+    def update(message, fraction):
+        dialog.message = message
+        dialog.progressValue = int(fraction * PROGRESS_STEPS)
+
+    return sputil.progress.Progress(update, lambda: dialog.wasCancelled, adsk.doEvents,
+                                    config.PROGRESS_UPDATE_INTERVAL, stages, dialog.hide)
+
+def create_background_progress():
+    """Progress without a dialog that still keeps Fusion responsive, for calls made outside a batch"""
+    return sputil.progress.Progress(pump=adsk.doEvents, interval=config.PROGRESS_UPDATE_INTERVAL)
+
 def setup_logging(log_file):
     """Configure logging system"""
 
@@ -599,7 +749,7 @@ def collect_processing_parameters(inputs):
             'output_folder': get_input_value(inputs, 'output_folder_input', 'Output Folder'),
             'unit_text': unit_text,
             'unit_num': unit_num,
-            'post_path': POST_PATH,
+            'post_path': get_post_path(get_input_value(inputs, 'post_name_input', 'Postprocessor')),
             'open_in_editor': get_input_value(inputs, 'open_in_editor_input', 'Open in Editor'),
             'allow_helical_moves': get_input_value(inputs, 'allow_helical_moves_input', 'Allow Helical Moves'),
             'high_feedrate_mapping': high_feedrate_mapping,
@@ -610,7 +760,7 @@ def collect_processing_parameters(inputs):
             'tolerance_value': get_input_value(inputs, 'tolerance_input', 'Tolerance')
         }
 
-        if not os.path.exists(params['post_path']):
+        if not os.path.isfile(params['post_path']):
             ui.messageBox("Invalid post processor path")
             return None
         
@@ -620,8 +770,8 @@ def collect_processing_parameters(inputs):
         ui.messageBox(f"Parameter error: {str(e)}")
         return None
 
-def execute_personal_workflow(cam, operations, params):
-    """Execute workflow for Personal/Hobbyist license."""
+def execute_personal_workflow(cam, operations, params, setup_batches=None):
+    """Execute workflow for Personal/Hobbyist license. setup_batches lists (setup name, operations) for All Setups."""
 
     # Validate parameters and convert them to floats
     unit = params['unit_num']
@@ -669,7 +819,10 @@ def execute_personal_workflow(cam, operations, params):
     futil.log('Post-processing parameters prepared')
     
     # Execute batch post-processing with the prepared parameters
-    if not batch_post(cam, operations, **post_params):
+    if setup_batches:
+        if not batch_post_setups(cam, setup_batches, **post_params):
+            futil.log("Some setups failed to post in Personal mode", force_console=True)
+    elif batch_post(cam, operations, **post_params) is False:
         ui.messageBox("Failed to process operations in Personal mode")
 
 #endregion
@@ -687,6 +840,8 @@ def execute_standard_workflow(cam, operations, params):
         
         # Create NC Program input
         start_time = time.time()
+        trace = start_run_trace('standard', program=params['program_name'], post=os.path.basename(params['post_path']),
+                                machine=get_machine_name(operations), unit=params['unit_text'])
         nc_input = cam.ncPrograms.createInput()
         nc_input.displayName = get_unique_nc_program_name(cam)
         nc_input.operations = operations
@@ -746,16 +901,18 @@ def execute_standard_workflow(cam, operations, params):
         post_options = adsk.cam.NCProgramPostProcessOptions.create()
 
         # Postprocess NC Program
-        new_program.postProcess(post_options)
+        with trace.stage('nc_program', operations=len(operations)):
+            new_program.postProcess(post_options)
         
         # Verify output
+        nc_file = normalize_path(os.path.join(params['output_folder'], f"{params['program_name']}.nc"))
+        status = 'failed'
         if not new_program.hasError:
-            nc_file = normalize_path(os.path.join(params['output_folder'], f"{params['program_name']}.nc"))
-
             if os.path.exists(nc_file):
                 file_size = os.path.getsize(nc_file)
                 futil.log(f"Successfully generated NC file: {params['program_name']} ({file_size} bytes)", force_console=True)
                 futil.log(f"File path: {nc_file}", force_console=True)
+                status = 'ok'
             else:
                 futil.log(f"Error: Output NC file was not created", force_console=True)
         else:
@@ -763,27 +920,21 @@ def execute_standard_workflow(cam, operations, params):
 
         exec_time = time.time() - start_time
         futil.log(f"G-code generation completed in {exec_time:.2f} seconds", force_console=True)
+        finish_run_trace(trace, status, [nc_file])
 
     except Exception as e:
+        if RUN_TRACE:
+            finish_run_trace(RUN_TRACE, 'failed', error=str(e))
         ui.messageBox(f"Standard workflow error: {str(e)}")
         futil.log(f"Standard workflow error: {str(e)}", force_console=True)
 
 def batch_post(cam, operations, **post_params):
-    """Batch postprocessing with XML merging for Fusion 360 Personal license."""
+    """Batch postprocessing with XML merging for Fusion 360 Personal license. Returns None when cancelled."""
     start_time = time.time()
 
     # Validate critical paths
-    missing_files = []
-    if not os.path.exists(XML_POST_FILE):
-        missing_files.append(normalize_path(XML_POST_FILE))
-    
-    post_exe_path = find_fusion_post_exe()
-    if not post_exe_path:
-        missing_files.append(normalize_path("post.exe"))
-    
-    if missing_files:
-        error_msg = "Missing required files:\n" + "\n".join(f"• {f}" for f in missing_files)
-        ui.messageBox(error_msg)
+    ready, post_exe_path = check_post_requirements()
+    if not ready:
         return False
 
     # Get parameters from **post_params
@@ -802,164 +953,439 @@ def batch_post(cam, operations, **post_params):
     futil.log(f"Post processor path: {post_processor}")
     futil.log(f"Unit: {unit}")
 
+    # Reset cache counters for this run
+    cache = get_artifact_cache()
+    if cache:
+        cache.reset_stats()
+
+    # Temporary files are staged locally, only the finished NC file goes to the output folder
+    workspace = open_staging_workspace()
+    work_folder = workspace.path if workspace else output_folder
+    gcode_params = dict(post_params, open_in_editor=False) if workspace else post_params
+
     # Setup logging
-    log_path = normalize_path(os.path.join(output_folder, f"{program_name}.log"))
-    progress_path = normalize_path(os.path.join(output_folder, f"progress.tmp"))
+    log_path = normalize_path(os.path.join(work_folder, f"{program_name}.log"))
+    progress_path = normalize_path(os.path.join(config.STAGING_FOLDER if workspace else output_folder, f"progress.tmp"))
     setup_logging(progress_path)
+    trace = start_run_trace('personal', program=program_name, post=os.path.basename(post_processor),
+                            machine=get_machine_name(operations), unit=unit)
+
+    progress = create_progress('Batch Post Processing', BATCH_PROGRESS_STAGES)
+    processed_ops = []
+    merged_xml = normalize_path(os.path.join(work_folder, f"{program_name}_merged.xml"))
+    nc_file = normalize_path(os.path.join(output_folder, f"{program_name}.nc"))
+    staged_nc = normalize_path(os.path.join(work_folder, f"{program_name}.nc"))
+    merger = None
 
     try:
-        # Create progress dialog 
-        progress_dialog = ui.createProgressDialog()
-        progress_dialog.isCancelButtonShown = False
-        progress_dialog.show('Batch Post Processing', 'Initializing...', 0, 3)
-        adsk.doEvents()
-        time.sleep(0.05)
-
-        # Process each operation to generate XML files
-        processed_ops = process_operations(cam, operations, program_name, XML_POST_FILE, 
-                                         output_folder, unit, post_params)
+        # Process each operation to generate XML files, merging each one as soon as it exists
+        progress.start_stage('xml', len(operations), 'Generating XML...')
+        merger = start_background_merge(merged_xml)
+        with trace.stage('xml') as stage:
+            processed_ops = process_operations(cam, operations, program_name, XML_POST_FILE, 
+                                             work_folder, unit, post_params, progress,
+                                             merger.submit if merger else None)
+            if not processed_ops:
+                raise Exception("No XML files generated for merging")
+            stage['bytes'] = sum(os.path.getsize(path) for path in processed_ops)
+
+        progress.start_stage('merge', stage['bytes'], 'Merging XML files...')
+        create_merged_xml(processed_ops, merged_xml, post_params, progress, merger)
         
-        if not processed_ops:
-            raise Exception("No XML files generated for merging")
+        # G-code generation, progress is measured in XML bytes read or NC bytes written
+        xml_size = os.path.getsize(merged_xml)
+        if config.FAST_POST_ENGINE:
+            progress.start_stage('post', xml_size, 'Generating G-code...')
+            generated = generate_gcode_builtin(merged_xml, staged_nc, pgm_num, unit, gcode_params, progress)
+        else:
+            progress.start_stage('post', xml_size * config.POST_NC_SIZE_RATIO, 'Generating G-code...')
+            generated = generate_gcode(post_exe_path, post_processor, merged_xml, staged_nc,
+                                       pgm_num, unit, gcode_params, log_path, progress)
+        if not generated:
+            progress.check()
+            raise Exception("G-code generation failed")
+        if workspace:
+            publish_nc_file(staged_nc, nc_file, post_params, progress)
         
-        progress_dialog.message = 'Processing operation completed'
-        progress_dialog.progressValue = 1
-        adsk.doEvents()
-        time.sleep(0.05)
+        exec_time = time.time() - start_time
+        futil.log(f"G-code generation completed in {exec_time:.2f} seconds", force_console=True)
+        if cache:
+            futil.log(f"Artifact cache: {cache.summary()}", force_console=True)
+            cache.evict()
+        finish_run_trace(trace, 'ok', [nc_file])
+        progress.close()
+        return True
+
+    except sputil.progress.OperationCancelled:
+        progress.close()
+        if merger:
+            # Files the writer thread still had open could not be removed while it ran
+            merger.abort()
+            processed_ops = processed_ops or merger.file_paths
+        # A partial NC file only exists once post processing started, earlier stages leave the previous one alone
+        stopped_files = [staged_nc] if progress.stage == 'post' else []
+        remove_temporary_files(*processed_ops, merged_xml, log_path,
+                               f"{os.path.splitext(log_path)[0]}_stdout.log", *stopped_files)
+        finish_run_trace(trace, 'cancelled')
+        futil.log(f"Batch Post cancelled by the user after {time.time() - start_time:.2f} seconds, "
+                  f"temporary files removed", force_console=True)
+        return None
+
+    except Exception as e:
+        progress.close()
+        if merger:
+            merger.abort()
+        if workspace:
+            keep_staged_logs(workspace, output_folder)
+        finish_run_trace(trace, 'failed', error=str(e))
+        futil.log(f"Batch Post error:\n{str(e)}", force_console=True)
+        ui.messageBox(f"Batch Post error:\n{str(e)}")
+        return False
+
+    finally:
+        if workspace:
+            workspace.close()
 
-        merged_xml = normalize_path(os.path.join(output_folder, f"{program_name}_merged.xml"))
+def batch_post_setups(cam, setup_batches, **post_params):
+    """Posts each setup to its own NC file, running the post.exe jobs in a bounded parallel pool."""
+    start_time = time.time()
+
+    ready, post_exe_path = check_post_requirements()
+    if not ready:
+        return False
+
+    # Temporary files are staged locally, only the finished NC files go to the output folder
+    output_folder = normalize_path(post_params['output_folder'])
+    workspace = open_staging_workspace()
+    setup_logging(normalize_path(os.path.join(config.STAGING_FOLDER if workspace else output_folder, "progress.tmp")))
+    futil.log(f"=== Posting {len(setup_batches)} setups to {output_folder} ===", force_console=True)
+    try:
+        return post_setups(cam, setup_batches, post_exe_path, workspace, start_time, **post_params)
+    finally:
+        if workspace:
+            workspace.close()
 
+def post_setups(cam, setup_batches, post_exe_path, workspace, start_time, **post_params):
+    """Body of batch_post_setups, temporary files go to the staging workspace when there is one"""
+    output_folder = normalize_path(post_params['output_folder'])
+    base_name = post_params['program_name']
+    post_processor = normalize_path(post_params['post_path'])
+    unit = post_params['unit']
+    work_folder = workspace.path if workspace else output_folder
+    gcode_params = dict(post_params, open_in_editor=False) if workspace else post_params
+
+    cache = get_artifact_cache()
+    if cache:
+        cache.reset_stats()
+
+    progress = create_progress('Batch Post Processing', SETUPS_PROGRESS_STAGES)
+    progress.start_stage('xml', sum(len(operations) for _, operations in setup_batches), 'Generating XML...')
+
+    # Fusion API calls stay on the main thread: generate and merge the XML of every setup first
+    results = []
+    jobs = []
+    for index, (setup_name, operations) in enumerate(setup_batches):
+        if not progress.poll():
+            break
+        program_name = f"{base_name}_{safe_file_name(setup_name)}"
+        result = {'setup': setup_name, 'nc_file': normalize_path(os.path.join(output_folder, f"{program_name}.nc")),
+                  'staged_nc': normalize_path(os.path.join(work_folder, f"{program_name}.nc")), 'status': 'failed', 'xml_size': 0, 'nc_size': 0, 'xml_time': 0.0, 'post_time': 0.0}
+        results.append(result)
+        progress.update(progress.done, f'Generating XML for {setup_name} ({index + 1} of {len(setup_batches)})')
+
+        setup_start = time.time()
+        processed_ops = []
+        result['trace'] = trace = start_run_trace('all_setups', program=program_name, setup=setup_name,
+                                                  post=os.path.basename(post_processor),
+                                                  machine=get_machine_name(operations), unit=unit)
+        merged_xml = normalize_path(os.path.join(work_folder, f"{program_name}_merged.xml"))
+        merger = start_background_merge(merged_xml)
         try:
-            if len(processed_ops) == 1:
+            with trace.stage('xml') as stage:
+                processed_ops = process_operations(cam, operations, program_name, XML_POST_FILE,
+                                                   work_folder, unit, post_params, progress,
+                                                   merger.submit if merger else None)
+                if not processed_ops:
+                    raise Exception("No XML files generated for merging")
+                stage['bytes'] = sum(os.path.getsize(path) for path in processed_ops)
+            create_merged_xml(processed_ops, merged_xml, post_params, progress.quiet(), merger)
+        except sputil.progress.OperationCancelled:
+            result['status'] = 'cancelled'
+            if merger:
+                merger.abort()
+                processed_ops = processed_ops or merger.file_paths
+            remove_temporary_files(*processed_ops)
+            break
+        except Exception as e:
+            if merger:
+                merger.abort()
+            result['status'] = f"failed: {str(e)}"
+            futil.log(f"Setup {setup_name} failed: {str(e)}", force_console=True)
+            continue
+        result['xml_size'] = os.path.getsize(merged_xml)
+        result['xml_time'] = time.time() - setup_start
+
+        # Numeric program numbers are incremented per setup so every NC file gets its own number
+        pgm_num = post_params['program_number']
+        if str(pgm_num).isdigit():
+            pgm_num = str(int(pgm_num) + index).zfill(len(str(pgm_num)))
+        log_path = normalize_path(os.path.join(work_folder, f"{program_name}.log"))
+
+        if config.FAST_POST_ENGINE:
+            post_start = time.time()
+            generated = generate_gcode_builtin(merged_xml, result['staged_nc'], pgm_num, unit, gcode_params,
+                                               progress.quiet())
+            result['status'] = 'ok' if generated else 'cancelled' if progress.cancelled else 'failed'
+            result['post_time'] = time.time() - post_start
+            if result['status'] == 'cancelled':
+                remove_temporary_files(merged_xml)
+            continue
+
+        job = prepare_post_job(post_exe_path, post_processor, merged_xml, result['staged_nc'], pgm_num, unit,
+                               gcode_params, log_path)
+        if job is None:
+            result['status'] = 'cached'
+            trace.add_stage('post', 0.0, engine='post.exe', cached=True)
+        else:
+            job['result'] = result
+            jobs.append(job)
+
+    # post.exe runs outside Fusion, so the jobs can use several cores at once
+    max_workers = config.POST_MAX_WORKERS or sputil.default_worker_count()
+    pool = sputil.PostProcessPool(max_workers)
+    for job in jobs:
+        remove_temporary_files(job['nc_file'])
+        job['run'] = pool.submit(sputil.PostProcessRun(job['params'], job['stdout_path'], timeout=job['timeout'],
+                                                       poll_interval=config.POST_POLL_INTERVAL))
+    futil.log(f"Running {len(jobs)} post.exe jobs with up to {pool.max_workers} in parallel", force_console=True)
+    if progress.cancelled:
+        pool.cancel()
+
+    progress.start_stage('post', len(jobs), 'Generating G-code...')
+    while pool.poll(config.POST_POLL_INTERVAL):
+        if not progress.update(len(pool.finished), f'Generating G-code: {len(pool.finished)} of {len(jobs)} done, '
+                                                   f'{len(pool.active)} running'):
+            pool.cancel()
+
+    for job in jobs:
+        result = job['result']
+        result['post_time'] = job['run'].elapsed
+        result['trace'].add_stage('post', job['run'].elapsed, bytes=job['xml_size'],
+                                  **post_run_fields(job['run'], job['nc_file']))
+        if finish_post_job(job, job['run']):
+            result['status'] = 'ok'
+        elif job['run'].cancelled:
+            result['status'] = 'cancelled'
+            remove_temporary_files(job['merged_xml'], job['nc_file'], job['log_path'], job['stdout_path'])
+
+    # The finished NC files are published once every post.exe job is done
+    if workspace:
+        for result in results:
+            if result['status'] in ('ok', 'cached'):
+                try:
+                    publish_nc_file(result['staged_nc'], result['nc_file'], post_params, progress)
+                except Exception as e:
+                    result['status'] = f"failed: {str(e)}"
+                    futil.log(f"Setup {result['setup']} failed: {str(e)}", force_console=True)
+        if any(r['status'].startswith('failed') for r in results):
+            keep_staged_logs(workspace, output_folder)
+
+    for result in results:
+        if os.path.exists(result['nc_file']) and result['status'] in ('ok', 'cached'):
+            result['nc_size'] = os.path.getsize(result['nc_file'])
+        # Setups share the wall clock, so each record covers only its own XML and post time
+        finish_run_trace(result['trace'], 'ok' if result['status'] in ('ok', 'cached') else result['status'],
+                         [result['nc_file']], seconds=round(result['xml_time'] + result['post_time'], 6))
+
+    progress.close()
+    if cache:
+        futil.log(f"Artifact cache: {cache.summary()}", force_console=True)
+        cache.evict()
+
+    # One summary for the whole run
+    summary = [f"Posted {sum(r['status'] in ('ok', 'cached') for r in results)} of {len(setup_batches)} setups "
+               f"in {time.time() - start_time:.2f} seconds"]
+    for result in results:
+        summary.append(f"{result['setup']}: {result['status']}, XML {result['xml_size'] / 1024 ** 2:.2f} MB "
+                       f"in {result['xml_time']:.2f} s, NC {result['nc_size'] / 1024:.1f} KB "
+                       f"in {result['post_time']:.2f} s")
+    for line in summary:
+        futil.log(line, force_console=True)
+    ui.messageBox("\n".join(summary), "Batch Post Summary")
+    return all(r['status'] in ('ok', 'cached') for r in results) and len(results) == len(setup_batches)
+
+def check_post_requirements():
+    """Checks xml.cps and post.exe. Returns (ready, post_exe_path), post_exe_path is None for the built-in engine."""
+    missing_files = []
+    if not os.path.exists(XML_POST_FILE):
+        missing_files.append(normalize_path(XML_POST_FILE))
+    
+    # The built-in engine posts without post.exe
+    post_exe_path = None if config.FAST_POST_ENGINE else find_fusion_post_exe()
+    if not post_exe_path and not config.FAST_POST_ENGINE:
+        missing_files.append(normalize_path("post.exe"))
+    
+    if missing_files:
+        error_msg = "Missing required files:\n" + "\n".join(f"• {f}" for f in missing_files)
+        ui.messageBox(error_msg)
+        return False, None
+    return True, post_exe_path
+
+def create_merged_xml(processed_ops, merged_xml, post_params, progress=None, merger=None):
+    """Merges the generated XML files into one and applies the optional compaction and estimate steps.
+
+    With a background merger the files were already merged while they were generated,
+    only the last ones are waited for.
+    """
+    trace = current_run_trace()
+    try:
+        with trace.stage('merge', files=len(processed_ops)) as stage:
+            if merger:
+                stage['pipelined'] = True
+                finish_background_merge(merger, processed_ops, progress)
+            elif len(processed_ops) == 1:
                 # For single file
                 os.replace(processed_ops[0], merged_xml)
             else:
                 # For multiple files
-                if not merge_xml_files(processed_ops, merged_xml):
+                if not merge_xml_files(processed_ops, merged_xml, progress):
                     raise Exception("XML merging failed")
+            stage['bytes'] = os.path.getsize(merged_xml)
 
-        except Exception as e:
-            raise Exception(f"Failed to create merged XML file: {str(e)}")
-        
-        progress_dialog.message = 'Merging XML files completed'
-        progress_dialog.progressValue = 2
-        adsk.doEvents()
-        time.sleep(0.05)
-        
-        # G-code generation
-        nc_file = normalize_path(os.path.join(output_folder, f"{program_name}.nc"))
-        
-        if not generate_gcode(post_exe_path, post_processor, merged_xml, nc_file, 
-                              pgm_num, unit, post_params, log_path):
-            raise Exception("G-code generation failed")
-        
-        exec_time = time.time() - start_time
-        futil.log(f"G-code generation completed in {exec_time:.2f} seconds", force_console=True)
-        progress_dialog.message = 'G-code generation completed'
-        progress_dialog.progressValue = 3
-        adsk.doEvents()
-        time.sleep(0.05)
-        progress_dialog.hide()
-        return True
-
+    except sputil.progress.OperationCancelled:
+        raise
     except Exception as e:
-        if 'progress_dialog' in locals():
-            progress_dialog.hide()
-        futil.log(f"Batch Post error:\n{str(e)}", force_console=True)
-        ui.messageBox(f"Batch Post error:\n{str(e)}")
-        return False
+        raise Exception(f"Failed to create merged XML file: {str(e)}")
+
+    if config.TOOLPATH_COMPACTION:
+        with trace.stage('compact') as stage:
+            stats = compact_merged_xml(merged_xml, post_params)
+            if stats:
+                stage.update(moves=stats['blocks_out'], reduction=round(stats['reduction'], 4))
+
+    if config.CYCLE_TIME_ESTIMATE:
+        with trace.stage('estimate'):
+            log_cycle_time_estimate(merged_xml)
+
+    # Totals of the program as posted
+    trace.record['xml_bytes'] = os.path.getsize(merged_xml)
+    if config.RUN_HISTORY:
+        trace.record['moves'] = sputil.instrumentation.count_moves(merged_xml)
+
+def start_background_merge(merged_xml):
+    """Starts merging the XML files of a program on a writer thread as they are generated"""
+    if not config.MERGE_WHILE_GENERATING:
+        return None
+    # The writer thread logs to the log file only, the Fusion API is used from the main thread
+    return sputil.pipeline.BackgroundMerge(merged_xml, config.MERGE_CHUNK_SIZE, config.MERGE_ZERO_COPY,
+                                           log=logging.info, remove_inputs=False)
 
-def merge_xml_files(file_paths, output_file):
-    """Merges multiple XML files into one output file"""
+def finish_background_merge(merger, file_paths, progress=None):
+    """Waits for the writer thread to merge the remaining files, then removes the merged inputs"""
+    progress = progress or create_background_progress()
+    try:
+        while not merger.wait(config.PROGRESS_UPDATE_INTERVAL):
+            progress.update(merger.bytes_written, f'Merging XML files: {merger.bytes_written / 1024 ** 2:.1f} MB')
+            progress.check()
+        merger.finish()
+    except sputil.progress.OperationCancelled:
+        merger.abort()
+        futil.log("XML merge cancelled, partial output removed", force_console=True)
+        raise
+    futil.log(f"Successfully merged XML files into: {merger.merger.output_file}", force_console=True)
+    remove_temporary_files(*file_paths)
+
+def open_staging_workspace():
+    """Creates the local scratch folder of one run and removes those left by crashed runs.
+    Returns None when staging is disabled or not possible, temporary files then go to the output folder."""
+    if not config.STAGING:
+        return None
+    try:
+        removed = sputil.staging.clean_stale_workspaces(config.STAGING_FOLDER)
+        if removed:
+            futil.log(f"Removed {len(removed)} staging folders left by earlier runs")
+        return sputil.staging.StagingWorkspace(config.STAGING_FOLDER)
+    except OSError as e:
+        futil.log(f"Staging folder not available, writing temporary files to the output folder: {str(e)}",
+                  force_console=True)
+        return None
+
+def publish_nc_file(staged_nc, nc_file, post_params, progress=None):
+    """Moves a finished NC file from the staging folder to the output folder and opens it when requested"""
+    progress = progress or create_background_progress()
+    # A copy to a network share runs in the background and is not cancelled half way
+    job = sputil.staging.PublishJob(staged_nc, nc_file).start()
+    while not job.wait(config.PROGRESS_UPDATE_INTERVAL):
+        progress.poll()
+    if job.error:
+        raise Exception(f"Could not publish the NC file to {os.path.dirname(nc_file)}: {str(job.error)}")
+    futil.log(f"Published NC file to {nc_file} ({job.method})", force_console=True)
+
+    if post_params.get('open_in_editor', False) and hasattr(os, 'startfile'):
+        os.startfile(nc_file)
+
+def keep_staged_logs(workspace, output_folder):
+    """Copies the post logs of a failed run to the output folder before its staging folder is removed"""
+    for folder, _, file_names in os.walk(workspace.path):
+        for file_name in file_names:
+            if file_name.endswith('.log'):
+                log_file = os.path.join(folder, file_name)
+                target = os.path.join(output_folder, os.path.relpath(log_file, workspace.path))
+                try:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copy2(log_file, target)
+                except OSError as e:
+                    futil.log(f"Could not keep {file_name}: {str(e)}")
+
+def merge_xml_files(file_paths, output_file, progress=None):
+    """Merges multiple XML files into one output file using constant-memory streaming"""
     futil.log("==============================", force_console=True)
     futil.log("======= Merging files ========", force_console=True)
     futil.log("==============================", force_console=True)
 
-    # Validate input files
-    for file_path in file_paths:
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"XML file not found: {file_path}")
+    progress = progress or create_background_progress()
 
-    # Ensure output directory exists
-    output_dir = os.path.dirname(output_file)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    def merge_progress(written):
+        progress.update(written, f'Merging XML files: {written / 1024 ** 2:.1f} MB')
+        progress.check()
 
     try:
-        # Open output file for writing
-        with open(output_file, 'w', encoding='utf-8') as out_file:
-            # Process first file
-            with open(file_paths[0], 'r', encoding='utf-8') as first_file:
-                first_content = first_file.read()
-                nc_end = first_content.rfind('</nc>')
-                if nc_end == -1:
-                    raise ValueError("First file is not valid NC XML (missing </nc> tag)")
-                out_file.write(first_content[:nc_end])
-
-            # Process subsequent files
-            for i, file_path in enumerate(file_paths[1:], 1):
-                with open(file_path, 'r', encoding='utf-8') as current_file:
-                    content = current_file.read()
-                    nc_end = content.rfind('</nc>')
-                    if nc_end == -1:
-                        futil.log(f"Warning: Invalid NC XML in {file_path}, skipping", force_console=True)
-                        continue
-
-                    # Find spindle parameters
-                    spindle_param = max(
-                        content.find("<parameter name='areBothSpindlesGrabbed'"),
-                        content.find('<parameter name="areBothSpindlesGrabbed"')
-                    )
-
-                    # Find tool/section start
-                    section_start = max(
-                        content.find('<tool'),
-                        content.find('<section')
-                    )
-
-                    # Write extracted content
-                    if spindle_param != -1 and section_start != -1:
-                        out_file.write('\n' + content[spindle_param:section_start].strip())
-                    
-                    if section_start != -1:
-                        out_file.write('\n' + content[section_start:nc_end].strip())
-                    elif spindle_param == -1:
-                        out_file.write('\n' + content[:nc_end].strip())
-                    
-                    futil.log(f"Merged file {i}: {file_path}", force_console=True)
-
-            out_file.write('\n</nc>')
-
-            # Verify output file
-            if os.path.getsize(output_file) == 0:
-                raise ValueError("Merged file is empty")
-            else:
-                futil.log(f"Successfully merged XML files into: {output_file}", force_console=True)
-
-        # Cleanup temporary files
-        for file_path in file_paths:
-            try:
-                os.remove(file_path)
-                futil.log(f"Removed temporary file: {file_path}")
-            except Exception as e:
-                futil.log(f"Warning: Could not remove {file_path} - {str(e)}")
-        
-        return True
-
+        sputil.pipeline.merge_xml_files(file_paths, output_file, config.MERGE_CHUNK_SIZE, config.MERGE_ZERO_COPY,
+                                        log=lambda message: futil.log(message, force_console=True),
+                                        on_progress=merge_progress)
+        futil.log(f"Successfully merged XML files into: {output_file}", force_console=True)
+    except sputil.progress.OperationCancelled:
+        futil.log("XML merge cancelled, partial output removed", force_console=True)
+        raise
     except Exception as e:
         ui.messageBox(f"XML merge error: {str(e)}")
-        if os.path.exists(output_file):
-            os.remove(output_file)
         return False
 
-def process_operations(cam, operations, program_name, post_processor, output_folder, unit, post_params):
-    """Process individual operations to numbered XML files with optimized object creation"""
+    # Cleanup temporary files
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+            futil.log(f"Removed temporary file: {file_path}")
+        except Exception as e:
+            futil.log(f"Warning: Could not remove {file_path} - {str(e)}")
+
+    return True
+
+def process_operations(cam, operations, program_name, post_processor, output_folder, unit, post_params,
+                       progress=None, on_generated=None):
+    """Process operations to numbered XML files, one post call per run of operations sharing a tool.
+
+    Reports one progress step per operation and raises OperationCancelled between post
+    calls once the user cancels, after removing the XML files generated so far.
+    on_generated(xml_path) is called with each file as soon as it exists, in program order.
+    """
     # Batch logging initialization
     futil.log("===============================", force_console=True)
     futil.log("=== Starting XML generation ===", force_console=True)
     futil.log("===============================", force_console=True)
     futil.log(f"Program name: {program_name}")
     futil.log(f"Output folder: {output_folder}")
+    start_time = time.time()
 
     # Normalize output folder once
     output_folder = normalize_path(output_folder)
@@ -968,12 +1394,15 @@ def process_operations(cam, operations, program_name, post_processor, output_fol
 
     generated_files = []
     operations = list(operations)
+    progress = progress or create_background_progress()
 
     # Pre-create value inputs for post properties
     def create_value_input(value, value_type):
         value = value_type(value)
         if value_type is bool:
             return adsk.core.ValueInput.createByBoolean(value)
+        if value_type is str:
+            return adsk.core.ValueInput.createByString(value)
         return adsk.core.ValueInput.createByReal(float(value))
 
     # Mapping of parameters to their types
@@ -984,118 +1413,282 @@ def process_operations(cam, operations, program_name, post_processor, output_fol
         "highFeedrate": float,
         "maximumCircularRadius": float,
         "minimumCircularRadius": float,
-        "tolerance": float
+        "tolerance": float,
+        "lean": bool,
+        "leanParameters": str
     }
 
-    for i, op in enumerate(operations, 1):
-        op_name = op.name if hasattr(op, 'name') else f"Op_{i}"
-        numbered_name = f"{program_name}_{i}"
+    # Typed post property values, shared by every operation
+    property_values = {param: param_type(post_params[param])
+                       for param, param_type in param_mapping.items() if param in post_params}
+
+    # Lean xml.cps output keeps the intermediate files small, see LEAN_XML in config.py
+    if config.LEAN_XML:
+        property_values['lean'] = True
+        property_values['leanParameters'] = config.LEAN_XML_PARAMETERS
+
+    # Everything besides the operation itself that determines the XML output
+    cache = get_artifact_cache()
+    cache_context = None
+    if cache:
+        design_fingerprint = get_design_fingerprint()
+        if design_fingerprint is None:
+            futil.log("Artifact cache skipped for XML: design state cannot be fingerprinted")
+        else:
+            cache_context = {
+                'post': sputil.file_digest(post_processor),
+                'unit': unit,
+                'properties': property_values,
+                'design': design_fingerprint
+            }
+    setup_fingerprints = {}
+
+    # Create PostProcessInput and properties once, only the program name changes per call
+    post_input = adsk.cam.PostProcessInput.create(
+        program_name,
+        post_processor,
+        output_folder,
+        unit
+    )
+    post_input.isOpenInEditor = False
+
+    post_properties = adsk.core.NamedValues.create()
+    for param, value in property_values.items():
+        value_input = create_value_input(value, param_mapping[param])
+        post_properties.add(param, value_input)
+
+    post_input.postProperties = post_properties
+
+    trace = current_run_trace()
+
+    def post_group(group, index):
+        """Posts a group of operations to one numbered XML file and returns its path."""
+        op_names = ", ".join(op.name for op in group)
+        progress.update(progress.done, f'Generating XML: {op_names}')
+        with trace.operation(op_names, operations=len(group)) as entry:
+            xml_path = post_group_xml(group, index, op_names, entry)
+            entry['bytes'] = os.path.getsize(xml_path)
+        progress.advance(len(group))
+        return xml_path
+
+    def post_group_xml(group, index, op_names, entry):
+        numbered_name = f"{program_name}_{index}"
         xml_path = normalize_path(os.path.join(output_folder, f"{numbered_name}.xml"))
 
-        try:
-            # Create PostProcessInput
-            post_input = adsk.cam.PostProcessInput.create(
-                numbered_name,
-                post_processor,
-                output_folder,
-                unit
-            )
-            post_input.isOpenInEditor = False
-
-            # Optimized properties creation
-            post_properties = adsk.core.NamedValues.create()
-            for param, param_type in param_mapping.items():
-                if param in post_params:
-                    value_input = create_value_input(post_params[param], param_type)
-                    post_properties.add(param, value_input)
-
-            post_input.postProperties = post_properties
-
-            # Execute post processing
-            if not cam.postProcess(op, post_input):
-                raise RuntimeError("CAM post processing returned False")
-            
-            # Verify result
-            if not os.path.exists(xml_path):
-                raise FileNotFoundError(f"Output file was not created: {xml_path}")
-            
-            generated_files.append(xml_path)
-            futil.log(f"Successfully processed: {op_name} -> {xml_path}", force_console=True)
-            
-        except Exception as e:
-            error_msg = f"Failed to process {op_name}: {str(e)}"
-            futil.log(error_msg, force_console=True)
-            ui.messageBox(error_msg, "Processing XML Error")
-            return None
-    
+        # Reuse the cached XML when the operations are unchanged
+        cache_key = None
+        if cache_context and all(op.isToolpathValid for op in group):
+            fingerprints = [get_operation_fingerprint(op, setup_fingerprints) for op in group]
+            cache_key = sputil.make_key('xml', cache_context, fingerprints)
+            if cache.get('xml', cache_key, xml_path, link=True):
+                futil.log(f"Reused cached XML: {op_names} -> {xml_path}", force_console=True)
+                entry['cached'] = True
+                return xml_path
+
+        post_input.programName = numbered_name
+
+        # Execute post processing
+        if len(group) == 1:
+            post_target = group[0]
+        else:
+            post_target = adsk.core.ObjectCollection.create()
+            for op in group:
+                post_target.add(op)
+
+        if not cam.postProcess(post_target, post_input):
+            raise RuntimeError("CAM post processing returned False")
+
+        # Verify result
+        if not os.path.exists(xml_path):
+            raise FileNotFoundError(f"Output file was not created: {xml_path}")
+
+        futil.log(f"Successfully processed: {op_names} -> {xml_path}", force_console=True)
+
+        if cache_key:
+            cache.put('xml', cache_key, xml_path, link=True)
+        return xml_path
+
+    # Group consecutive operations sharing a tool, these post without a tool change
+    if config.BATCH_BY_TOOL:
+        groups = group_operations_by_tool(operations)
+        futil.log(f"Batched {len(operations)} operations into {len(groups)} post calls")
+    else:
+        groups = [[op] for op in operations]
+
+    def add_generated(xml_path):
+        generated_files.append(xml_path)
+        if on_generated:
+            on_generated(xml_path)
+
+    batching = True
+    file_index = 0
+    try:
+        for group in groups:
+            # cam.postProcess blocks, so cancellation is honoured between post calls
+            progress.check()
+            if len(group) > 1 and batching:
+                try:
+                    add_generated(post_group(group, file_index + 1))
+                    file_index += 1
+                    continue
+                except Exception as e:
+                    # The licence may refuse multi-operation posts, use single calls from now on
+                    batching = False
+                    futil.log(f"Batched post failed, falling back to per-operation calls: {str(e)}", force_console=True)
+
+            for op in group:
+                progress.check()
+                try:
+                    add_generated(post_group([op], file_index + 1))
+                    file_index += 1
+                except Exception as e:
+                    error_msg = f"Failed to process {op.name}: {str(e)}"
+                    futil.log(error_msg, force_console=True)
+                    ui.messageBox(error_msg, "Processing XML Error")
+                    return None
+    except sputil.progress.OperationCancelled:
+        futil.log(f"XML generation cancelled after {len(generated_files)} files", force_console=True)
+        remove_temporary_files(*generated_files)
+        raise
+
+    # Report intermediate size and throughput to compare lean and full output
+    xml_size = sum(os.path.getsize(path) for path in generated_files) / (1024 * 1024)
+    elapsed = time.time() - start_time
+    futil.log(f"Generated {len(generated_files)} XML files, {xml_size:.2f} MB in {elapsed:.2f} seconds "
+              f"({xml_size / max(elapsed, 1e-6):.2f} MB/s, lean output {'on' if config.LEAN_XML else 'off'})",
+              force_console=True)
     return generated_files
 
-def generate_gcode(post_exe_path, post_processor, merged_xml, nc_file, pgm_num, unit, post_params, log_path):
-    """Execute post.exe to generate final G-code"""
+def generate_gcode(post_exe_path, post_processor, merged_xml, nc_file, pgm_num, unit, post_params, log_path,
+                   progress=None):
+    """Execute post.exe in the background to generate final G-code"""
     futil.log("==================================", force_console=True)
     futil.log("=== Starting G-code generation ===", force_console=True)
     futil.log("==================================", force_console=True)
 
-    # Build command parameters
-    params = [
-        f'"{normalize_path(post_exe_path)}"',
-        "--log", f'"{normalize_path(log_path)}"',
-        "--allowui",
-        "--sandbox",
-        "--lang", "en"
-    ]
-
-    # Open NC File in Editor
-    if not post_params.get('open_in_editor', False):
-        params.append("--noeditor")
-    
-    # Set unit and rate suffixes
-    unit_suffix, unit_rate = ("in", "in/min") if unit == 0 else ("mm", "mm/min")
-
-    # Extended parameters for post.exe
-    params.extend([
-        "--property", "allowHelicalMoves", str(post_params['allowHelicalMoves']).lower(),
-        "--property", "highFeedMapping", str(post_params['highFeedMapping']),
-        "--property", "minimumChordLength", f"{post_params.get('minimumChordLength', 0)}{unit_suffix}",
-        "--property", "highFeedrate", f"{post_params.get('highFeedrate', 0)}{unit_rate}",
-        "--property", "maximumCircularRadius", f"{post_params.get('maximumCircularRadius', 0)}{unit_suffix}",
-        "--property", "minimumCircularRadius", f"{post_params.get('minimumCircularRadius', 0)}{unit_suffix}",
-        "--property", "tolerance", f"{post_params.get('tolerance', 0)}{unit_suffix}",
-        "--property", "programComment", f"'{post_params['comment']}'",
-        "--property", "programName", str(pgm_num),
-        "--property", "unit", str(unit),
-        f'"{normalize_path(post_processor)}"',
-        f'"{normalize_path(merged_xml)}"',
-        f'"{normalize_path(nc_file)}"'
-    ])
-
-    # Debug mode
-    if logging.getLogger().level == logging.DEBUG:
-        params.insert(3, "--debug")
+    with current_run_trace().stage('post', engine='post.exe') as stage:
+        job = prepare_post_job(post_exe_path, post_processor, merged_xml, nc_file, pgm_num, unit, post_params, log_path)
+        if job is None:
+            stage['cached'] = True
+            end_dnc_stream(start_dnc_stream(nc_file), True)
+            return True
+
+        stream = None
+        spliced_nc = None
+        section_key = section_cache_key(post_exe_path, post_processor, job['properties']) if use_section_cache(job) else None
+        try:
+            # Execute post processor
+            if os.path.exists(nc_file):
+                os.remove(nc_file)
+            if section_key or use_split_post(job):
+                split = run_split_post(job, post_exe_path, post_processor, progress, section_key)
+                stage['pieces'] = split['chunks']
+                if section_key:
+                    stage['cached_pieces'] = split['cached']
+                if split['status'] == 'ok' and section_key and splice_check_due(section_key):
+                    # The full post below is the result of this run, the spliced program is compared with it
+                    spliced_nc = f"{os.path.splitext(nc_file)[0]}.spliced.nc"
+                    os.replace(nc_file, spliced_nc)
+                    stage['splice_checked'] = True
+                    futil.log("Checking the spliced program against a full post", force_console=True)
+                elif split['status'] == 'ok':
+                    stage.update(bytes=job['xml_size'], nc_bytes=os.path.getsize(nc_file), returncode=0)
+                    end_dnc_stream(start_dnc_stream(nc_file), True)
+                    return finish_split_post(job, split, post_params)
+                elif split['status'] == 'cancelled':
+                    stage.update(status='failed', cancelled=True)
+                    futil.log("Post processing was cancelled by the user", force_console=True)
+                    return False
+                elif split['status'] != 'unsplittable':
+                    futil.log(f"Split post {split['status']}, posting the program in one piece", force_console=True)
+
+            # The NC file is streamed to the DNC server while post.exe writes it
+            stream = start_dnc_stream(nc_file)
+            futil.log(f"Starting post.exe process (timeout {job['timeout']:.0f} seconds)...")
+            run = run_post_exe(job['params'], nc_file, job['stdout_path'], job['timeout'], progress)
+        except Exception as e:
+            end_dnc_stream(stream, False)
+            if spliced_nc:
+                remove_temporary_files(spliced_nc)
+            logging.error(f"Post execution error: {str(e)}")
+            futil.log(f"Post execution error: {str(e)}", force_console=True)
+            stage.update(status='error', error=str(e))
+            return False
+
+        end_dnc_stream(stream, run.succeeded and os.path.exists(nc_file))
+        stage.update(post_run_fields(run, nc_file), bytes=job['xml_size'])
+        posted = finish_post_job(job, run)
+        if spliced_nc:
+            record_splice_check(section_key, spliced_nc, nc_file if posted else None)
+        return posted
+
+def prepare_post_job(post_exe_path, post_processor, merged_xml, nc_file, pgm_num, unit, post_params, log_path):
+    """Builds the post.exe command for a merged XML. Returns None when a cached NC file was restored instead."""
+    properties = sputil.pipeline.post_properties(post_params, pgm_num, unit)
+    params = sputil.pipeline.build_post_command(
+        normalize_path(post_exe_path),
+        normalize_path(post_processor),
+        normalize_path(merged_xml),
+        normalize_path(nc_file),
+        properties,
+        log_path=normalize_path(log_path),
+        open_in_editor=post_params.get('open_in_editor', False),
+        debug=logging.getLogger().level == logging.DEBUG
+    )
     
     futil.log("Final post.exe command:")
-    futil.log(" ".join(params))
+    futil.log(subprocess.list2cmdline(params))
+
+    # Reuse the previous NC file when the merged XML, post and properties are unchanged
+    cache = get_artifact_cache()
+    cache_key = None
+    if cache:
+        cache_key = sputil.make_key('nc', sputil.file_digest(merged_xml), sputil.file_digest(post_processor),
+                                    normalize_path(post_exe_path), properties)
+        if cache.get('nc', cache_key, nc_file):
+            futil.log(f"Reused cached NC file ({os.path.getsize(nc_file)} bytes)", force_console=True)
+            futil.log(f"File path: {nc_file}", force_console=True)
+            if post_params.get('open_in_editor', False) and hasattr(os, 'startfile'):
+                os.startfile(nc_file)
+            remove_temporary_files(merged_xml, log_path)
+            return None
 
-    try:
-        # Execute post processor
-        futil.log("Starting post.exe process...")
-        result = subprocess.run(
-            " ".join(params),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            timeout=60, # 1 min
-            shell=True
-        )
+    xml_size = os.path.getsize(merged_xml)
+    return {
+        'params': params,
+        'properties': properties,
+        'cache_key': cache_key,
+        'merged_xml': merged_xml,
+        'nc_file': nc_file,
+        'log_path': log_path,
+        'stdout_path': f"{os.path.splitext(log_path)[0]}_stdout.log",
+        'xml_size': xml_size,
+        'timeout': sputil.pipeline.post_timeout(xml_size, config.POST_TIMEOUT_BASE, config.POST_TIMEOUT_PER_MB)
+    }
 
+def finish_post_job(job, run):
+    """Checks a finished post.exe run, caches the NC file and removes temporary files"""
+    nc_file = job['nc_file']
+    try:
         # Process results
-        if result.returncode != 0:
-            error_message = ERROR_CODES.get(result.returncode, "Unknown error code")
-            logging.error(f"post.exe failed with code {result.returncode}: {error_message}")
-            futil.log(f"post.exe failed with return code {result.returncode}: {error_message}", force_console=True)
-            if os.path.exists(log_path):
-                with open(log_path, 'r') as f:
-                    logging.error(f.read())
+        if run.error:
+            raise run.error
+        if run.cancelled:
+            logging.error("Post processing was cancelled by the user")
+            futil.log("Post processing was cancelled by the user", force_console=True)
+            return False
+        if run.timed_out:
+            logging.error(f"Error: Post processing timed out after {job['timeout']:.0f} seconds")
+            futil.log(f"Error: Post processing timed out after {job['timeout']:.0f} seconds", force_console=True)
+            return False
+
+        if run.returncode != 0:
+            error_message = sputil.pipeline.POST_ERROR_CODES.get(run.returncode, "Unknown error code")
+            logging.error(f"post.exe failed with code {run.returncode}: {error_message}")
+            futil.log(f"post.exe failed with return code {run.returncode}: {error_message}", force_console=True)
+            for output_path in (job['log_path'], job['stdout_path']):
+                if os.path.exists(output_path):
+                    logging.error(read_file_tail(output_path))
             return False
             
         # Verify output
@@ -1104,30 +1697,401 @@ def generate_gcode(post_exe_path, post_processor, merged_xml, nc_file, pgm_num,
             return False
         
         file_size = os.path.getsize(nc_file)
-        futil.log(f"Successfully generated NC file ({file_size} bytes)", force_console=True)
+        futil.log(f"Successfully generated NC file ({file_size} bytes) in {run.elapsed:.2f} seconds", force_console=True)
         futil.log(f"File path: {nc_file}", force_console=True)
 
+        if job['cache_key']:
+            get_artifact_cache().put('nc', job['cache_key'], nc_file)
+
         # Clean up: delete temporary merged XML file
-        try:
-            if os.path.exists(merged_xml):
-                os.remove(merged_xml)
-                futil.log(f"Deleted temporary file: {merged_xml}")
-            if os.path.exists(log_path):
-                os.remove(log_path)
-                futil.log(f"Deleted temporary log file: {log_path}")
-        except Exception as e:
-            futil.log(f"Warning: Could not delete temporary file {merged_xml}: {str(e)}", force_console=True)
+        remove_temporary_files(job['merged_xml'], job['log_path'], job['stdout_path'])
 
         return True
         
-    except subprocess.TimeoutExpired:
-        logging.error("Error: Post processing timed out after 1 minute")
-        futil.log("Error: Post processing timed out after 1 minute", force_console=True)
-        return False
     except Exception as e:
         logging.error(f"Post execution error: {str(e)}")
         futil.log(f"Post execution error: {str(e)}", force_console=True)
         return False
+
+def use_split_post(job):
+    """Large programs are posted in parallel pieces when the split post is enabled."""
+    return config.PARALLEL_POST and job['xml_size'] >= config.PARALLEL_POST_MIN_SIZE
+
+def use_section_cache(job):
+    """Programs are posted in cached pieces when the section cache and the artifact cache are enabled."""
+    return config.SECTION_CACHE and get_artifact_cache() is not None and job['xml_size'] >= config.SECTION_CACHE_MIN_SIZE
+
+def section_cache_key(post_exe_path, post_processor, properties):
+    """Key of the post, post.exe and properties the cached pieces were posted with.
+    Returns None when a full post showed that spliced output is not valid for this post."""
+    key = sputil.make_key('section', sputil.file_digest(post_processor), normalize_path(post_exe_path), properties)
+    if get_artifact_cache().has('splice', key, '.unsafe'):
+        futil.log("Section cache not used: spliced output of this post differed from a full post", force_console=True)
+        return None
+    return key
+
+def splice_check_due(section_key):
+    """The first spliced program of a post is always checked against a full post, later ones on a sample basis"""
+    if not get_artifact_cache().has('splice', section_key, '.ok'):
+        return True
+    return random.random() < config.SECTION_CACHE_VERIFY_RATE
+
+def record_splice_check(section_key, spliced_nc, nc_file):
+    """Compares a spliced program with the full post of the same XML and remembers whether splicing is valid"""
+    try:
+        if not nc_file or not os.path.exists(nc_file):
+            return
+        difference = sputil.split_post.compare_nc_files(nc_file, spliced_nc, config.SECTION_CACHE_VERIFY_IGNORE or None)
+        verdict = f"{os.path.splitext(spliced_nc)[0]}.{'unsafe' if difference else 'ok'}"
+        with open(verdict, 'w') as f:
+            f.write(f"Line {difference[0]}: full post {difference[1]!r}, spliced {difference[2]!r}\n"
+                    if difference else "Spliced output matches a full post\n")
+        get_artifact_cache().put('splice', section_key, verdict)
+        remove_temporary_files(verdict)
+        if difference:
+            logging.warning(f"Spliced program differs from the full post at line {difference[0]}")
+            futil.log(f"Spliced program differs from the full post at line {difference[0]}: "
+                      f"{difference[1]!r} != {difference[2]!r}. The section cache is disabled for this post.",
+                      force_console=True)
+        else:
+            futil.log("Spliced program matches the full post", force_console=True)
+    finally:
+        remove_temporary_files(spliced_nc)
+
+def run_split_post(job, post_exe_path, post_processor, progress=None, section_key=None):
+    """Posts the merged XML as pieces cut at tool changes, running post.exe on them in parallel.
+    With section_key, pieces are cut at every tool change and unchanged ones come from the section cache."""
+    progress = progress or create_background_progress()
+
+    def on_poll(written):
+        return progress.update(written, f'Generating G-code in parallel: {written / 1024 ** 2:.1f} MB written')
+
+    if section_key:
+        futil.log(f"Posting changed pieces of {job['xml_size'] / 1024 ** 2:.1f} MB of XML...", force_console=True)
+        max_chunks, split_sections = None, config.SECTION_CACHE_SPLIT_SECTIONS
+    else:
+        futil.log(f"Starting split post of {job['xml_size'] / 1024 ** 2:.1f} MB of XML...", force_console=True)
+        max_chunks, split_sections = config.PARALLEL_POST_MAX_CHUNKS or None, config.PARALLEL_POST_SPLIT_SECTIONS
+    split = sputil.split_post.split_post(
+        job['merged_xml'], job['nc_file'], normalize_path(post_exe_path), normalize_path(post_processor),
+        job['properties'],
+        max_chunks=max_chunks,
+        max_workers=config.POST_MAX_WORKERS or None,
+        split_sections=split_sections,
+        header_property=config.PARALLEL_POST_HEADER_PROPERTY or None,
+        footer_property=config.PARALLEL_POST_FOOTER_PROPERTY or None,
+        renumber=config.PARALLEL_POST_RENUMBER,
+        timeout_base=config.POST_TIMEOUT_BASE,
+        timeout_per_mb=config.POST_TIMEOUT_PER_MB,
+        poll_interval=config.POST_POLL_INTERVAL,
+        on_poll=on_poll,
+        cache=get_artifact_cache() if section_key else None,
+        cache_key=section_key
+    )
+    if section_key and split['status'] == 'ok':
+        futil.log(f"Reused {split['cached']} of {split['chunks']} pieces from the section cache", force_console=True)
+    if split['status'] not in ('ok', 'unsplittable', 'cancelled'):
+        logging.error(f"Split post {split['status']}, logs kept in {split['work_folder']}")
+    return split
+
+def finish_split_post(job, split, post_params):
+    """Caches the stitched NC file of a split post and removes temporary files"""
+    nc_file = job['nc_file']
+    futil.log(f"Successfully generated NC file ({os.path.getsize(nc_file)} bytes) from {split['chunks']} pieces "
+              f"in {split['seconds']:.2f} seconds", force_console=True)
+    futil.log(f"File path: {nc_file}", force_console=True)
+
+    if job['cache_key']:
+        get_artifact_cache().put('nc', job['cache_key'], nc_file)
+    if post_params.get('open_in_editor', False) and hasattr(os, 'startfile'):
+        os.startfile(nc_file)
+
+    remove_temporary_files(job['merged_xml'], job['log_path'], job['stdout_path'])
+    return True
+
+def generate_gcode_builtin(merged_xml, nc_file, pgm_num, unit, post_params, progress=None):
+    """Generate G-code in-process with the built-in Fanuc-style engine instead of post.exe"""
+    futil.log("==================================", force_console=True)
+    futil.log("=== Built-in G-code generation ===", force_console=True)
+    futil.log("==================================", force_console=True)
+
+    # Same properties generate_gcode passes to post.exe
+    properties = {
+        'allowHelicalMoves': post_params['allowHelicalMoves'],
+        'highFeedMapping': post_params['highFeedMapping'],
+        'minimumChordLength': post_params.get('minimumChordLength', 0),
+        'highFeedrate': post_params.get('highFeedrate', 0),
+        'maximumCircularRadius': post_params.get('maximumCircularRadius', 0),
+        'minimumCircularRadius': post_params.get('minimumCircularRadius', 0),
+        'tolerance': post_params.get('tolerance', 0),
+        'programComment': post_params['comment'],
+        'programName': pgm_num,
+        'unit': unit
+    }
+
+    xml_size = max(1, os.path.getsize(merged_xml))
+    progress = progress or create_background_progress()
+
+    def on_progress(bytes_read):
+        # Returning False stops the engine, the progress object rate-limits the dialog updates
+        return progress.update(bytes_read, f'Generating G-code (built-in): {100 * bytes_read // xml_size}%')
+
+    start_time = time.time()
+    if os.path.exists(nc_file):
+        os.remove(nc_file)
+    stream = start_dnc_stream(nc_file)
+    with current_run_trace().stage('post', engine='builtin') as stage:
+        try:
+            stats = sputil.fast_post.post_process(merged_xml, nc_file, properties, config.FAST_POST_DIALECT, on_progress)
+            end_dnc_stream(stream, True)
+        except (sputil.fast_post.FastPostCancelled, sputil.fast_post.FastPostError) as e:
+            end_dnc_stream(stream, False)
+            logging.error(f"Built-in post error: {str(e)}")
+            futil.log(f"Built-in post error: {str(e)}", force_console=True)
+            remove_temporary_files(nc_file)
+            stage.update(status='error', error=str(e))
+            return False
+        stage.update(moves=stats['blocks'], nc_bytes=os.path.getsize(nc_file))
+
+    file_size = os.path.getsize(nc_file)
+    futil.log(f"Successfully generated NC file ({file_size} bytes, {stats['blocks']} blocks) "
+              f"in {time.time() - start_time:.2f} seconds", force_console=True)
+    futil.log(f"File path: {nc_file}", force_console=True)
+
+    if post_params.get('open_in_editor', False) and hasattr(os, 'startfile'):
+        os.startfile(nc_file)
+
+    remove_temporary_files(merged_xml)
+    return True
+
+def start_dnc_stream(nc_file):
+    """Starts sending nc_file to the DNC server as it is written, when DNC streaming is enabled"""
+    global DNC_STREAM
+    if not config.DNC_STREAMING:
+        return None
+    if DNC_STREAM and not DNC_STREAM.wait(0):
+        futil.log(f"The DNC transfer of {DNC_STREAM.nc_path} is still running, {nc_file} is not streamed",
+                  force_console=True)
+        return None
+
+    try:
+        host, port = sputil.dnc.parse_address(config.DNC_ADDRESS)
+    except ValueError as e:
+        futil.log(f"DNC streaming error: {str(e)}", force_console=True)
+        return None
+    DNC_STREAM = sputil.dnc.DncStream(nc_file, host, port, flow_control=config.DNC_FLOW_CONTROL,
+                                      send_timeout=config.DNC_SEND_TIMEOUT).start()
+    futil.log(f"Streaming {nc_file} to the DNC server at {config.DNC_ADDRESS}", force_console=True)
+    return DNC_STREAM
+
+def end_dnc_stream(stream, complete):
+    """Lets a stream send the rest of a complete NC file, or stops it. The outcome is logged once the transfer ends."""
+    if stream is None:
+        return
+    if complete:
+        stream.finish()
+    else:
+        stream.cancel()
+
+    # The machine may take the program long after posting ended, so the transfer is not waited for
+    def report():
+        stream.wait()
+        if stream.succeeded:
+            logging.info(f"DNC transfer of {stream.nc_path}: {stream.describe()}")
+        else:
+            logging.error(f"DNC transfer of {stream.nc_path}: {stream.describe()}")
+
+    threading.Thread(target=report, name='DncReport', daemon=True).start()
+
+def run_post_exe(params, nc_file, stdout_path, timeout, progress=None):
+    """Runs post.exe without blocking Fusion, reporting NC file growth and stopping it when cancelled."""
+    run = sputil.PostProcessRun(params, stdout_path, timeout=timeout, poll_interval=config.POST_POLL_INTERVAL)
+    progress = progress or create_background_progress()
+
+    run.start()
+    while not run.wait(config.POST_POLL_INTERVAL):
+        written = os.path.getsize(nc_file) if os.path.exists(nc_file) else 0
+        message = f'Generating G-code: {written / 1024 ** 2:.1f} MB written ({run.elapsed:.0f} s)'
+        if not progress.update(written, message):
+            run.cancel()
+
+    return run
+
+def compact_merged_xml(merged_xml, post_params):
+    """Merges collinear moves and fits arcs in the merged XML within the dialog's tolerance"""
+    start_time = time.time()
+    try:
+        stats = sputil.pipeline.compact_xml(
+            merged_xml,
+            post_params.get('tolerance', float(config.DEFAULT_TOLERANCE)),
+            post_params.get('minimumChordLength', 0),
+            post_params.get('minimumCircularRadius', 0),
+            post_params.get('maximumCircularRadius', 0),
+            config.COMPACTION_FIT_ARCS
+        )
+    except Exception as e:
+        futil.log(f"Toolpath compaction skipped: {str(e)}", force_console=True)
+        return None
+
+    futil.log(f"Toolpath compaction: {stats['blocks_in']} -> {stats['blocks_out']} blocks "
+              f"({stats['reduction']:.1%} fewer, {stats['arcs_out']} arcs fitted) "
+              f"in {time.time() - start_time:.2f} seconds", force_console=True)
+    return stats
+
+def log_cycle_time_estimate(xml_path):
+    """Logs the estimated cycle time and travel of a merged program.
+
+    The parsed toolpath is kept in the toolpath cache keyed by the content of the merged
+    XML, so posting an unchanged program again skips the XML parse.
+    """
+    cache = get_toolpath_cache()
+    cache_path = f"{xml_path}.toolpath.npz"
+    try:
+        start_time = time.time()
+        digest = sputil.file_digest(xml_path) if cache else None
+        cached = cache is not None and cache.get('toolpath', digest, cache_path, link=True)
+        toolpath = sputil.toolpath.load_toolpath(xml_path, cache_path if cache else False, digest)
+        if cache and not cached:
+            cache.put('toolpath', digest, cache_path, link=True)
+            cache.evict()
+        load_seconds = time.time() - start_time
+
+        start_time = time.time()
+        report = sputil.estimator.estimate_toolpath(toolpath, config.ESTIMATE_RAPID_RATE,
+                                                    config.ESTIMATE_TOOL_CHANGE_TIME)
+        estimate_seconds = time.time() - start_time
+    except Exception as e:
+        futil.log(f"Cycle time estimate skipped: {str(e)}", force_console=True)
+        return None
+    finally:
+        remove_temporary_files(cache_path)
+
+    futil.log(f"Toolpath of {len(toolpath)} moves {'loaded from cache' if cached else 'parsed'} "
+              f"in {load_seconds:.2f} seconds, estimated in {estimate_seconds:.2f} seconds", force_console=True)
+    for line in sputil.estimator.format_report(report):
+        futil.log(line, force_console=True)
+    return report
+
+def remove_temporary_files(*file_paths):
+    """Deletes temporary files (merged XML, post.exe logs) once the NC file exists."""
+    for file_path in file_paths:
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                futil.log(f"Deleted temporary file: {file_path}")
+        except Exception as e:
+            futil.log(f"Warning: Could not delete temporary file {file_path}: {str(e)}", force_console=True)
+
+#endregion
+
+# =============================================================================
+# ARTIFACT CACHE
+# =============================================================================
+#region
+
+def get_artifact_cache():
+    """Returns the shared artifact cache, or None when caching is disabled."""
+    global ARTIFACT_CACHE
+    if not config.ARTIFACT_CACHE:
+        return None
+    if ARTIFACT_CACHE is None:
+        ARTIFACT_CACHE = sputil.ArtifactCache(config.ARTIFACT_CACHE_FOLDER, config.ARTIFACT_CACHE_MAX_SIZE)
+        futil.log(f"Artifact cache folder: {normalize_path(config.ARTIFACT_CACHE_FOLDER)}")
+    return ARTIFACT_CACHE
+
+def get_toolpath_cache():
+    """Returns the cache of parsed toolpaths used by the cycle time estimate, or None when disabled."""
+    global TOOLPATH_CACHE
+    if not config.ESTIMATE_CACHE:
+        return None
+    if TOOLPATH_CACHE is None:
+        TOOLPATH_CACHE = sputil.ArtifactCache(config.ESTIMATE_CACHE_FOLDER, config.ESTIMATE_CACHE_MAX_SIZE)
+    return TOOLPATH_CACHE
+
+def get_machine_name(operations):
+    """Names the CNC machine of the operations' setup for the run history, None when no machine is assigned."""
+    try:
+        machine = operations[0].parentSetup.machine
+        if not machine:
+            return None
+        return machine.description or f"{machine.vendor} {machine.model}".strip() or None
+    except:
+        return None  # No operations, or a Fusion version without Setup.machine
+
+def start_run_trace(workflow, **context):
+    """Starts the instrumentation record of a post run, see RUN_HISTORY in config.py"""
+    global RUN_TRACE
+    RUN_TRACE = sputil.instrumentation.RunTrace(workflow, **context)
+    return RUN_TRACE
+
+def current_run_trace():
+    """Returns the record of the run in progress, or a detached one that is never saved."""
+    return RUN_TRACE or sputil.instrumentation.RunTrace('untraced')
+
+def finish_run_trace(trace, status, nc_files=(), **fields):
+    """Closes a run record, logs it as one JSON line and appends it to the run history."""
+    global RUN_TRACE
+    if RUN_TRACE is trace:
+        RUN_TRACE = None
+    nc_bytes = sum(os.path.getsize(path) for path in nc_files if os.path.exists(path))
+    record = trace.finish(status, nc_bytes=nc_bytes, **fields)
+    futil.log(f"Run record: {trace.to_json()}")
+
+    if config.RUN_HISTORY:
+        try:
+            sputil.instrumentation.RunHistory(config.RUN_HISTORY_PATH).append(record)
+        except Exception as e:
+            futil.log(f"Warning: Could not save run history - {str(e)}")
+    return record
+
+def post_run_fields(run, nc_file):
+    """Instrumentation fields of a finished post.exe run."""
+    return {
+        'engine': 'post.exe',
+        'status': 'ok' if run.succeeded else 'failed',
+        'returncode': run.returncode,
+        'timed_out': run.timed_out,
+        'cancelled': run.cancelled,
+        'nc_bytes': os.path.getsize(nc_file) if os.path.exists(nc_file) else 0
+    }
+
+def get_design_fingerprint():
+    """Summarizes the design state toolpaths depend on, or None if it cannot be tracked.
+
+    The API gives no access to the toolpath itself, so this is an approximation:
+    edits that change neither the timeline nor a parameter (dragging sketch
+    geometry, updating a linked component) are not seen, see ARTIFACT_CACHE in config.py.
+    """
+    try:
+        design = adsk.fusion.Design.cast(app.activeDocument.products.itemByProductType('DesignProductType'))
+        if not design or design.designType != adsk.fusion.DesignTypes.ParametricDesignType:
+            return None  # Direct modeling edits leave no trace we can hash
+
+        timeline = design.timeline
+        return {
+            # Documents made from one template must not share entries
+            'document': app.activeDocument.creationId,
+            'timeline': [timeline.count, timeline.markerPosition],
+            'parameters': [[p.name, p.expression] for p in design.allParameters]
+        }
+    except:
+        return None
+
+def get_operation_fingerprint(op, setup_fingerprints):
+    """Collects the operation data its toolpath is generated from (parameters, tool, setup)."""
+    setup = op.parentSetup
+    setup_name = setup.name
+    if setup_name not in setup_fingerprints:
+        setup_fingerprints[setup_name] = [[p.name, p.expression] for p in setup.parameters]
+
+    return {
+        'name': op.name,
+        'token': op.entityToken,
+        'setup': setup_fingerprints[setup_name],
+        'tool': op.tool.toJson(),
+        'parameters': [[p.name, p.expression] for p in op.parameters]
+    }
+
 #endregion
 
 # =============================================================================
@@ -1135,22 +2099,194 @@ def generate_gcode(post_exe_path, post_processor, merged_xml, nc_file, pgm_num,
 # =============================================================================
 #region
 
-def find_fusion_post_exe():
-    """Auto-detect post.exe location."""
-    fusion_appdata = os.path.join(os.getenv('LOCALAPPDATA'), r'Autodesk\webdeploy')
+def find_fusion_post_exe(log=futil.log):
+    """Auto-detect post.exe location, reusing the cached result while webdeploy is unchanged."""
+    # Explicit override from config.py
+    if config.POST_EXE_PATH:
+        if os.path.isfile(config.POST_EXE_PATH):
+            return normalize_path(config.POST_EXE_PATH)
+        log(f"Configured post.exe not found: {config.POST_EXE_PATH}", force_console=True)
+        return None
+
+    fusion_appdata = os.path.join(os.getenv('LOCALAPPDATA', ''), r'Autodesk\webdeploy')
     if not os.path.exists(fusion_appdata):
         return None
+
+    # Cheap revalidation: the cached binary still exists and no webdeploy folder was added or updated
+    webdeploy_state = get_webdeploy_state(fusion_appdata)
+    cached = load_post_exe_cache()
+    if cached and cached.get('webdeploy') == webdeploy_state and os.path.isfile(cached.get('path', '')):
+        return cached['path']
+
+    log("Scanning webdeploy for post.exe...")
     possible_paths = glob.glob(os.path.join(fusion_appdata, '*', '*', 'Applications', 'CAM360', 'post.exe'))
-    return max(possible_paths, key=os.path.getmtime) if possible_paths else None
-
-def get_setup_number(setup_name, cam):
-    """Finds the index of a setup by name in the CAM environment."""
-    setup_name = setup_name.strip().lower()
-    for i, s in enumerate(cam.setups):
-        if s.name.strip().lower() == setup_name:
-            return i
+    if not possible_paths:
+        return None
+
+    post_exe_path = max(possible_paths, key=os.path.getmtime)
+    save_post_exe_cache({'path': post_exe_path, 'webdeploy': webdeploy_state}, log)
+    log(f"Found post.exe: {normalize_path(post_exe_path)}")
+    return post_exe_path
+
+def get_webdeploy_state(fusion_appdata):
+    """Returns the modification times of the webdeploy channel folders (a new build updates them)."""
+    state = {}
+    with os.scandir(fusion_appdata) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                state[entry.name] = entry.stat().st_mtime
+    return state
+
+def load_post_exe_cache():
+    """Loads the cached post.exe location, or None if there is no usable cache."""
+    try:
+        with open(POST_EXE_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_post_exe_cache(data, log=futil.log):
+    """Stores the resolved post.exe location for later runs."""
+    try:
+        temp_file = f"{POST_EXE_CACHE_FILE}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_file, POST_EXE_CACHE_FILE)
+    except OSError as e:
+        log(f"Warning: Could not save post.exe cache: {str(e)}")
+
+def read_file_tail(file_path, max_bytes=64 * 1024):
+    """Reads at most the last max_bytes of a text file, e.g. a post.exe log."""
+    with open(file_path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - max_bytes))
+        return f.read().decode('utf-8', errors='replace')
+
+def get_tool_number(op):
+    """Returns the tool number used by an operation, or None if it cannot be read."""
+    entry = indexed_operation(op)
+    if entry:
+        return entry['tool']
+    return read_tool_number(op)
+
+def read_tool_number(op):
+    try:
+        return op.tool.parameters.itemByName('tool_number').value.value
+    except:
+        return None
+
+def group_operations_by_tool(operations):
+    """Splits operations into runs of consecutive operations that use the same tool."""
+    groups = []
+    previous_tool = None
+    for op in operations:
+        tool_number = get_tool_number(op)
+        if groups and tool_number is not None and tool_number == previous_tool:
+            groups[-1].append(op)
+        else:
+            groups.append([op])
+        previous_tool = tool_number
+    return groups
+
+def get_setup_number(setup_name, index):
+    """Finds the index of a setup by name in the operation index."""
+    return index['setup_numbers'].get(setup_name.strip().lower())
+
+def get_operation_index(cam):
+    """Returns the setups and operations of the active document, built once per document.
+
+    Every property read of an operation is a call into Fusion, so the setups, their
+    operations, tool numbers and whether they have a toolpath are read once and reused until a
+    command ends or the document is closed (see invalidate_operation_index).
+    """
+    document_key = app.activeDocument.creationId
+    index = OPERATION_INDEXES.get(document_key)
+    if index is None:
+        start_time = time.time()
+        index = build_operation_index(cam)
+        OPERATION_INDEXES[document_key] = index
+        futil.log(f"Indexed {len(index['operations'])} operations in {len(index['setups'])} setups "
+                  f"in {time.time() - start_time:.2f} seconds")
+    return index
+
+def build_operation_index(cam):
+    setups = []
+    operations = {}
+    for setup in cam.setups:
+        entries = []
+        for op in setup.allOperations:
+            has_toolpath = op.hasToolpath
+            entry = {
+                'op': op,
+                'tool': read_tool_number(op),
+                'has_toolpath': has_toolpath,
+                'position': len(operations)
+            }
+            entries.append(entry)
+            operations[op.entityToken] = entry
+        setups.append({'name': setup.name, 'operations': entries})
+    return {
+        'setups': setups,
+        'operations': operations,
+        'setup_numbers': {setup['name'].strip().lower(): i for i, setup in enumerate(setups)},
+        # Operations handed out by the index are found again by identity, without another call into Fusion
+        'objects': {id(entry['op']): entry for entry in operations.values()}
+    }
+
+def indexed_operation(op):
+    """Returns the index entry of an operation object taken from the index, or None."""
+    for index in OPERATION_INDEXES.values():
+        entry = index['objects'].get(id(op))
+        if entry and entry['op'] is op:
+            return entry
     return None
 
+def operations_with_toolpath(entries):
+    """Operations of index entries that have a toolpath. Those without one are read again, as
+    toolpaths are generated in the background after the index was built."""
+    for entry in entries:
+        if not entry['has_toolpath']:
+            entry['has_toolpath'] = entry['op'].hasToolpath
+    return [entry['op'] for entry in entries if entry['has_toolpath']]
+
+def get_selected_operations(index, scan=False):
+    """Index entries of the selected operations in program order.
+
+    The active selection is looked up in the index by entity token and every match
+    is confirmed with isSelected. Tokens may change, so unless every selected item
+    was matched this way all operations are checked with isSelected instead. With
+    scan, they are also checked when nothing is selected, for browser selections
+    the active selection does not report.
+    """
+    entries = []
+    selections = ui.activeSelections
+    for i in range(selections.count):
+        op = adsk.cam.Operation.cast(selections.item(i).entity)
+        entry = index['operations'].get(op.entityToken) if op else None
+        if entry and entry['op'].isSelected:
+            entries.append(entry)
+    if len(entries) != selections.count or (scan and not entries):
+        entries = [entry for entry in index['operations'].values() if entry['op'].isSelected]
+    return sorted(entries, key=lambda entry: entry['position'])
+
+def invalidate_operation_index(document=None):
+    """Drops the operation index of a document (default: the active one), all of them if it cannot be identified."""
+    try:
+        OPERATION_INDEXES.pop((document or app.activeDocument).creationId, None)
+    except:
+        OPERATION_INDEXES.clear()
+
+def operation_index_command_terminated(args: adsk.core.ApplicationCommandEventArgs):
+    """A completed command may have added, edited or removed operations, cancelled ones changed nothing"""
+    if not OPERATION_INDEXES or args.commandId in INDEX_NEUTRAL_COMMANDS:
+        return
+    if args.terminationReason in (adsk.core.CommandTerminationReason.CompletedTerminationReason,
+                                  adsk.core.CommandTerminationReason.UnknownTerminationReason):
+        invalidate_operation_index()
+
+def operation_index_document_closed(args: adsk.core.DocumentEventArgs):
+    invalidate_operation_index(args.document)
+
 def get_post(post_path):
     """Retrieves the post processor configuration from the Fusion 360 library."""
     home_path = os.path.expanduser('~')
@@ -1166,17 +2302,43 @@ def get_post(post_path):
     library_manager = cam_manager.libraryManager
     post_library = library_manager.postLibrary
 
-    user_folder = post_library.urlByLocation(adsk.cam.LibraryLocations.LocalLibraryLocation)
-    user_post_library = post_library.childAssetURLs(user_folder)
+    # Exact file name lookup in the cached library index
+    index = get_post_library_index(post_library, post_library_path)
+    post_key = target_post_name.lower()
+    post_url = index['urls'].get(post_key)
+    if post_url is None:
+        ui.messageBox(f"Could not find Postprocessor '{target_post_name}' in user library")
+        return None
 
-    for user_post in user_post_library:
-        post_name = user_post.toString()
-        if target_post_name in post_name:
-            postUrl = adsk.core.URL.create(post_name)
-            return post_library.postConfigurationAtURL(postUrl)
+    # Reuse the configuration while the post file is unchanged
+    post_mtime = os.path.getmtime(target_path)
+    cached = index['configurations'].get(post_key)
+    if cached and cached[0] == post_mtime:
+        return cached[1]
 
-    ui.messageBox(f"Could not find Postprocessor '{post_name}' in user library")
-    return None
+    post_config = post_library.postConfigurationAtURL(adsk.core.URL.create(post_url))
+    if post_config:
+        index['configurations'][post_key] = (post_mtime, post_config)
+    return post_config
+
+def get_post_library_index(post_library, post_library_path):
+    """Returns the {post file name: URL} index of the local post library, rebuilt when the folder changes."""
+    library_mtime = os.path.getmtime(post_library_path) if os.path.exists(post_library_path) else None
+    if POST_LIBRARY_INDEX['mtime'] == library_mtime and POST_LIBRARY_INDEX['urls']:
+        return POST_LIBRARY_INDEX
+
+    user_folder = post_library.urlByLocation(adsk.cam.LibraryLocations.LocalLibraryLocation)
+    urls = {}
+    for user_post in post_library.childAssetURLs(user_folder):
+        post_url = user_post.toString()
+        post_name = urllib.parse.unquote(post_url.rstrip('/').rsplit('/', 1)[-1])
+        urls[post_name.lower()] = post_url
+
+    POST_LIBRARY_INDEX['mtime'] = library_mtime
+    POST_LIBRARY_INDEX['urls'] = urls
+    POST_LIBRARY_INDEX['configurations'] = {}
+    futil.log(f"Indexed {len(urls)} posts in the local post library")
+    return POST_LIBRARY_INDEX
 
 def get_unique_nc_program_name(cam, base_name="NCProgram"):
     """Generates a unique NC Program name."""
@@ -1234,6 +2396,10 @@ def get_document_units():
     except:
         return 1
 
+def safe_file_name(name):
+    """Replaces characters that are not allowed in Windows file names."""
+    return ''.join('_' if c in '<>:"/\\|?*' else c for c in name).strip() or 'setup'
+
 def normalize_path(path):
     """Normalizes file paths for consistency across operating systems."""
     normalized = os.path.normpath(os.path.expandvars(path))
@@ -23,5 +23,91 @@ DEFAULT_MAXIMUM_CIRCULAR_RADIUS = '1000'
 DEFAULT_MINIMUM_CIRCULAR_RADIUS = '0.01'
 DEFAULT_TOLERANCE = '0.001'
 
+# Startup: Fusion only waits for the button to be registered, the rest runs later
+STARTUP_BUDGET = 0.2 # Seconds from loading the add-in to the end of run(), a slower startup is logged to the console
+STARTUP_WARMUP_DELAY = 10 # Seconds after startup before config loading and post.exe discovery run in the background, 0 to wait for the first command use
+
+# Seconds a postprocessor path check is reused while the dialog validates its inputs
+VALIDATION_PATH_TTL = 5.0
+
+# XML merge settings
+MERGE_CHUNK_SIZE = 1024 * 1024 # Bytes copied or scanned per step while merging XML files
+MERGE_ZERO_COPY = True # Use kernel-side file copies (copy_file_range/sendfile) where the OS supports them
+MERGE_WHILE_GENERATING = True # Merge each operation's XML on a writer thread while the next operation is posted
+
+# Lean intermediate XML: only needed parameters, precision from the tolerance, no default attributes
+# Lean output drops every parameter not listed in LEAN_PARAMETERS of xml.cps or LEAN_XML_PARAMETERS, e.g. clearance
+# and retract heights, compensation type, stock and tool descriptions. Check which ones your post reads first.
+LEAN_XML = False # Set to True to enable the lean property of xml.cps, False to write the full output
+LEAN_XML_PARAMETERS = '' # Comma-separated extra parameters your post reads, e.g. 'operation:tool_comment,stock-*'
+
+# Post consecutive operations that share a tool with a single cam.postProcess call
+BATCH_BY_TOOL = True
+
+# post.exe execution settings
+POST_EXE_PATH = '' # Full path to post.exe, leave empty to auto-detect it in the Fusion webdeploy folder
+POST_TIMEOUT_BASE = 60 # Seconds allowed for post.exe regardless of program size
+POST_TIMEOUT_PER_MB = 2 # Additional seconds allowed per MB of merged XML
+POST_POLL_INTERVAL = 0.25 # Seconds between post.exe progress updates
+POST_NC_SIZE_RATIO = 0.2 # Expected NC file size relative to the merged XML, used to estimate progress
+POST_MAX_WORKERS = 0 # post.exe jobs run in parallel when posting all setups, 0 uses the CPU count minus one
+
+# Split post: cut a large merged XML at tool changes and run post.exe on the pieces in parallel
+PARALLEL_POST = False # Set to True after checking your post with 'split-post --verify' in lib/smartPostUtils/cli.py
+PARALLEL_POST_MIN_SIZE = 50 * 1024 ** 2 # Merged XML size in bytes from which a program is split
+PARALLEL_POST_MAX_CHUNKS = 0 # Pieces per program, 0 uses one per post.exe worker (see POST_MAX_WORKERS)
+PARALLEL_POST_SPLIT_SECTIONS = False # Also cut between operations that share a tool, the post then repeats the tool change
+PARALLEL_POST_HEADER_PROPERTY = '' # Boolean post property that writes the program start, set to false for all pieces but the first
+PARALLEL_POST_FOOTER_PROPERTY = '' # Boolean post property that writes the program end, set to false for all pieces but the last
+PARALLEL_POST_RENUMBER = True # Continue block numbers (N10, N20, ...) across the stitched pieces
+
+# Section cache: post a program in pieces cut at tool changes, reuse the cached G-code of unchanged pieces and post only the changed ones
+SECTION_CACHE = False # Set to True to use it, requires ARTIFACT_CACHE; shares the header, footer and renumber settings of the split post
+SECTION_CACHE_MIN_SIZE = 10 * 1024 ** 2 # Merged XML size in bytes from which a program is posted in cached pieces
+SECTION_CACHE_SPLIT_SECTIONS = False # Cache every operation instead of every tool, more post.exe runs on the first post
+SECTION_CACHE_VERIFY_RATE = 0.1 # Share of spliced programs also posted in one piece and compared, the first one of a post is always checked
+SECTION_CACHE_VERIFY_IGNORE = '' # Regular expression for lines allowed to differ between spliced and full output, e.g. a date
+
+# DNC streaming: send the NC file to a DNC server over TCP while it is being written (test with benchmarks/dnc_server.py)
+DNC_STREAMING = False # Set to True to stream every generated NC file to DNC_ADDRESS
+DNC_ADDRESS = '' # host:port of the DNC server, e.g. '192.168.0.20:5001'
+DNC_FLOW_CONTROL = True # Pause on XOFF and resume on XON sent by the DNC server
+DNC_SEND_TIMEOUT = 60 # Seconds the DNC server may block or pause the transfer before it fails
+
+# Progress dialog settings
+PROGRESS_UPDATE_INTERVAL = 0.1 # Seconds between progress dialog updates and cancel checks
+
+# Built-in post engine for simple Fanuc-style 3-axis machines, runs in-process without post.exe
+FAST_POST_ENGINE = False # Set to True to use it instead of post.exe and the selected .cps
+FAST_POST_DIALECT = {} # Overrides for DEFAULT_DIALECT in lib/smartPostUtils/fast_post.py, e.g. {'sequence_numbers': False}
+
+# Toolpath compaction between XML merging and post processing, uses the dialog's tolerance and circular limits
+TOOLPATH_COMPACTION = False # Set to True to merge collinear linear moves and fit arcs before post processing
+COMPACTION_FIT_ARCS = True # Set to False to only merge collinear moves
+
+# Cycle time estimate logged after each batch post (requires NumPy in Fusion's Python)
+CYCLE_TIME_ESTIMATE = False # Set to True to estimate cycle time and travel from the merged XML
+ESTIMATE_RAPID_RATE = 10000 # Rapid traverse rate in mm/min
+ESTIMATE_TOOL_CHANGE_TIME = 5 # Seconds per tool change
+ESTIMATE_CACHE = True # Set to False to parse the merged XML on every estimate instead of reusing the parsed toolpath of identical programs
+ESTIMATE_CACHE_FOLDER = os.path.expanduser('~/AppData/Local/SmartPost/toolpaths')
+ESTIMATE_CACHE_MAX_SIZE = 2 * 1024 ** 3 # Maximum size of the parsed toolpaths in bytes, least recently used are evicted first
+
+# Artifact cache settings (reuse per-operation XML and NC files when nothing changed)
+# Per-operation XML is keyed on the document, timeline, parameters, tool and operation parameters, not on the
+# toolpath (the API does not expose it). Edits that change none of these, e.g. dragging sketch geometry or
+# updating a linked or derived component, reuse the old XML and give outdated G-code.
+ARTIFACT_CACHE = False # Set to True to enable the artifact cache, only for designs edited through parameters
+ARTIFACT_CACHE_FOLDER = os.path.expanduser('~/AppData/Local/SmartPost/cache')
+ARTIFACT_CACHE_MAX_SIZE = 4 * 1024 ** 3 # Maximum cache size in bytes, least recently used entries are evicted first
+
+# Run instrumentation: stage and operation timings of every post run, logged as one JSON record
+RUN_HISTORY = True # Set to False to stop appending each run to the local SQLite history, see 'history' in lib/smartPostUtils/cli.py
+RUN_HISTORY_PATH = os.path.expanduser('~/AppData/Local/SmartPost/run_history.sqlite')
+
+# Staging: per-operation XML, merged XML, logs and the NC file are written to a local scratch folder
+STAGING = True # Set to False to write temporary files to the output folder, only the finished NC file is published there otherwise
+STAGING_FOLDER = os.path.expanduser('~/AppData/Local/SmartPost/scratch') # Folders of crashed runs are removed on the next run
+
 # Unique palette ID
 sample_palette_id = f'{COMPANY_NAME}_{ADDIN_NAME}_palette_id'
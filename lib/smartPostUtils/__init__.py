@@ -0,0 +1,20 @@
+from .artifact_cache import *
+from .post_runner import *
+import importlib
+from . import fast_post
+from . import compaction
+from . import pipeline
+from . import instrumentation
+from . import progress
+from . import split_post
+from . import dnc
+from . import staging
+
+# NumPy-backed modules are imported on first use, importing NumPy would slow down the add-in startup
+LAZY_MODULES = ('toolpath', 'estimator')
+
+
+def __getattr__(name):
+    if name in LAZY_MODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
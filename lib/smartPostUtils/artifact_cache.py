@@ -0,0 +1,140 @@
+import os
+import json
+import shutil
+import hashlib
+
+
+def make_key(*parts):
+    """Builds a stable content key (sha256 hex digest) from JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Returns the sha256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """Content-addressed on-disk cache for post-processing artifacts.
+
+    Artifacts are stored as <folder>/<kind>/<key[:2]>/<key><extension>. The
+    modification time of an entry is refreshed on every hit, so eviction
+    removes the least recently used entries first once the total size
+    exceeds max_size bytes.
+    """
+
+    def __init__(self, folder: str, max_size: int):
+        self.folder = folder
+        self.max_size = max_size
+        self.stats = {}
+
+    def _entry_path(self, kind, key, extension):
+        return os.path.join(self.folder, kind, key[:2], f"{key}{extension}")
+
+    def _count(self, kind, counter):
+        kind_stats = self.stats.setdefault(kind, {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0})
+        kind_stats[counter] += 1
+
+    def get(self, kind, key, destination, link=False):
+        """Restores a cached artifact to destination. Returns True on a cache hit.
+
+        link -- Hard-link instead of copying. Only safe for throwaway files
+                that are never modified in place.
+        """
+        entry = self._entry_path(kind, key, os.path.splitext(destination)[1])
+        if not os.path.isfile(entry):
+            self._count(kind, 'misses')
+            return False
+        try:
+            if os.path.exists(destination):
+                os.remove(destination)
+            _restore(entry, destination, link)
+            os.utime(entry)
+        except OSError:
+            self._count(kind, 'misses')
+            return False
+        self._count(kind, 'hits')
+        return True
+
+    def has(self, kind, key, extension=''):
+        """Returns True when an entry exists, refreshing it like a hit. For marker entries whose content is not needed."""
+        entry = self._entry_path(kind, key, extension)
+        if not os.path.isfile(entry):
+            return False
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return True
+
+    def put(self, kind, key, source, link=False):
+        """Stores a copy of source under key. Returns True if the artifact was stored."""
+        entry = self._entry_path(kind, key, os.path.splitext(source)[1])
+        temp_entry = f"{entry}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            if os.path.exists(temp_entry):
+                os.remove(temp_entry)
+            _restore(source, temp_entry, link)
+            os.replace(temp_entry, entry)
+        except OSError:
+            if os.path.exists(temp_entry):
+                os.remove(temp_entry)
+            return False
+        self._count(kind, 'stores')
+        return True
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_size."""
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            self._count(os.path.basename(os.path.dirname(os.path.dirname(path))), 'evictions')
+        return total_size
+
+    def reset_stats(self):
+        """Clears the hit/miss counters, e.g. at the start of a new run."""
+        self.stats = {}
+
+    def summary(self):
+        """Returns the hit/miss counters as a single log line."""
+        if not self.stats:
+            return "no lookups"
+        return "; ".join(
+            f"{kind}: {s['hits']} hits, {s['misses']} misses, {s['stores']} stored, {s['evictions']} evicted"
+            for kind, s in sorted(self.stats.items())
+        )
+
+
+def _restore(source, destination, link):
+    """Hard-links or copies source to destination, copying when linking is not possible."""
+    if link:
+        try:
+            os.link(source, destination)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, destination)
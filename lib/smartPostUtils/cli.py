@@ -0,0 +1,351 @@
+"""Command line entry point for the merge and post pipeline, usable without Fusion 360.
+
+Run from the add-in folder:
+
+    python -m lib.smartPostUtils.cli merge merged.xml op1.xml op2.xml
+    python -m lib.smartPostUtils.cli post --post-exe post.exe --post fanuc.cps program.nc op1.xml op2.xml
+    python -m lib.smartPostUtils.cli repost --post-exe post.exe --post fanuc.cps --output-folder nc xml_folder
+    python -m lib.smartPostUtils.cli post --post-exe post.exe --post fanuc.cps --dnc 192.168.0.20:5001 program.nc op1.xml
+    python -m lib.smartPostUtils.cli dnc-send --resume-line 1200 192.168.0.20:5001 program.nc
+    python -m lib.smartPostUtils.cli split-post --post-exe post.exe --post fanuc.cps --verify program.nc op1.xml op2.xml
+    python -m lib.smartPostUtils.cli history --by post --stage post
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+from . import pipeline, instrumentation, split_post, dnc
+from .post_runner import PostProcessRun, default_worker_count
+
+
+def expand_inputs(paths):
+    """Expands folders to the *.xml files they contain, sorted by name."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.xml'))))
+        else:
+            files.append(path)
+    return files
+
+
+def post_arguments(args):
+    """Flattens the --property pairs into post.exe arguments."""
+    properties = []
+    for name, value in args.property or ():
+        properties.extend(["--property", name, value])
+    return properties
+
+
+def compaction_transform(args):
+    if args.compact is None:
+        return None
+    return lambda xml_path: report_compaction(xml_path, pipeline.compact_xml(xml_path, args.compact))
+
+
+def report_compaction(xml_path, stats):
+    print(f"  compacted {os.path.basename(xml_path)}: {stats['blocks_in']} -> {stats['blocks_out']} blocks "
+          f"({stats['reduction']:.1%} fewer)")
+
+
+def command_merge(args):
+    start_time = time.time()
+    pipeline.merge_xml_files(args.inputs, args.output, args.chunk_size, not args.no_zero_copy, log=print)
+    size = os.path.getsize(args.output)
+    print(f"Merged {len(args.inputs)} files into {args.output} "
+          f"({size / 1024 ** 2:.1f} MB in {time.time() - start_time:.2f} seconds)")
+    return 0
+
+
+def command_post(args):
+    output_folder = os.path.dirname(os.path.abspath(args.output))
+    stem = os.path.splitext(args.output)[0]
+    merged_xml = f"{stem}.merged.xml"
+    log_path = f"{stem}.log"
+
+    start_time = time.time()
+    pipeline.merge_xml_files(args.inputs, merged_xml, args.chunk_size, not args.no_zero_copy, log=print)
+    try:
+        transform = compaction_transform(args)
+        if transform:
+            transform(merged_xml)
+
+        os.makedirs(output_folder, exist_ok=True)
+        params = pipeline.build_post_command(args.post_exe, args.post, merged_xml, args.output,
+                                             post_arguments(args), log_path)
+        xml_size = os.path.getsize(merged_xml)
+        run = PostProcessRun(params, f"{stem}_stdout.log",
+                             pipeline.post_timeout(xml_size, args.timeout_base, args.timeout_per_mb))
+
+        # Stream the NC file to the DNC server while post.exe writes it
+        stream = None
+        if args.dnc:
+            if os.path.exists(args.output):
+                os.remove(args.output)
+            stream = start_dnc_stream(args, args.dnc, args.output)
+        try:
+            run.start()
+        except OSError:
+            pass  # Recorded in run.error
+        run.wait()
+    finally:
+        if not args.keep_xml and os.path.exists(merged_xml):
+            os.remove(merged_xml)
+
+    status = pipeline.describe_run(run)
+    if status == 'ok' and not os.path.exists(args.output):
+        status = "error: output NC file was not created"
+    print(f"{args.output}: {status} ({time.time() - start_time:.2f} seconds)")
+    streamed = True
+    if stream:
+        if status == 'ok':
+            stream.finish()
+        else:
+            stream.cancel()
+        streamed = finish_dnc_stream(stream)
+    if status != 'ok':
+        print(f"  See {log_path} and {stem}_stdout.log")
+        return 1
+    for path in (log_path, f"{stem}_stdout.log"):
+        if os.path.exists(path):
+            os.remove(path)
+    return 0 if streamed else 1
+
+
+def start_dnc_stream(args, address, nc_file):
+    host, port = dnc.parse_address(address)
+    return dnc.DncStream(nc_file, host, port, args.resume_line, not args.no_flow_control,
+                         send_timeout=args.send_timeout).start()
+
+
+def finish_dnc_stream(stream):
+    """Waits for a DNC transfer and reports it, returns True when it completed."""
+    stream.wait()
+    print(f"DNC {stream.host}:{stream.port}: {stream.describe()}"
+          + (f", paused {stream.paused_seconds:.1f} seconds by the server" if stream.paused_seconds else ""))
+    if stream.error:
+        print(f"  Resume with: dnc-send --resume-line N {stream.host}:{stream.port} {stream.nc_path}")
+        print(f"  where N is the number of lines the machine received (at most {stream.lines_sent})")
+    return stream.succeeded
+
+
+def command_dnc_send(args):
+    stream = start_dnc_stream(args, args.address, args.nc_file)
+    stream.finish()
+    return 0 if finish_dnc_stream(stream) else 1
+
+
+def command_repost(args):
+    xml_files = expand_inputs(args.inputs)
+    if not xml_files:
+        print("No XML files to post")
+        return 1
+
+    def on_finished(result):
+        line = f"{result['xml']}: {result['status']}"
+        if result['status'] == 'ok':
+            line += f" -> {result['nc']} ({result['seconds']:.2f} seconds)"
+        print(line, flush=True)
+
+    start_time = time.time()
+    results = pipeline.repost_files(
+        xml_files, args.output_folder, args.post_exe, args.post, post_arguments(args), args.jobs,
+        args.timeout_base, args.timeout_per_mb, compaction_transform(args), on_finished
+    )
+    elapsed = time.time() - start_time
+
+    failed = [result for result in results if result['status'] != 'ok']
+    xml_size = sum(result['xml_size'] for result in results)
+    print(f"Posted {len(results) - len(failed)} of {len(results)} files in {elapsed:.2f} seconds "
+          f"({xml_size / 1024 ** 2 / elapsed if elapsed else 0:.1f} MB/s of XML)")
+    return 1 if failed else 0
+
+
+def command_split_post(args):
+    stem = os.path.splitext(args.output)[0]
+    merged_xml = args.inputs[0]
+    if len(args.inputs) > 1:
+        merged_xml = f"{stem}.merged.xml"
+        pipeline.merge_xml_files(args.inputs, merged_xml, args.chunk_size, not args.no_zero_copy, log=print)
+
+    options = {
+        'max_chunks': args.chunks,
+        'max_workers': args.jobs,
+        'split_sections': args.split_sections,
+        'header_property': args.header_property,
+        'footer_property': args.footer_property,
+        'renumber': not args.no_renumber,
+    }
+    try:
+        transform = compaction_transform(args)
+        if transform:
+            if merged_xml == args.inputs[0]:
+                # Compact a working copy so the caller's XML is never rewritten in place
+                merged_xml = f"{stem}.work.xml"
+                with open(args.inputs[0], 'rb') as src, open(merged_xml, 'wb') as dst:
+                    pipeline.copy_file_range(src, dst, 0, os.path.getsize(args.inputs[0]))
+            transform(merged_xml)
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        if args.verify:
+            verification = split_post.verify_split_post(
+                merged_xml, args.output, args.post_exe, args.post,
+                post_arguments(args), args.ignore, args.timeout_base, args.timeout_per_mb, **options
+            )
+            result = verification['split']
+        else:
+            result = split_post.split_post(merged_xml, args.output, args.post_exe, args.post, post_arguments(args),
+                                           timeout_base=args.timeout_base, timeout_per_mb=args.timeout_per_mb,
+                                           **options)
+    finally:
+        if merged_xml != args.inputs[0] and not args.keep_xml and os.path.exists(merged_xml):
+            os.remove(merged_xml)
+
+    print(f"{args.output}: {result['status']}, {result['chunks']} pieces in {result['seconds']:.2f} seconds")
+    if result['status'] != 'ok':
+        if result['status'] != 'unsplittable':
+            print(f"  See the logs in {result['work_folder']}")
+        return 1
+    print(f"  {result['stitch']['header_lines']} header and {result['stitch']['footer_lines']} footer lines "
+          f"removed between pieces, block numbers {'continued' if result['stitch']['renumbered'] else 'unchanged'}")
+
+    if args.verify:
+        print(f"  Serial post: {verification['serial_seconds']:.2f} seconds, "
+              f"speed-up {verification['serial_seconds'] / result['seconds']:.1f}x")
+        if not verification['match']:
+            number, serial_line, split_line = verification['difference']
+            print(f"  MISMATCH at line {number}: serial {serial_line!r}, split {split_line!r}")
+            print(f"  Compare {verification['serial_nc']} with {args.output}")
+            return 1
+        print(f"  Split output matches the serial post ({verification['serial_nc']})")
+    return 0
+
+
+def command_history(args):
+    history = instrumentation.RunHistory(args.db)
+    if not os.path.exists(args.db):
+        print(f"No run history at {args.db}")
+        return 1
+
+    filters = {'program': args.program, 'post': args.post, 'machine': args.machine, 'host': args.host}
+    if args.runs:
+        for record in history.records(limit=args.runs, **filters):
+            print(json.dumps(record) if args.json else
+                  f"{record['started_at']}  {record.get('program')}  {record.get('post')}  {record['status']}  "
+                  f"{record['seconds']:.2f} s  " +
+                  ", ".join(f"{stage['name']} {stage['seconds'] or 0:.2f} s" for stage in record['stages']))
+        return 0
+
+    stages = [args.stage] if args.stage else [None] + history.stage_names()
+    rows = []
+    for stage in stages:
+        rows.extend(history.summary(args.by, stage, args.last, **filters))
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        for line in instrumentation.format_summary(rows, args.by):
+            print(line)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='smartpost', description="SmartPost merge and post pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_merge_options(subparser):
+        subparser.add_argument('--chunk-size', type=int, default=pipeline.DEFAULT_CHUNK_SIZE,
+                               help="Bytes scanned or copied per step")
+        subparser.add_argument('--no-zero-copy', action='store_true', help="Always copy through a buffer")
+
+    def add_post_options(subparser):
+        subparser.add_argument('--post-exe', required=True, help="Path to post.exe (or a compatible executable)")
+        subparser.add_argument('--post', required=True, help="Post processor (.cps)")
+        subparser.add_argument('--property', nargs=2, action='append', metavar=('NAME', 'VALUE'),
+                               help="Post property passed to post.exe, may be repeated")
+        subparser.add_argument('--compact', type=float, metavar='TOLERANCE',
+                               help="Compact the toolpath within this tolerance before posting")
+        subparser.add_argument('--timeout-base', type=float, default=60, help="Seconds allowed per post run")
+        subparser.add_argument('--timeout-per-mb', type=float, default=2, help="Extra seconds per MB of XML")
+
+    def add_dnc_options(subparser):
+        subparser.add_argument('--resume-line', type=int, default=0, help="Skip the lines an earlier transfer sent")
+        subparser.add_argument('--no-flow-control', action='store_true', help="Ignore XON/XOFF from the server")
+        subparser.add_argument('--send-timeout', type=float, default=60,
+                               help="Seconds the server may block or pause the transfer")
+
+    merge = subparsers.add_parser('merge', help="Merge intermediate XML files into one program")
+    merge.add_argument('output', help="Merged XML file to write")
+    merge.add_argument('inputs', nargs='+', help="Intermediate XML files in program order")
+    add_merge_options(merge)
+    merge.set_defaults(handler=command_merge)
+
+    post = subparsers.add_parser('post', help="Merge intermediate XML files and post them to one NC file")
+    post.add_argument('output', help="NC file to write")
+    post.add_argument('inputs', nargs='+', help="Intermediate XML files in program order")
+    post.add_argument('--keep-xml', action='store_true', help="Keep the merged XML next to the NC file")
+    post.add_argument('--dnc', metavar='HOST:PORT', help="Stream the NC file to a DNC server while it is written")
+    add_merge_options(post)
+    add_post_options(post)
+    add_dnc_options(post)
+    post.set_defaults(handler=command_post)
+
+    dnc_send = subparsers.add_parser('dnc-send', help="Send an NC file to a DNC server over TCP")
+    dnc_send.add_argument('address', metavar='HOST:PORT', help="DNC server address")
+    dnc_send.add_argument('nc_file', help="NC file to send")
+    add_dnc_options(dnc_send)
+    dnc_send.set_defaults(handler=command_dnc_send)
+
+    repost = subparsers.add_parser('repost', help="Post saved intermediate XML files in parallel, one NC file each")
+    repost.add_argument('inputs', nargs='+', help="XML files or folders of XML files")
+    repost.add_argument('--output-folder', required=True, help="Folder for the NC files")
+    repost.add_argument('--jobs', type=int, default=default_worker_count(), help="Post processes run at a time")
+    add_post_options(repost)
+    repost.set_defaults(handler=command_repost)
+
+    split = subparsers.add_parser('split-post', help="Post one program as pieces cut at tool changes, in parallel")
+    split.add_argument('output', help="NC file to write")
+    split.add_argument('inputs', nargs='+', help="A merged XML, or intermediate XML files to merge first")
+    split.add_argument('--chunks', type=int, help="Maximum number of pieces (default: one per job)")
+    split.add_argument('--jobs', type=int, default=default_worker_count(), help="Post processes run at a time")
+    split.add_argument('--split-sections', action='store_true', help="Also cut between operations sharing a tool")
+    split.add_argument('--header-property', help="Boolean post property turned off for all pieces but the first")
+    split.add_argument('--footer-property', help="Boolean post property turned off for all pieces but the last")
+    split.add_argument('--no-renumber', action='store_true', help="Keep the block numbers of each piece")
+    split.add_argument('--verify', action='store_true',
+                       help="Also post the program serially to <name>.serial.nc and compare")
+    split.add_argument('--ignore', metavar='REGEX', help="Lines matching this in both files are not compared, e.g. dates")
+    split.add_argument('--keep-xml', action='store_true', help="Keep the merged XML next to the NC file")
+    add_merge_options(split)
+    add_post_options(split)
+    split.set_defaults(handler=command_split_post)
+
+    history = subparsers.add_parser('history', help="Report percentiles and trends from the run history")
+    history.add_argument('--db', default=instrumentation.DEFAULT_HISTORY_PATH, help="Run history SQLite file")
+    history.add_argument('--by', choices=instrumentation.GROUP_COLUMNS, default='program', help="Group runs by")
+    history.add_argument('--stage', help="Report one stage (xml, merge, post, ...) instead of all of them")
+    history.add_argument('--last', type=int, default=50, help="Runs per group included in the statistics")
+    history.add_argument('--program', help="Only runs of this program")
+    history.add_argument('--post', help="Only runs with this post processor file name")
+    history.add_argument('--machine', help="Only runs posted for this CNC machine (the setup's machine)")
+    history.add_argument('--host', help="Only runs made on this computer")
+    history.add_argument('--runs', type=int, metavar='N', help="List the N most recent runs instead")
+    history.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+    history.set_defaults(handler=command_history)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+import os
+import math
+
+# Points considered at once when extending a line or arc, bounds the fitting cost per block
+MAX_FIT_POINTS = 64
+
+# Linear moves buffered before fitted blocks are written out
+WINDOW_POINTS = 4096
+
+# Largest sweep fitted as arc-cw/arc-ccw, xml.cps writes larger arcs as <circular> with a sweep
+MAX_ARC_SWEEP = math.pi * 0.99
+
+# Relative flatness below which three points are treated as collinear instead of fitting an arc
+COLLINEAR_EPSILON = 1e-12
+
+
+def format_number(value):
+    """Formats a coordinate like xml.cps mainFormat (6 decimals, no trailing zeros)."""
+    text = f"{value:.6f}".rstrip('0').rstrip('.')
+    return '0' if text in ('-0', '') else text
+
+
+def parse_move(line):
+    """Splits a <linear .../> line into its end point text and remaining attributes.
+
+    Returns (to_text, feed_text, other_attributes) or None when the line is not a plain
+    linear move written by xml.cps.
+    """
+    if not line.startswith(b'<linear to='):
+        return None
+    parts = line.rstrip().split(b"'")
+    if len(parts) % 2 == 0 or parts[-1] != b'/>':
+        return None
+    attributes = [(parts[i].strip().rstrip(b'='), parts[i + 1]) for i in range(2, len(parts) - 1, 2)]
+    feed = None
+    others = []
+    for name, value in attributes:
+        if name == b'feed':
+            feed = value
+        else:
+            others.append((name, value))
+    return parts[1], feed, tuple(others)
+
+
+def parse_point(text):
+    x, y, z = text.split()
+    return (float(x), float(y), float(z))
+
+
+def distance_to_segment(point, start, end):
+    """Distance from a point to the segment start-end."""
+    dx, dy, dz = end[0] - start[0], end[1] - start[1], end[2] - start[2]
+    px, py, pz = point[0] - start[0], point[1] - start[1], point[2] - start[2]
+    length_squared = dx * dx + dy * dy + dz * dz
+    if length_squared > 0:
+        t = max(0.0, min(1.0, (px * dx + py * dy + pz * dz) / length_squared))
+        px, py, pz = px - t * dx, py - t * dy, pz - t * dz
+    return math.sqrt(px * px + py * py + pz * pz)
+
+
+def circle_through(a, b, c):
+    """Center (x, y) and radius of the XY circle through three points, None when collinear."""
+    bx, by = b[0] - a[0], b[1] - a[1]
+    cx, cy = c[0] - a[0], c[1] - a[1]
+    d = 2 * (bx * cy - by * cx)
+    scale = (bx * bx + by * by) * (cx * cx + cy * cy)
+    if scale == 0 or d * d <= COLLINEAR_EPSILON * scale:
+        return None
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    ux = (cy * b2 - by * c2) / d
+    uy = (bx * c2 - cx * b2) / d
+    return (a[0] + ux, a[1] + uy), math.hypot(ux, uy)
+
+
+def longest_fit(fits, lowest, highest):
+    """Largest end in [lowest, highest] accepted by fits, None when lowest is rejected.
+
+    Grows the candidate exponentially and then bisects, so a block of n moves costs
+    O(log n) checks instead of one per move. Assumes a fit that fails at some end
+    also fails beyond it, which holds closely enough for tolerance checks.
+    """
+    if not fits(lowest):
+        return None
+    good, bad, step = lowest, highest + 1, 1
+    while good < highest:
+        candidate = min(good + step, highest)
+        if not fits(candidate):
+            bad = candidate
+            break
+        good = candidate
+        step *= 2
+    while bad - good > 1:
+        middle = (good + bad) // 2
+        if fits(middle):
+            good = middle
+        else:
+            bad = middle
+    return good
+
+
+class Compactor:
+    """Fits lines and XY arcs to runs of linear moves.
+
+    Arguments:
+    tolerance -- Maximum deviation of the new blocks from the original points and segment midpoints.
+    minimum_chord_length -- Arcs with a shorter chord are not fitted, as the post would linearize them.
+    minimum_circular_radius / maximum_circular_radius -- Radius limits for fitted arcs.
+    fit_arcs -- Set to False to only merge collinear moves.
+    """
+
+    def __init__(self, tolerance, minimum_chord_length=0.0, minimum_circular_radius=0.0,
+                 maximum_circular_radius=float('inf'), fit_arcs=True):
+        self.tolerance = float(tolerance)
+        self.minimum_chord_length = float(minimum_chord_length)
+        self.minimum_circular_radius = float(minimum_circular_radius)
+        self.maximum_circular_radius = float(maximum_circular_radius) or float('inf')
+        self.fit_arcs = fit_arcs
+
+    def line_fits(self, points, start, end):
+        """Checks that every point between start and end lies on the segment within tolerance."""
+        a, b = points[start], points[end]
+        tolerance = self.tolerance
+        return all(distance_to_segment(points[i], a, b) <= tolerance for i in range(start + 1, end))
+
+    def arc_fit(self, points, start, end):
+        """Returns (center, clockwise) when points[start..end] lie on one XY arc, otherwise None."""
+        a, b = points[start], points[end]
+        tolerance = self.tolerance
+        z = a[2]
+        if any(abs(points[i][2] - z) > tolerance for i in range(start + 1, end + 1)):
+            return None
+        if math.hypot(b[0] - a[0], b[1] - a[1]) < max(self.minimum_chord_length, tolerance):
+            return None
+
+        circle = circle_through(a, points[(start + end) // 2], b)
+        if circle is None:
+            return None
+        (cx, cy), radius = circle
+        if not self.minimum_circular_radius <= radius <= self.maximum_circular_radius:
+            return None
+
+        # Every point and every original segment midpoint must stay within tolerance of the circle,
+        # and the points must advance monotonically around it
+        previous_angle = math.atan2(a[1] - cy, a[0] - cx)
+        sweep = 0.0
+        direction = 0
+        for i in range(start + 1, end + 1):
+            p, q = points[i - 1], points[i]
+            if abs(math.hypot(q[0] - cx, q[1] - cy) - radius) > tolerance:
+                return None
+            mx, my = (p[0] + q[0]) / 2, (p[1] + q[1]) / 2
+            if abs(math.hypot(mx - cx, my - cy) - radius) > tolerance:
+                return None
+            angle = math.atan2(q[1] - cy, q[0] - cx)
+            step = (angle - previous_angle + math.pi) % (2 * math.pi) - math.pi
+            step_direction = 1 if step > 0 else -1
+            if step == 0 or (direction and step_direction != direction):
+                return None
+            direction = step_direction
+            sweep += abs(step)
+            previous_angle = angle
+        if sweep > MAX_ARC_SWEEP:
+            return None
+        return (cx, cy, z), direction < 0
+
+    def fit(self, points, final):
+        """Greedily fits blocks to points[0..]; points[0] is the known start position.
+
+        Returns a list of (end_index, arc) blocks, where arc is None for a line or
+        (center, clockwise). Unless final, blocks that could still grow with later
+        points are left unfitted.
+        """
+        blocks = []
+        start = 0
+        last = len(points) - 1
+        limit = last if final else last - MAX_FIT_POINTS
+        while start < limit:
+            highest = min(last, start + MAX_FIT_POINTS)
+            end = longest_fit(lambda end: self.line_fits(points, start, end), start + 1, highest)
+
+            # An arc replaces the line when it covers more moves (at least three)
+            arc = None
+            if self.fit_arcs and highest >= start + 3:
+                arc_end = longest_fit(lambda end: self.arc_fit(points, start, end) is not None, start + 3, highest)
+                if arc_end is not None and arc_end > end:
+                    arc = self.arc_fit(points, start, arc_end)
+                    end = arc_end
+
+            blocks.append((end, arc))
+            start = end
+        return blocks
+
+
+def compact_toolpath(xml_path, output_path, tolerance, minimum_chord_length=0.0, minimum_circular_radius=0.0,
+                     maximum_circular_radius=float('inf'), fit_arcs=True):
+    """Rewrites an intermediate XML with runs of <linear> moves merged into fewer lines and arcs.
+
+    Only consecutive linear moves with the same compensation are combined; the first
+    block of a run keeps the run's feed attribute so the modal feed is unchanged.
+    Everything else is copied through. Returns counters for the log.
+    """
+    compactor = Compactor(tolerance, minimum_chord_length, minimum_circular_radius,
+                          maximum_circular_radius, fit_arcs)
+    stats = {'blocks_in': 0, 'blocks_out': 0, 'linear_in': 0, 'linear_out': 0, 'arcs_out': 0}
+    move_prefixes = (b'<rapid', b'<linear', b'<arc-', b'<circular')
+
+    temp_path = f"{output_path}.tmp"
+    with open(xml_path, 'rb') as src, open(temp_path, 'wb') as out:
+        newline = b'\n'
+        position = None  # (point, to_text) of the last move
+        run = None  # {'points', 'texts', 'feed', 'others'} of the pending linear moves
+
+        def write_blocks(final):
+            blocks = compactor.fit(run['points'], final)
+            start = 0
+            for end, arc in blocks:
+                if arc is None:
+                    element = b"<linear to='" + run['texts'][end] + b"'"
+                    stats['linear_out'] += 1
+                else:
+                    (cx, cy, cz), clockwise = arc
+                    center = ' '.join(format_number(v) for v in (cx, cy, cz)).encode()
+                    element = (b"<arc-cw" if clockwise else b"<arc-ccw") + b" to='" + run['texts'][end] + \
+                              b"' center='" + center + b"'"
+                    stats['arcs_out'] += 1
+                if run['feed'] is not None:
+                    element += b" feed='" + run['feed'] + b"'"
+                    run['feed'] = None
+                for name, value in run['others']:
+                    element += b" " + name + b"='" + value + b"'"
+                out.write(element + b"/>" + newline)
+                stats['blocks_out'] += 1
+                start = end
+            if start:
+                del run['points'][:start]
+                del run['texts'][:start]
+
+        def flush():
+            nonlocal run
+            if run is not None:
+                write_blocks(True)
+                run = None
+
+        for line in src:
+            move = parse_move(line) if line.startswith(b'<linear') else None
+            if move is not None:
+                if line.endswith(b'\r\n'):
+                    newline = b'\r\n'
+                to_text, feed, others = move
+                stats['blocks_in'] += 1
+                stats['linear_in'] += 1
+                point = parse_point(to_text)
+                if run is not None and (feed is not None or others != run['others']):
+                    flush()
+                if run is None:
+                    if position is None:
+                        # Start point unknown, pass the move through
+                        out.write(line)
+                        stats['blocks_out'] += 1
+                        stats['linear_out'] += 1
+                        position = (point, to_text)
+                        continue
+                    run = {'points': [position[0]], 'texts': [position[1]], 'feed': feed, 'others': others}
+                run['points'].append(point)
+                run['texts'].append(to_text)
+                position = (point, to_text)
+                if len(run['points']) >= WINDOW_POINTS:
+                    write_blocks(False)
+                continue
+
+            flush()
+            out.write(line)
+            if line.startswith(move_prefixes):
+                stats['blocks_in'] += 1
+                stats['blocks_out'] += 1
+                to_start = line.find(b"to='")
+                if to_start != -1:
+                    to_text = line[to_start + 4:line.find(b"'", to_start + 4)]
+                    position = (parse_point(to_text), to_text)
+        flush()
+
+    os.replace(temp_path, output_path)
+    stats['reduction'] = 1 - stats['blocks_out'] / stats['blocks_in'] if stats['blocks_in'] else 0.0
+    return stats
@@ -0,0 +1,216 @@
+import os
+import time
+import socket
+import select
+import hashlib
+import threading
+
+# Software flow control characters a DNC server sends to pause and resume the sender
+XON = b'\x11'
+XOFF = b'\x13'
+
+
+class DncStream:
+    """Sends an NC file to a DNC server over TCP while the file is still being written.
+
+    A background thread follows the growing file and sends complete lines in
+    blocks of about block_size bytes, so the machine can start while the post is
+    still running. Backpressure comes from TCP itself (a blocked send waits up to
+    send_timeout seconds for the server) and, with flow_control, from XOFF/XON
+    characters the server sends back. resume_line skips the lines a previous,
+    interrupted transfer already delivered. lines_sent counts the lines handed to
+    TCP, so after a failure resume from the line count the machine reports when
+    it differs.
+
+    Call finish() once the producer has closed the file (the rest is sent and the
+    connection closed) or cancel() to stop. When the file turns out to have been
+    rewritten after parts of it were sent, the stream fails with an error.
+    """
+
+    def __init__(self, nc_path, host, port, resume_line=0, flow_control=True, connect_timeout=10, send_timeout=60,
+                 close_timeout=10, poll_interval=0.05, block_size=1024, on_progress=None):
+        self.nc_path = nc_path
+        self.host = host
+        self.port = port
+        self.resume_line = resume_line
+        self.flow_control = flow_control
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.close_timeout = close_timeout
+        self.poll_interval = poll_interval
+        self.block_size = block_size
+        self.on_progress = on_progress
+        self.lines_sent = resume_line
+        self.bytes_sent = 0
+        self.paused_seconds = 0.0
+        self.cancelled = False
+        self.error = None
+        self._finished = threading.Event()
+        self._done = threading.Event()
+        self._start_time = None
+        self._end_time = None
+
+    @property
+    def elapsed(self):
+        if not self._start_time:
+            return 0.0
+        return (self._end_time or time.time()) - self._start_time
+
+    @property
+    def succeeded(self):
+        return self._done.is_set() and not self.cancelled and self.error is None
+
+    def start(self):
+        self._start_time = time.time()
+        threading.Thread(target=self._run, name='DncStream', daemon=True).start()
+        return self
+
+    def finish(self):
+        """Marks the NC file as complete, the stream ends once everything is sent."""
+        self._finished.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._finished.set()
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds and returns True once the transfer has ended."""
+        return self._done.wait(timeout)
+
+    def describe(self):
+        if self.error:
+            return f"error after line {self.lines_sent}: {self.error}"
+        if self.cancelled:
+            return f"cancelled after line {self.lines_sent}"
+        return f"sent {self.lines_sent - self.resume_line} lines ({self.bytes_sent} bytes) in {self.elapsed:.1f} seconds"
+
+    def _run(self):
+        connection = None
+        try:
+            connection = socket.create_connection((self.host, self.port), self.connect_timeout)
+            connection.settimeout(self.send_timeout)
+            self._send_file(connection)
+            if not self.cancelled:
+                connection.shutdown(socket.SHUT_WR)
+                self._wait_for_close(connection)
+        except Exception as e:
+            self.error = e
+        finally:
+            if connection:
+                connection.close()
+            self._end_time = time.time()
+            self._done.set()
+
+    def _send_file(self, connection):
+        digest = hashlib.sha1()
+        position = 0
+        skip = self.resume_line
+        pending = b''
+
+        # The producer may not have created the file yet
+        while not os.path.exists(self.nc_path):
+            if self._finished.is_set():
+                raise FileNotFoundError(f"NC file not found: {self.nc_path}")
+            time.sleep(self.poll_interval)
+
+        with open(self.nc_path, 'rb') as f:
+            while not self.cancelled:
+                finished = self._finished.is_set()
+                f.seek(position)
+                data = f.read(self.block_size - len(pending))
+                if not data:
+                    if os.fstat(f.fileno()).st_size < position:
+                        raise IOError("NC file was truncated while it was being sent")
+                    if finished:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                position += len(data)
+                digest.update(data)
+                data = pending + data
+
+                if skip:
+                    lines = data.split(b'\n')
+                    skipped = min(skip, len(lines) - 1)
+                    data = b'\n'.join(lines[skipped:])
+                    skip -= skipped
+
+                # Only complete lines are sent until the producer is done
+                end = data.rfind(b'\n') + 1
+                if end == 0 and not finished and len(data) < self.block_size:
+                    pending = data
+                    continue
+                block, pending = (data[:end], data[end:]) if end else (data, b'')
+                if block and not skip:
+                    self._send(connection, block)
+
+            if pending and not self.cancelled:
+                self._send(connection, pending)
+
+            # Posts that rewrite their output in onTerminate change lines that were already sent. The open
+            # file is checked, the path may already point elsewhere once the NC file was published.
+            if not self.cancelled and file_digest_prefix(f, position) != digest.hexdigest():
+                raise IOError("NC file was rewritten after parts of it were sent, the transfer is not valid")
+
+    def _wait_for_close(self, connection):
+        """Reads until the server closes its side, so unread flow control characters do not reset the connection
+        and discard data the server has not read yet. Servers that keep the connection open are given close_timeout."""
+        deadline = time.time() + self.close_timeout
+        while time.time() < deadline:
+            readable, _, _ = select.select([connection], [], [], min(self.poll_interval, max(0, deadline - time.time())))
+            if readable and not connection.recv(256):
+                return
+
+    def _send(self, connection, block):
+        if self.flow_control:
+            self._wait_for_xon(connection)
+        connection.sendall(block)
+        self.bytes_sent += len(block)
+        self.lines_sent += block.count(b'\n')
+        if self.on_progress:
+            self.on_progress(self)
+
+    def _wait_for_xon(self, connection):
+        """Reads flow control characters from the server, blocks while it has sent XOFF."""
+        paused = False
+        pause_start = None
+        while not self.cancelled:
+            readable, _, _ = select.select([connection], [], [], self.poll_interval if paused else 0)
+            if readable:
+                data = connection.recv(256)
+                if not data:
+                    raise ConnectionError("DNC server closed the connection")
+                if XOFF in data or XON in data:
+                    paused = data.rfind(XOFF) > data.rfind(XON)
+                    if paused and pause_start is None:
+                        pause_start = time.time()
+                continue
+            if not paused:
+                break
+            if time.time() - pause_start > self.send_timeout:
+                raise TimeoutError(f"DNC server paused the transfer for more than {self.send_timeout} seconds")
+        if pause_start is not None:
+            self.paused_seconds += time.time() - pause_start
+
+
+def file_digest_prefix(file, length, chunk_size=1024 * 1024):
+    """SHA-1 of the first length bytes of an open binary file."""
+    digest = hashlib.sha1()
+    file.seek(0)
+    while length > 0:
+        chunk = file.read(min(chunk_size, length))
+        if not chunk:
+            break
+        digest.update(chunk)
+        length -= len(chunk)
+    return digest.hexdigest()
+
+
+def parse_address(address, default_port=None):
+    """Splits 'host:port' into (host, port)."""
+    host, _, port = address.rpartition(':')
+    if not host:
+        if default_port is None:
+            raise ValueError(f"DNC address needs a port: {address}")
+        return address, default_port
+    return host, int(port)
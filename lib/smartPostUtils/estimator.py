@@ -0,0 +1,156 @@
+from .toolpath import np, require_numpy, load_toolpath, MOVE_RAPID
+
+MM_PER_UNIT = {'millimeters': 1.0, 'inches': 25.4}
+
+
+def move_lengths(toolpath):
+    """Returns the path length of every move in the toolpath's own units.
+
+    Lines and rapids use the straight distance from the previous end point.
+    Arcs use radius * sweep, where the sweep comes from the XML attribute when
+    present (full circles) and otherwise from the angle between the start and
+    end radius vectors in the arc plane. Helical arcs add their axial travel.
+    The first move has no known start point and counts as zero length.
+    """
+    require_numpy()
+    positions = toolpath.positions
+    lengths = np.zeros(len(toolpath), dtype=np.float64)
+    if not len(toolpath):
+        return lengths
+
+    deltas = np.diff(positions, axis=0)
+    lengths[1:] = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+
+    rows = toolpath.arc_rows
+    valid = rows > 0
+    rows = rows[valid]
+    if len(rows):
+        centers = toolpath.arc_centers[valid]
+        normals = toolpath.arc_normals[valid].astype(np.float64)
+        normals /= np.linalg.norm(normals, axis=1)[:, None]
+        sweeps = toolpath.arc_sweeps[valid].astype(np.float64)
+
+        start = positions[rows - 1] - centers
+        end = positions[rows] - centers
+        start_axial = np.einsum('ij,ij->i', start, normals)
+        end_axial = np.einsum('ij,ij->i', end, normals)
+        start_radial = start - start_axial[:, None] * normals
+        end_radial = end - end_axial[:, None] * normals
+
+        radius = np.linalg.norm(start_radial, axis=1)
+        end_radius = np.linalg.norm(end_radial, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cosine = np.einsum('ij,ij->i', start_radial, end_radial) / (radius * end_radius)
+        angle = np.arccos(np.clip(np.nan_to_num(cosine, nan=1.0), -1.0, 1.0))
+        angle = np.where(np.isnan(sweeps), angle, np.abs(sweeps))
+
+        lengths[rows] = np.hypot(radius * angle, end_axial - start_axial)
+    return lengths
+
+
+def estimate_toolpath(toolpath, rapid_rate, tool_change_time=0.0):
+    """Estimates cycle time and travel of a parsed toolpath.
+
+    Arguments:
+    toolpath -- A toolpath.Toolpath.
+    rapid_rate -- Rapid traverse rate in mm/min, also used for feed moves without a feedrate.
+    tool_change_time -- Seconds per tool change (a section whose tool number differs from the previous one).
+
+    Returns a report with 'total', 'sections' and 'tools' entries. Distances are in mm, times in seconds.
+    """
+    require_numpy()
+    sections = toolpath.sections
+    section_count = len(sections)
+    move_sections = toolpath.move_sections
+
+    # Per section scale to mm; feeds are in the same unit per minute as the positions
+    scales = np.array([MM_PER_UNIT.get(section['unit'], 1.0) for section in sections], dtype=np.float64)
+    move_scales = scales[move_sections] if section_count else np.ones(0)
+    lengths = move_lengths(toolpath) * move_scales
+
+    rapid = toolpath.kinds == MOVE_RAPID
+    feeds = toolpath.feeds.astype(np.float64) * move_scales
+    feeds = np.where(rapid | ~(feeds > 0), float(rapid_rate), feeds)
+    times = lengths / feeds * 60.0
+
+    def per_section(values):
+        return np.bincount(move_sections, weights=values, minlength=section_count)
+
+    cutting = ~rapid
+    columns = {
+        'cutting_distance': per_section(np.where(cutting, lengths, 0.0)),
+        'rapid_distance': per_section(np.where(rapid, lengths, 0.0)),
+        'cutting_time': per_section(np.where(cutting, times, 0.0)),
+        'rapid_time': per_section(np.where(rapid, times, 0.0)),
+        'moves': np.bincount(move_sections, minlength=section_count),
+        'arcs': np.bincount(move_sections[toolpath.arc_rows], minlength=section_count),
+    }
+
+    report_sections = []
+    previous_tool = None
+    for index, section in enumerate(sections):
+        tool_number = (section['tool'] or {}).get('number')
+        tool_number = int(tool_number) if isinstance(tool_number, float) else tool_number
+        tool_changed = index == 0 or tool_number != previous_tool
+        previous_tool = tool_number
+
+        entry = {
+            'index': index,
+            'comment': section['comment'],
+            'tool': tool_number,
+            'tool_change': tool_changed,
+            'tool_change_time': float(tool_change_time) if tool_changed else 0.0,
+            'dwell_time': section.get('dwell', 0.0),
+        }
+        entry.update({name: values[index].item() for name, values in columns.items()})
+        entry['time'] = entry['cutting_time'] + entry['rapid_time'] + entry['tool_change_time'] + entry['dwell_time']
+        report_sections.append(entry)
+
+    summed = ('time', 'cutting_time', 'rapid_time', 'tool_change_time', 'dwell_time',
+              'cutting_distance', 'rapid_distance', 'moves', 'arcs')
+    tools = {}
+    for entry in report_sections:
+        tool = tools.setdefault(entry['tool'], dict.fromkeys(summed, 0))
+        tool['sections'] = tool.get('sections', 0) + 1
+        for name in summed:
+            tool[name] += entry[name]
+
+    total = {name: sum(entry[name] for entry in report_sections) for name in summed}
+    total['sections'] = section_count
+    total['tool_changes'] = sum(entry['tool_change'] for entry in report_sections)
+    return {'total': total, 'sections': report_sections, 'tools': tools}
+
+
+def estimate_cycle_time(xml_path, rapid_rate, tool_change_time=0.0, cache_path=False):
+    """Parses an intermediate XML and estimates its cycle time, see estimate_toolpath."""
+    toolpath = load_toolpath(xml_path, cache_path)
+    return estimate_toolpath(toolpath, rapid_rate, tool_change_time)
+
+
+def format_duration(seconds):
+    """Formats seconds as H:MM:SS."""
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_report(report):
+    """Returns the estimate as human readable log lines."""
+    total = report['total']
+    lines = [
+        f"Estimated cycle time {format_duration(total['time'])} "
+        f"(cutting {format_duration(total['cutting_time'])}, rapid {format_duration(total['rapid_time'])}, "
+        f"tool changes {format_duration(total['tool_change_time'])}, dwell {format_duration(total['dwell_time'])})",
+        f"Travel: cutting {total['cutting_distance'] / 1000:.2f} m, rapid {total['rapid_distance'] / 1000:.2f} m, "
+        f"{total['moves']} moves in {total['sections']} sections, {total['tool_changes']} tool changes"
+    ]
+    for entry in report['sections']:
+        lines.append(
+            f"  Section {entry['index'] + 1} {entry['comment'] or ''} T{entry['tool']}: {format_duration(entry['time'])}, "
+            f"cutting {entry['cutting_distance']:.1f} mm, rapid {entry['rapid_distance']:.1f} mm"
+        )
+    for tool, entry in report['tools'].items():
+        lines.append(
+            f"  Tool T{tool}: {format_duration(entry['time'])} in {entry['sections']} sections, "
+            f"cutting {entry['cutting_distance']:.1f} mm, rapid {entry['rapid_distance']:.1f} mm"
+        )
+    return lines
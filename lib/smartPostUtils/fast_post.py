@@ -0,0 +1,438 @@
+import math
+import xml.etree.ElementTree as ET
+
+# Namespace used by xml.cps for all intermediate elements
+NC_NAMESPACE = '{http://www.hsmworks.com/xml/2008/nc}'
+
+# Default Fanuc-style output dialect, override any key through the dialect argument
+DEFAULT_DIALECT = {
+    'sequence_numbers': True,        # Output N-words
+    'sequence_start': 10,
+    'sequence_increment': 5,
+    'sequence_max': 99999,           # Wraps back to sequence_start after this number
+    'decimals_mm': 3,                # Coordinate decimals for metric output
+    'decimals_in': 4,                # Coordinate decimals for inch output
+    'feed_decimals_mm': 1,
+    'feed_decimals_in': 2,
+    'force_decimal': True,           # Write 10. instead of 10
+    'program_number_format': 'O{:04d}',
+    'uppercase_comments': True,
+    'tool_change': 'T{tool} M6',
+    'tool_length_offset': True,      # Output G43 H<tool> on the first Z move after a tool change
+    'safe_retract': ['G28 G91 Z0.', 'G90'],
+    'program_end': 'M30',
+}
+
+# High feedrate mapping values passed by SmartPost (see HIGH_FEED_MAPPING_ITEMS)
+HIGH_FEED_PRESERVE_RAPID = 0
+HIGH_FEED_PRESERVE_SINGLE_AXIS = 1
+HIGH_FEED_PRESERVE_AXIAL_RADIAL = 2
+HIGH_FEED_ALWAYS = 5
+
+COOLANT_CODES = {'flood': 'M8', 'mist': 'M7', 'tool': 'M8', 'air': 'M8', 'air through tool': 'M8'}
+
+# Arc plane per dominant normal axis (x, y, z) and the in-plane (u, v) axes, ordered so
+# that counter-clockwise motion around the positive axis rotates u towards v
+ARC_PLANES = {
+    0: ('G19', 1, 2),
+    1: ('G18', 2, 0),
+    2: ('G17', 0, 1),
+}
+ARC_CENTER_WORDS = ('I', 'J', 'K')
+
+EPSILON = 1e-9
+
+
+class FastPostError(Exception):
+    """Raised when the intermediate XML uses features the built-in engine cannot post."""
+
+
+class FastPostCancelled(Exception):
+    """Raised when the progress callback asks to stop."""
+
+
+class NumberFormat:
+    """Formats numbers with a fixed number of decimals and no trailing zeros."""
+
+    def __init__(self, decimals, force_decimal=True):
+        self.decimals = decimals
+        self.force_decimal = force_decimal
+
+    def format(self, value):
+        text = f"{value:.{self.decimals}f}"
+        if '.' in text:
+            text = text.rstrip('0')
+            if not self.force_decimal:
+                text = text.rstrip('.')
+        if text.startswith('-') and float(text) == 0:
+            text = text[1:]
+        return text
+
+
+class FastPostEngine:
+    """Turns xml.cps intermediate elements into Fanuc-style G-code blocks.
+
+    The engine is fed element start/end events in document order and keeps
+    only modal state, so memory does not depend on the program size.
+    """
+
+    def __init__(self, out, properties, dialect=None):
+        self.out = out
+        self.dialect = dict(DEFAULT_DIALECT, **(dialect or {}))
+        self.properties = properties
+
+        self.unit = int(properties.get('unit', 1))
+        metric = self.unit != 0
+        force_decimal = self.dialect['force_decimal']
+        self.xyz_format = NumberFormat(self.dialect['decimals_mm' if metric else 'decimals_in'], force_decimal)
+        self.feed_format = NumberFormat(self.dialect['feed_decimals_mm' if metric else 'feed_decimals_in'], force_decimal)
+        self.rpm_format = NumberFormat(0, False)
+
+        self.tolerance = float(properties.get('tolerance', 0.001 if metric else 0.00004))
+        self.minimum_chord_length = float(properties.get('minimumChordLength', 0))
+        self.minimum_circular_radius = float(properties.get('minimumCircularRadius', 0))
+        self.maximum_circular_radius = float(properties.get('maximumCircularRadius', 0)) or math.inf
+        self.allow_helical_moves = str(properties.get('allowHelicalMoves', True)).lower() == 'true'
+        self.high_feed_mapping = int(properties.get('highFeedMapping', HIGH_FEED_PRESERVE_RAPID))
+        self.high_feedrate = float(properties.get('highFeedrate', 0))
+
+        self.sequence = self.dialect['sequence_start']
+        self.scale = 1.0
+        self.position = [None, None, None]
+        self.stats = {'blocks': 0, 'moves': 0, 'sections': 0, 'tool_changes': 0}
+
+        # Pending section data collected from <context>, <tool> and <parameter> elements
+        self.work_offset = None
+        self.pending_tool = None
+        self.pending_comment = None
+        self.current_tool = None
+        self.coolant_code = None
+        self.needs_length_offset = False
+
+        self.reset_modals()
+
+    # Block output
+    def reset_modals(self):
+        self.modal = {'motion': None, 'plane': None, 'compensation': None, 'feed': None,
+                      'X': None, 'Y': None, 'Z': None, 'work_offset': None}
+
+    def write_block(self, *words):
+        words = [word for word in words if word]
+        if not words:
+            return
+        if self.dialect['sequence_numbers']:
+            words.insert(0, f"N{self.sequence}")
+            self.sequence += self.dialect['sequence_increment']
+            if self.sequence > self.dialect['sequence_max']:
+                self.sequence = self.dialect['sequence_start']
+        self.out.write(' '.join(words) + '\n')
+        self.stats['blocks'] += 1
+
+    def write_comment(self, text):
+        text = text.replace('(', '').replace(')', '')
+        if self.dialect['uppercase_comments']:
+            text = text.upper()
+        self.out.write(f"({text})\n")
+
+    def modal_word(self, key, value):
+        """Returns value if it differs from the modal state, otherwise None."""
+        if value is None or self.modal[key] == value:
+            return None
+        self.modal[key] = value
+        return value
+
+    def axis_words(self, point):
+        words = []
+        for axis, name in enumerate('XYZ'):
+            text = self.xyz_format.format(point[axis])
+            if self.modal[name] != text:
+                self.modal[name] = text
+                words.append(f"{name}{text}")
+        return words
+
+    def feed_word(self, feed):
+        if feed is None:
+            return None
+        return self.modal_word('feed', f"F{self.feed_format.format(feed)}")
+
+    # Program structure
+    def start_program(self):
+        self.out.write('%\n')
+        header = self.dialect['program_number_format'].format(int(self.properties.get('programName', 1)))
+        comment = str(self.properties.get('programComment', '')).strip("'\" ")
+        if comment:
+            header += f" ({comment.upper() if self.dialect['uppercase_comments'] else comment})"
+        self.out.write(header + '\n')
+        self.write_block('G90', 'G94', 'G17', 'G40', 'G49', 'G80')
+        self.write_block('G20' if self.unit == 0 else 'G21')
+        self.modal['plane'] = 'G17'
+        self.modal['compensation'] = 'G40'
+
+    def end_program(self):
+        if self.coolant_code:
+            self.write_block('M9')
+        self.write_block('M5')
+        for block in self.dialect['safe_retract']:
+            self.write_block(block)
+        self.write_block(self.dialect['program_end'])
+        self.out.write('%\n')
+
+    def start_section(self):
+        self.stats['sections'] += 1
+        tool = self.pending_tool
+        if tool and tool['number'] != self.current_tool:
+            if self.coolant_code:
+                self.write_block('M9')
+                self.coolant_code = None
+            if self.current_tool is not None:
+                self.write_block('M5')
+                for block in self.dialect['safe_retract']:
+                    self.write_block(block)
+                self.position = [None, None, None]
+                self.modal.update({'motion': None, 'feed': None, 'X': None, 'Y': None, 'Z': None, 'work_offset': None})
+            if self.pending_comment:
+                self.write_comment(self.pending_comment)
+            self.write_block(self.dialect['tool_change'].format(tool=tool['number']))
+            self.current_tool = tool['number']
+            self.needs_length_offset = self.dialect['tool_length_offset']
+            self.stats['tool_changes'] += 1
+        elif self.pending_comment:
+            self.write_comment(self.pending_comment)
+
+        if tool:
+            if tool['rpm'] > 0:
+                self.write_block(f"S{self.rpm_format.format(tool['rpm'])}", 'M3')
+            coolant_code = COOLANT_CODES.get(tool['coolant'])
+            if coolant_code != self.coolant_code:
+                self.write_block(coolant_code or 'M9')
+                self.coolant_code = coolant_code
+
+        self.write_block(self.modal_word('work_offset', self.work_offset_code()))
+        self.pending_comment = None
+
+    def work_offset_code(self):
+        offset = self.work_offset or 0
+        if offset <= 1:
+            return 'G54'
+        if offset <= 6:
+            return f"G{53 + offset}"
+        return f"G54.1 P{offset - 6}"
+
+    # Motion
+    def parse_point(self, text):
+        return [float(value) * self.scale for value in text.split()]
+
+    def move_to(self, point):
+        self.position = list(point)
+        self.stats['moves'] += 1
+
+    def rapid(self, point):
+        if self.needs_length_offset and None in self.position:
+            # First positioning after a tool change: XY first, then Z with the length offset
+            xy_words = []
+            for axis, name in enumerate('XY'):
+                text = self.xyz_format.format(point[axis])
+                self.modal[name] = text
+                xy_words.append(f"{name}{text}")
+            self.write_block(self.modal_word('motion', 'G0'), *xy_words)
+            z_text = self.xyz_format.format(point[2])
+            self.modal['Z'] = z_text
+            self.write_block('G43', f"Z{z_text}", f"H{self.current_tool}")
+            self.needs_length_offset = False
+            self.move_to(point)
+            return
+
+        if self.use_high_feed(point):
+            self.write_block(self.modal_word('motion', 'G1'), *self.axis_words(point),
+                             self.feed_word(self.high_feedrate))
+        else:
+            self.write_block(self.modal_word('motion', 'G0'), *self.axis_words(point))
+        self.move_to(point)
+
+    def use_high_feed(self, point):
+        if self.high_feed_mapping == HIGH_FEED_PRESERVE_RAPID or self.high_feedrate <= 0 or None in self.position:
+            return False
+        if self.high_feed_mapping == HIGH_FEED_ALWAYS:
+            return True
+        moving = [abs(point[axis] - self.position[axis]) > EPSILON for axis in range(3)]
+        if self.high_feed_mapping == HIGH_FEED_PRESERVE_SINGLE_AXIS:
+            return sum(moving) > 1
+        if self.high_feed_mapping == HIGH_FEED_PRESERVE_AXIAL_RADIAL:
+            return moving[2] and (moving[0] or moving[1])
+        return False
+
+    def linear(self, point, feed):
+        if self.needs_length_offset and None in self.position:
+            raise FastPostError("Feed move before the first positioning move of a tool")
+        self.write_block(self.modal_word('motion', 'G1'), *self.axis_words(point), self.feed_word(feed))
+        self.move_to(point)
+
+    def compensation(self, mode):
+        codes = {'off': 'G40', 'left': 'G41', 'right': 'G42'}
+        code = codes.get(mode)
+        if code is None or code == self.modal['compensation']:
+            return None
+        self.modal['compensation'] = code
+        return f"{code} D{self.current_tool}" if code != 'G40' else code
+
+    def arc(self, tag, attrib, feed):
+        start = self.position
+        if None in start:
+            raise FastPostError("Circular move without a known start position")
+        end = self.parse_point(attrib['to'])
+        center = self.parse_point(attrib['center'])
+        normal = [float(value) for value in attrib.get('normal', '0 0 1').split()]
+
+        axis = max(range(3), key=lambda i: abs(normal[i]))
+        if abs(abs(normal[axis]) - 1) > 1e-6:
+            raise FastPostError("Circular moves outside the XY, ZX and YZ planes are not supported")
+
+        # Direction relative to the positive plane axis
+        clockwise = tag == 'arc-cw'
+        if normal[axis] < 0:
+            clockwise = not clockwise
+        plane_code, u, v = ARC_PLANES[axis]
+        direction = -1 if clockwise else 1
+
+        radius = math.hypot(start[u] - center[u], start[v] - center[v])
+        start_angle = math.atan2(start[v] - center[v], start[u] - center[u])
+        if 'sweep' in attrib:
+            sweep = float(attrib['sweep'])
+        else:
+            end_angle = math.atan2(end[v] - center[v], end[u] - center[u])
+            sweep = ((end_angle - start_angle) * direction) % (2 * math.pi)
+            if sweep < EPSILON and tag == 'circular':
+                sweep = 2 * math.pi
+
+        helical = abs(end[axis] - start[axis]) > EPSILON
+        chord = 2 * radius * math.sin(min(sweep, math.pi) / 2)
+        if chord < self.minimum_chord_length or radius < EPSILON:
+            self.linear(end, feed)
+            return
+        if (radius < self.minimum_circular_radius or radius > self.maximum_circular_radius
+                or (helical and not self.allow_helical_moves) or sweep > 2 * math.pi + EPSILON):
+            self.linearize_arc(start, end, center, radius, start_angle, sweep, direction, axis, u, v, feed)
+            return
+
+        center_words = [f"{ARC_CENTER_WORDS[i]}{self.xyz_format.format(center[i] - start[i])}" for i in sorted((u, v))]
+        self.write_block(self.modal_word('plane', plane_code), self.modal_word('motion', 'G2' if clockwise else 'G3'),
+                         *self.axis_words(end), *center_words, self.feed_word(feed))
+        # Arc end points are always written, the control needs them even when unchanged
+        self.move_to(end)
+
+    def linearize_arc(self, start, end, center, radius, start_angle, sweep, direction, axis, u, v, feed):
+        tolerance = max(self.tolerance, EPSILON)
+        step = 2 * math.acos(max(-1.0, 1 - tolerance / radius)) if tolerance < radius else math.pi
+        segments = max(1, int(math.ceil(sweep / max(step, EPSILON))))
+        for i in range(1, segments + 1):
+            if i == segments:
+                point = end
+            else:
+                t = i / segments
+                angle = start_angle + direction * sweep * t
+                point = list(start)
+                point[u] = center[u] + radius * math.cos(angle)
+                point[v] = center[v] + radius * math.sin(angle)
+                point[axis] = start[axis] + (end[axis] - start[axis]) * t
+            self.linear(point, feed)
+
+    # Element dispatch
+    def start_element(self, tag, attrib, path):
+        if 'tool' in path:
+            return  # Holder sections and other tool details
+
+        if tag == 'context':
+            unit = attrib.get('unit', 'millimeters')
+            source_metric = unit != 'inches'
+            output_metric = self.unit != 0
+            self.scale = 1.0 if source_metric == output_metric else (1 / 25.4 if source_metric else 25.4)
+            plane = [float(value) for value in attrib.get('plane', '1 0 0 0 1 0 0 0 1').split()]
+            if any(abs(a - b) > 1e-6 for a, b in zip(plane, (1, 0, 0, 0, 1, 0, 0, 0, 1))):
+                raise FastPostError("Tilted work planes are not supported by the built-in post engine")
+            self.work_offset = int(float(attrib.get('work-offset', 0)))
+        elif tag == 'tool':
+            self.pending_tool = {
+                'number': int(float(attrib.get('number', 0))),
+                'rpm': float(attrib.get('spindle-rpm', 0)),
+                'coolant': attrib.get('coolant', 'disabled'),
+            }
+        elif tag == 'parameter':
+            if attrib.get('name') == 'operation-comment':
+                self.pending_comment = attrib.get('value')
+        elif tag == 'section':
+            self.start_section()
+        elif tag in ('rapid', 'linear', 'arc-cw', 'arc-ccw', 'circular'):
+            # Lean xml.cps output omits compensation='off'
+            compensation = self.compensation(attrib.get('compensation', 'off'))
+            if compensation:
+                self.write_block(compensation)
+            point = self.parse_point(attrib['to'])
+            feed = float(attrib['feed']) * self.scale if 'feed' in attrib else None
+            if tag == 'rapid':
+                self.rapid(point)
+            elif tag == 'linear':
+                self.linear(point, feed)
+            else:
+                self.arc(tag, attrib, feed)
+        elif tag == 'dwell':
+            self.write_block('G4', f"P{int(round(float(attrib.get('seconds', 0)) * 1000))}")
+        elif tag in ('rapid5d', 'linear5d'):
+            raise FastPostError("5-axis moves are not supported by the built-in post engine")
+
+    def end_element(self, tag, element, path):
+        if tag == 'comment':
+            self.write_comment(element.text or '')
+
+
+def post_process(xml_path, nc_path, properties, dialect=None, on_progress=None, chunk_size=1024 * 1024):
+    """Posts an xml.cps intermediate file to G-code without post.exe.
+
+    Arguments:
+    xml_path -- The (merged) intermediate XML written by xml.cps.
+    nc_path -- The NC file to create.
+    properties -- The post properties SmartPost passes to post.exe (programName,
+                  programComment, unit, tolerance, minimumChordLength, ...).
+    dialect -- Overrides for DEFAULT_DIALECT.
+    on_progress -- Optional callback receiving the number of XML bytes read. Returning
+                   False cancels posting with FastPostCancelled.
+
+    :returns:
+        A dictionary with block, move, section and tool change counts.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+    path = []
+
+    with open(xml_path, 'rb') as src, open(nc_path, 'w', encoding='utf-8') as out:
+        engine = FastPostEngine(out, properties, dialect)
+        engine.start_program()
+
+        def handle_events():
+            for event, element in parser.read_events():
+                tag = element.tag.replace(NC_NAMESPACE, '')
+                if event == 'start':
+                    engine.start_element(tag, element.attrib, path)
+                    stack.append(element)
+                    path.append(tag)
+                else:
+                    stack.pop()
+                    path.pop()
+                    engine.end_element(tag, element, path)
+                    # Drop finished elements so the tree never grows
+                    if stack:
+                        stack[-1].remove(element)
+
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            handle_events()
+            if on_progress and on_progress(src.tell()) is False:
+                raise FastPostCancelled("Post processing was cancelled")
+        parser.close()
+        handle_events()
+
+        engine.end_program()
+
+    return engine.stats
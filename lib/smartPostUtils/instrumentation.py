@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import platform
+import statistics
+from contextlib import contextmanager
+
+# Version of the JSON run record, stored with every record in the history
+RECORD_FORMAT_VERSION = 2
+
+DEFAULT_HISTORY_PATH = os.path.expanduser('~/AppData/Local/SmartPost/run_history.sqlite')
+
+# Every xml.cps move element (rapid, linear, arc-cw, arc-ccw, circular, 5-axis variants) has a to attribute
+MOVE_MARKER = b" to='"
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    workflow TEXT,
+    program TEXT,
+    post TEXT,
+    machine TEXT,
+    host TEXT,
+    status TEXT,
+    seconds REAL,
+    operations INTEGER,
+    xml_bytes INTEGER,
+    nc_bytes INTEGER,
+    moves INTEGER,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    seconds REAL,
+    bytes INTEGER,
+    moves INTEGER,
+    returncode INTEGER,
+    status TEXT,
+    PRIMARY KEY (run_id, position)
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs(started_at);
+CREATE INDEX IF NOT EXISTS stages_name ON stages(name);
+"""
+
+# Columns the history report can group runs by: machine is the CNC machine of the setup, host the computer
+GROUP_COLUMNS = ('program', 'post', 'machine', 'host', 'workflow')
+
+# Column names of the runs table, in the order append writes them
+RUN_COLUMNS = ('run_id', 'started_at', 'workflow', 'program', 'post', 'machine', 'host', 'status', 'seconds',
+               'operations', 'xml_bytes', 'nc_bytes', 'moves', 'record')
+
+
+class RunTrace:
+    """Collects the stages and operations of one post run into a JSON-serializable record.
+
+    Stages are timed with stage() as a context manager that yields the stage's
+    dict, so the caller can add byte counts, move counts or a return code while it
+    runs. Work timed elsewhere (e.g. a post.exe job in a pool) is added with
+    add_stage. finish() closes the record and returns it.
+    """
+
+    def __init__(self, workflow, **context):
+        self.record = {
+            'version': RECORD_FORMAT_VERSION,
+            'run_id': uuid.uuid4().hex,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'workflow': workflow,
+            'machine': None,
+            'host': platform.node(),
+            'status': 'running',
+            'seconds': None,
+        }
+        self.record.update(context)
+        self.record['stages'] = []
+        self.record['operations'] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Times a stage; an exception marks it as an error and propagates."""
+        with self._timed(self.record['stages'], name, fields) as entry:
+            yield entry
+
+    @contextmanager
+    def operation(self, name, **fields):
+        """Times the processing of one operation (or group of operations)."""
+        with self._timed(self.record['operations'], name, fields) as entry:
+            yield entry
+
+    def add_stage(self, name, seconds, **fields):
+        entry = {'name': name, 'seconds': seconds, 'status': 'ok'}
+        entry.update(fields)
+        self.record['stages'].append(entry)
+        return entry
+
+    @contextmanager
+    def _timed(self, entries, name, fields):
+        entry = {'name': name, 'start': round(time.perf_counter() - self._start, 6), 'seconds': None, 'status': 'ok'}
+        entry.update(fields)
+        entries.append(entry)
+        start = time.perf_counter()
+        try:
+            yield entry
+        except BaseException as e:
+            entry['status'] = 'error'
+            entry['error'] = str(e)
+            raise
+        finally:
+            entry['seconds'] = round(time.perf_counter() - start, 6)
+
+    def finish(self, status, **fields):
+        """Closes the record with a final status and totals, returns it."""
+        self.record['status'] = status
+        self.record['seconds'] = round(time.perf_counter() - self._start, 6)
+        self.record.update(fields)
+        return self.record
+
+    def to_json(self):
+        return json.dumps(self.record, separators=(',', ':'), default=str)
+
+
+def count_moves(xml_path, chunk_size=1024 * 1024):
+    """Counts the move elements of an intermediate XML with a chunked byte scan."""
+    count = 0
+    tail = b''
+    with open(xml_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # The tail is shorter than the marker, so no match is counted twice
+            window = tail + chunk
+            count += window.count(MOVE_MARKER)
+            tail = window[-(len(MOVE_MARKER) - 1):]
+    return count
+
+
+def percentile(values, fraction):
+    """Linear-interpolated percentile of a non-empty list, fraction in [0, 1]."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def trend(values):
+    """Relative change of the median of the newer half of values against the older half (None below 4 values)."""
+    if len(values) < 4:
+        return None
+    middle = len(values) // 2
+    older = statistics.median(values[:middle])
+    newer = statistics.median(values[-middle:])
+    return newer / older - 1 if older else None
+
+
+class RunHistory:
+    """Local SQLite history of run records.
+
+    A connection is opened per call, so the history can be used from any thread
+    and the database file is not kept locked between runs.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+
+    def _connect(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.executescript(HISTORY_SCHEMA)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+        if 'host' not in columns:
+            # Histories of record version 1 stored the computer name as machine
+            with connection:
+                connection.execute("ALTER TABLE runs ADD COLUMN host TEXT")
+                connection.execute("UPDATE runs SET host = machine, machine = NULL")
+        return connection
+
+    def append(self, record):
+        """Stores a finished run record."""
+        stages = record.get('stages', [])
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    f"INSERT OR REPLACE INTO runs ({', '.join(RUN_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(RUN_COLUMNS))})",
+                    (record['run_id'], record['started_at'], record.get('workflow'), record.get('program'),
+                     record.get('post'), record.get('machine'), record.get('host'), record.get('status'),
+                     record.get('seconds'), len(record.get('operations', [])), record.get('xml_bytes'),
+                     record.get('nc_bytes'), record.get('moves'), json.dumps(record, default=str))
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(record['run_id'], position, stage['name'], stage.get('seconds'), stage.get('bytes'),
+                      stage.get('moves'), stage.get('returncode'), stage.get('status'))
+                     for position, stage in enumerate(stages)]
+                )
+        finally:
+            connection.close()
+
+    def records(self, limit=None, **filters):
+        """Returns stored run records, newest first, filtered by exact column values (e.g. program='1001')."""
+        where, values = self._where(filters)
+        query = f"SELECT record FROM runs {where} ORDER BY started_at DESC"
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        connection = self._connect()
+        try:
+            return [json.loads(row[0]) for row in connection.execute(query, values)]
+        finally:
+            connection.close()
+
+    def durations(self, group_by='program', stage=None, status='ok', **filters):
+        """Returns {group value: [(started_at, seconds, bytes)]} in time order, for whole runs or one stage."""
+        if group_by not in GROUP_COLUMNS:
+            raise ValueError(f"Cannot group runs by {group_by}, use one of {', '.join(GROUP_COLUMNS)}")
+        if status:
+            filters['status'] = status
+        where, values = self._where(filters, table='runs')
+        if stage:
+            query = (f"SELECT runs.{group_by}, runs.started_at, SUM(stages.seconds), SUM(stages.bytes) FROM runs "
+                     f"JOIN stages ON stages.run_id = runs.run_id {where} {'AND' if where else 'WHERE'} stages.name = ? "
+                     f"GROUP BY runs.run_id ORDER BY runs.started_at")
+            values.append(stage)
+        else:
+            query = f"SELECT {group_by}, started_at, seconds, xml_bytes FROM runs {where} ORDER BY started_at"
+
+        groups = {}
+        connection = self._connect()
+        try:
+            for group, started_at, seconds, size in connection.execute(query, values):
+                if seconds is not None:
+                    groups.setdefault(group, []).append((started_at, seconds, size))
+        finally:
+            connection.close()
+        return groups
+
+    def summary(self, group_by='program', stage=None, last=None, **filters):
+        """Percentiles and trend of run (or stage) durations per group, over the last runs of each group."""
+        rows = []
+        for group, entries in sorted(self.durations(group_by, stage, **filters).items(), key=lambda item: str(item[0])):
+            entries = entries[-last:] if last else entries
+            seconds = [entry[1] for entry in entries]
+            sizes = [entry[2] for entry in entries if entry[2]]
+            rows.append({
+                group_by: group,
+                'stage': stage or 'total',
+                'runs': len(seconds),
+                'p50': percentile(seconds, 0.5),
+                'p90': percentile(seconds, 0.9),
+                'p95': percentile(seconds, 0.95),
+                'max': max(seconds),
+                'last': seconds[-1],
+                'last_run': entries[-1][0],
+                'trend': trend(seconds),
+                'mb': statistics.median(sizes) / 1024 ** 2 if sizes else None,
+            })
+        return rows
+
+    def stage_names(self):
+        connection = self._connect()
+        try:
+            return [row[0] for row in connection.execute("SELECT DISTINCT name FROM stages ORDER BY name")]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _where(filters, table=None):
+        prefix = f"{table}." if table else ""
+        columns = [(name, value) for name, value in filters.items() if value is not None]
+        for name, _ in columns:
+            if name not in GROUP_COLUMNS + ('status',):
+                raise ValueError(f"Unknown history filter: {name}")
+        if not columns:
+            return "", []
+        return "WHERE " + " AND ".join(f"{prefix}{name} = ?" for name, _ in columns), [value for _, value in columns]
+
+
+def format_summary(rows, group_by='program'):
+    """Returns the history summary as aligned text lines."""
+    if not rows:
+        return ["No matching runs in the history"]
+    lines = [f"{group_by:<24} {'stage':<12} {'runs':>5} {'p50 s':>9} {'p90 s':>9} {'p95 s':>9} "
+             f"{'max s':>9} {'last s':>9} {'trend':>8} {'XML MB':>8}"]
+    for row in rows:
+        trend_text = f"{row['trend']:+.1%}" if row['trend'] is not None else '-'
+        size_text = f"{row['mb']:.1f}" if row['mb'] is not None else '-'
+        lines.append(f"{str(row[group_by])[:24]:<24} {row['stage'][:12]:<12} {row['runs']:>5} {row['p50']:>9.2f} "
+                     f"{row['p90']:>9.2f} {row['p95']:>9.2f} {row['max']:>9.2f} {row['last']:>9.2f} "
+                     f"{trend_text:>8} {size_text:>8}")
+    return lines
@@ -0,0 +1,544 @@
+import os
+import sys
+import queue
+import threading
+
+from .post_runner import PostProcessRun, PostProcessPool
+from . import compaction
+
+# XML markers used to locate section boundaries while merging
+NC_END_TAG = b'</nc>'
+SPINDLE_PARAM_TAGS = (
+    b"<parameter name='areBothSpindlesGrabbed'",
+    b'<parameter name="areBothSpindlesGrabbed"'
+)
+SECTION_START_TAGS = (b'<tool', b'<section')
+
+# Error codes for postprocessing (post.exe)
+POST_ERROR_CODES = {
+    0: "Successful processing.",
+    1: "Unspecified failure.",
+    100: "Failed to load post configuration.",
+    101: "Empty configuration.",
+    102: "Failed to initialize.",
+    103: "Failed to evaluate configuration.",
+    104: "Invalid machine configuration.",
+    200: "Failed to load intermediate NC data.",
+    201: "Unknown format.",
+    300: "Failed to open output file.",
+    400: "Failed to open log file.",
+    500: "Post processing failed.",
+    501: "Post processing was aborted.",
+    502: "Post processing timed out.",
+}
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def merge_xml_files(file_paths, output_file, chunk_size=DEFAULT_CHUNK_SIZE, zero_copy=True, log=None,
+                    on_progress=None):
+    """Merges xml.cps intermediate files into one program using constant-memory streaming.
+
+    The first file is copied up to its </nc> tag. Each following file contributes its
+    operation parameters (from the areBothSpindlesGrabbed marker) and its tool/section
+    data. The inputs are left in place; the partial output is removed on failure.
+
+    Arguments:
+    file_paths -- Intermediate XML files in program order.
+    output_file -- Merged XML to write.
+    chunk_size -- Bytes scanned or copied per step.
+    zero_copy -- Use kernel-side copies (copy_file_range/sendfile) where available.
+    log -- Optional callable receiving progress and warning messages.
+    on_progress -- Optional callable receiving the bytes written so far, about once per chunk.
+                   It may raise (e.g. OperationCancelled) to stop the merge.
+    """
+    # Validate input files
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"XML file not found: {file_path}")
+
+    merger = XmlMerger(output_file, chunk_size, zero_copy, log, on_progress)
+    try:
+        for file_path in file_paths:
+            merger.add(file_path)
+        merger.close()
+    except BaseException:
+        merger.abort()
+        raise
+
+
+class XmlMerger:
+    """Appends intermediate XML files to a merged program one at a time.
+
+    This is the streaming core of merge_xml_files: add() takes the files in program
+    order, close() writes the closing </nc> tag and abort() removes the partial
+    output. The output file stays open between calls.
+    """
+
+    def __init__(self, output_file, chunk_size=DEFAULT_CHUNK_SIZE, zero_copy=True, log=None, on_progress=None):
+        self.output_file = output_file
+        self.chunk_size = chunk_size
+        self.zero_copy = zero_copy
+        self.log = log or (lambda message: None)
+        self.on_progress = on_progress
+        self.files = 0
+        self.bytes_written = 0
+        self._out_file = None
+        self._separator = os.linesep.encode()
+
+    def _copied(self, count):
+        self.bytes_written += count
+        if self.on_progress:
+            self.on_progress(self.bytes_written)
+
+    def _open(self):
+        # Ensure output directory exists
+        output_dir = os.path.dirname(self.output_file)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self._out_file = open(self.output_file, 'wb')
+
+    def add(self, file_path):
+        """Appends the operation data of one intermediate file."""
+        if self._out_file is None:
+            self._open()
+            # Process first file
+            with open(file_path, 'rb') as first_file:
+                nc_end = rfind_in_file(first_file, NC_END_TAG, self.chunk_size)
+                if nc_end == -1:
+                    raise ValueError("First file is not valid NC XML (missing </nc> tag)")
+                copy_file_range(first_file, self._out_file, 0, nc_end, self.chunk_size, self.zero_copy, self._copied)
+            self.files += 1
+            return
+
+        # Process subsequent files
+        with open(file_path, 'rb') as current_file:
+            nc_end = rfind_in_file(current_file, NC_END_TAG, self.chunk_size)
+            if nc_end == -1:
+                self.log(f"Warning: Invalid NC XML in {file_path}, skipping")
+                return
+
+            # Find spindle parameters and tool/section start with a bounded scan
+            offsets = find_in_file(current_file, SPINDLE_PARAM_TAGS + SECTION_START_TAGS, nc_end, self.chunk_size)
+            spindle_param = max(offsets[tag] for tag in SPINDLE_PARAM_TAGS)
+            section_start = max(offsets[tag] for tag in SECTION_START_TAGS)
+
+            # Write extracted content
+            ranges = []
+            if spindle_param != -1 and section_start != -1:
+                ranges.append((spindle_param, section_start))
+            if section_start != -1:
+                ranges.append((section_start, nc_end))
+            elif spindle_param == -1:
+                ranges.append((0, nc_end))
+
+            for range_start, range_end in ranges:
+                start, end = strip_file_range(current_file, range_start, range_end)
+                self._out_file.write(self._separator)
+                copy_file_range(current_file, self._out_file, start, end, self.chunk_size, self.zero_copy,
+                                self._copied)
+
+            self.log(f"Merged file {self.files}: {file_path}")
+            self.files += 1
+
+    def close(self):
+        """Finishes the merged program."""
+        if self._out_file is None:
+            raise ValueError("No XML files to merge")
+        self._out_file.write(self._separator + NC_END_TAG)
+        self._out_file.close()
+
+        # Verify output file
+        if os.path.getsize(self.output_file) == 0:
+            raise ValueError("Merged file is empty")
+
+    def abort(self):
+        """Closes and removes the partial output."""
+        if self._out_file is not None:
+            self._out_file.close()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+
+class BackgroundMerge:
+    """Merges intermediate XML files on a writer thread while the caller produces the next ones.
+
+    submit() queues a file and returns at once; the writer appends the files in
+    submission order and, with remove_inputs, deletes each one once it is merged.
+    finish() waits for the queue to drain and re-raises a writer error; abort()
+    stops the writer and removes the partial output. file_paths lists every
+    submitted file, e.g. to clean up after an abort.
+    """
+
+    def __init__(self, output_file, chunk_size=DEFAULT_CHUNK_SIZE, zero_copy=True, log=None, remove_inputs=True):
+        self.merger = XmlMerger(output_file, chunk_size, zero_copy, log)
+        self.remove_inputs = remove_inputs
+        self.error = None
+        self.file_paths = []
+        self._queue = queue.Queue()
+        self._closed = False
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, name='BackgroundMerge', daemon=True)
+        self._thread.start()
+
+    @property
+    def bytes_written(self):
+        return self.merger.bytes_written
+
+    def submit(self, file_path):
+        """Queues the next file in program order."""
+        if self.error:
+            raise self.error
+        if self._closed:
+            raise ValueError("No files can be added once the merge is finishing")
+        self.file_paths.append(file_path)
+        self._queue.put(file_path)
+
+    def wait(self, timeout=None):
+        """Ends the queue and waits up to timeout seconds for the queued files, returns True once they are merged."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def finish(self):
+        """Waits for the queued files and closes the merged program."""
+        self.wait()
+        if self.error:
+            self.merger.abort()
+            raise self.error
+        try:
+            self.merger.close()
+        except BaseException:
+            self.merger.abort()
+            raise
+
+    def abort(self):
+        """Drops the queued files and removes the partial output, the inputs are left in place."""
+        self._aborted = True
+        self.wait()
+        self.merger.abort()
+
+    def _run(self):
+        while True:
+            file_path = self._queue.get()
+            if file_path is None or self._aborted:
+                return
+            if self.error:
+                continue
+            try:
+                self.merger.add(file_path)
+                if self.remove_inputs:
+                    os.remove(file_path)
+            except Exception as e:
+                self.error = e
+
+
+def find_in_file(file, patterns, limit, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Finds the first offset of each byte pattern before limit, scanning in fixed-size chunks."""
+    overlap = max(len(pattern) for pattern in patterns) - 1
+    offsets = {pattern: -1 for pattern in patterns}
+    position = 0
+    tail = b''
+
+    file.seek(0)
+    while position < limit and -1 in offsets.values():
+        chunk = file.read(min(chunk_size, limit - position))
+        if not chunk:
+            break
+        window = tail + chunk
+        window_start = position - len(tail)
+        for pattern in patterns:
+            if offsets[pattern] == -1:
+                index = window.find(pattern)
+                if index != -1 and window_start + index + len(pattern) <= limit:
+                    offsets[pattern] = window_start + index
+        position += len(chunk)
+        tail = window[-overlap:] if overlap else b''
+
+    return offsets
+
+
+def find_all_in_file(file, patterns, limit, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Returns (offset, pattern) for every occurrence of the byte patterns before limit, in file order."""
+    overlap = max(len(pattern) for pattern in patterns) - 1
+    matches = []
+    position = 0
+    tail = b''
+
+    file.seek(0)
+    while position < limit:
+        chunk = file.read(min(chunk_size, limit - position))
+        if not chunk:
+            break
+        window = tail + chunk
+        window_start = position - len(tail)
+        for pattern in patterns:
+            index = window.find(pattern)
+            while index != -1:
+                # A match that lies entirely in the tail was already found in the previous window
+                if index + len(pattern) > len(tail):
+                    matches.append((window_start + index, pattern))
+                index = window.find(pattern, index + 1)
+        position += len(chunk)
+        tail = window[-overlap:] if overlap else b''
+
+    matches.sort()
+    return matches
+
+
+def rfind_in_file(file, pattern, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Finds the last offset of a byte pattern, scanning backwards from the end of the file."""
+    position = file.seek(0, os.SEEK_END)
+    head = b''
+
+    while position > 0:
+        start = max(0, position - chunk_size)
+        file.seek(start)
+        window = file.read(position - start) + head
+        index = window.rfind(pattern)
+        if index != -1:
+            return start + index
+        head = window[:len(pattern) - 1]
+        position = start
+
+    return -1
+
+
+def strip_file_range(file, start, end):
+    """Narrows a byte range so it excludes leading and trailing whitespace."""
+    block_size = 4096
+
+    while start < end:
+        file.seek(start)
+        block = file.read(min(block_size, end - start))
+        stripped = block.lstrip()
+        start += len(block) - len(stripped)
+        if stripped or not block:
+            break
+
+    while end > start:
+        block_start = max(start, end - block_size)
+        file.seek(block_start)
+        block = file.read(end - block_start)
+        stripped = block.rstrip()
+        end = block_start + len(stripped)
+        if stripped or not block:
+            break
+
+    return start, end
+
+
+def copy_file_range(src_file, dst_file, start, end, chunk_size=DEFAULT_CHUNK_SIZE, zero_copy=True, on_progress=None):
+    """Copies bytes [start, end) of src_file to dst_file without loading them into memory.
+
+    on_progress(count) is called after every chunk_size bytes (or fewer) copied.
+    """
+    remaining = end - start
+    if remaining <= 0:
+        return
+
+    # Let the kernel move the data directly between files where possible
+    if zero_copy:
+        dst_file.flush()
+        # Kernel copies are split into chunks only when progress is reported
+        step = chunk_size if on_progress else remaining
+        while remaining > 0:
+            count = min(step, remaining)
+            copied = kernel_copy(src_file.fileno(), dst_file.fileno(), start, count)
+            start += copied
+            remaining -= copied
+            if on_progress and copied:
+                on_progress(copied)
+            if copied < count:
+                break
+        dst_file.seek(0, os.SEEK_END)
+
+    # Fall back to copying through a single reusable buffer
+    buffer = memoryview(bytearray(min(chunk_size, remaining))) if remaining > 0 else None
+    src_file.seek(start)
+    while remaining > 0:
+        read = src_file.readinto(buffer[:min(len(buffer), remaining)])
+        if not read:
+            raise EOFError(f"Unexpected end of file while copying {src_file.name}")
+        dst_file.write(buffer[:read])
+        remaining -= read
+        if on_progress:
+            on_progress(read)
+
+
+def kernel_copy(src_fd, dst_fd, offset, count):
+    """Copies data between file descriptors in the kernel and returns the number of bytes copied.
+
+    Returns fewer bytes than requested (possibly 0) when the files do not support it,
+    e.g. across devices or on a network share; the caller finishes with a buffered copy.
+    """
+    copied = 0
+    try:
+        if hasattr(os, 'copy_file_range'):
+            while copied < count:
+                sent = os.copy_file_range(src_fd, dst_fd, count - copied, offset + copied)
+                if sent == 0:
+                    break
+                copied += sent
+        elif hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+            while copied < count:
+                sent = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+                if sent == 0:
+                    break
+                copied += sent
+    except OSError:
+        pass
+    return copied
+
+
+def post_properties(post_params, pgm_num, unit):
+    """Returns the --property arguments SmartPost passes to post.exe for the dialog's settings."""
+    # Set unit and rate suffixes
+    unit_suffix, unit_rate = ("in", "in/min") if unit == 0 else ("mm", "mm/min")
+
+    return [
+        "--property", "allowHelicalMoves", str(post_params['allowHelicalMoves']).lower(),
+        "--property", "highFeedMapping", str(post_params['highFeedMapping']),
+        "--property", "minimumChordLength", f"{post_params.get('minimumChordLength', 0)}{unit_suffix}",
+        "--property", "highFeedrate", f"{post_params.get('highFeedrate', 0)}{unit_rate}",
+        "--property", "maximumCircularRadius", f"{post_params.get('maximumCircularRadius', 0)}{unit_suffix}",
+        "--property", "minimumCircularRadius", f"{post_params.get('minimumCircularRadius', 0)}{unit_suffix}",
+        "--property", "tolerance", f"{post_params.get('tolerance', 0)}{unit_suffix}",
+        "--property", "programComment", f"'{post_params['comment']}'",
+        "--property", "programName", str(pgm_num),
+        "--property", "unit", str(unit)
+    ]
+
+
+def build_post_command(post_exe_path, post_processor, xml_path, nc_file, properties=(), log_path=None,
+                       open_in_editor=False, debug=False):
+    """Builds the post.exe argument list (no shell quoting needed).
+
+    post_exe_path may be any executable with post.exe's command line; a Python
+    script is run with the current interpreter so stand-ins work on every platform.
+    """
+    params = [post_exe_path]
+    if post_exe_path.lower().endswith('.py'):
+        params.insert(0, sys.executable)
+
+    if log_path:
+        params.extend(["--log", log_path])
+    if debug:
+        params.append("--debug")
+    params.extend(["--allowui", "--sandbox", "--lang", "en"])
+
+    # Open NC File in Editor
+    if not open_in_editor:
+        params.append("--noeditor")
+
+    params.extend(properties)
+    params.extend([post_processor, xml_path, nc_file])
+    return params
+
+
+def post_timeout(xml_size, base=60, per_mb=2):
+    """Scales the post.exe timeout with the size of the intermediate data."""
+    return base + per_mb * xml_size / 1024 ** 2
+
+
+def describe_run(run):
+    """Short status text for a finished PostProcessRun."""
+    if run.error:
+        return f"error: {run.error}"
+    if run.cancelled:
+        return "cancelled"
+    if run.timed_out:
+        return f"timed out after {run.timeout:.0f} seconds"
+    if run.returncode != 0:
+        return f"failed with return code {run.returncode}: {POST_ERROR_CODES.get(run.returncode, 'Unknown error code')}"
+    return "ok"
+
+
+def compact_xml(xml_path, tolerance, minimum_chord_length=0.0, minimum_circular_radius=0.0,
+                maximum_circular_radius=0.0, fit_arcs=True):
+    """Optional transform stage: compacts an intermediate XML in place and returns the statistics."""
+    compacted_path = f"{os.path.splitext(xml_path)[0]}_compact.xml"
+    try:
+        stats = compaction.compact_toolpath(xml_path, compacted_path, tolerance, minimum_chord_length,
+                                            minimum_circular_radius, maximum_circular_radius, fit_arcs)
+        os.replace(compacted_path, xml_path)
+    finally:
+        if os.path.exists(compacted_path):
+            os.remove(compacted_path)
+    return stats
+
+
+def repost_files(xml_files, output_folder, post_exe_path, post_processor, properties=(), max_workers=None,
+                 timeout_base=60, timeout_per_mb=2, transform=None, on_finished=None):
+    """Posts saved intermediate XML files to NC files, running up to max_workers post processes at a time.
+
+    Each input becomes <output_folder>/<name>.nc. transform(xml_path) is called on a
+    working copy of every input before it is posted, e.g. compact_xml. on_finished(result)
+    is called as each job completes. Returns one result dict per input, in input order.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    pool = PostProcessPool(max_workers)
+    results = []
+
+    for xml_path in xml_files:
+        name = os.path.splitext(os.path.basename(xml_path))[0]
+        nc_file = os.path.join(output_folder, f"{name}.nc")
+        log_path = os.path.join(output_folder, f"{name}.log")
+        result = {'xml': xml_path, 'nc': nc_file, 'log': log_path, 'status': 'pending', 'xml_size': 0,
+                  'nc_size': 0, 'seconds': 0.0, 'run': None, 'work_xml': xml_path}
+        results.append(result)
+        try:
+            if transform:
+                result['work_xml'] = os.path.join(output_folder, f"{name}.work.xml")
+                with open(xml_path, 'rb') as src, open(result['work_xml'], 'wb') as dst:
+                    copy_file_range(src, dst, 0, os.path.getsize(xml_path))
+                transform(result['work_xml'])
+            result['xml_size'] = os.path.getsize(result['work_xml'])
+            if os.path.exists(nc_file):
+                os.remove(nc_file)
+        except Exception as e:
+            result['status'] = f"error: {e}"
+            continue
+
+        params = build_post_command(post_exe_path, post_processor, result['work_xml'], nc_file, properties, log_path)
+        timeout = post_timeout(result['xml_size'], timeout_base, timeout_per_mb)
+        result['run'] = pool.submit(PostProcessRun(params, f"{os.path.splitext(log_path)[0]}_stdout.log", timeout))
+
+    reported = set()
+    while True:
+        busy = pool.poll(0.25)
+        for result in results:
+            run = result['run']
+            if run is None or id(run) in reported or not run.wait(0):
+                continue
+            reported.add(id(run))
+            finish_repost(result)
+            if on_finished:
+                on_finished(result)
+        if not busy:
+            break
+
+    for result in results:
+        if result['run'] is None and on_finished:
+            on_finished(result)
+    return results
+
+
+def finish_repost(result):
+    """Records the outcome of a finished repost job and removes its temporary files."""
+    run = result['run']
+    result['seconds'] = run.elapsed
+    result['status'] = describe_run(run)
+    if result['status'] == 'ok' and not os.path.exists(result['nc']):
+        result['status'] = "error: output NC file was not created"
+
+    # Keep the post logs of failed jobs for diagnosis
+    if result['work_xml'] != result['xml'] and os.path.exists(result['work_xml']):
+        os.remove(result['work_xml'])
+    if result['status'] == 'ok':
+        result['nc_size'] = os.path.getsize(result['nc'])
+        for path in (result['log'], f"{os.path.splitext(result['log'])[0]}_stdout.log"):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+import subprocess
+from collections import deque
+
+
+class PostProcessRun:
+    """Runs post.exe (or any executable) in the background without a shell.
+
+    stdout and stderr are streamed to stdout_path instead of being kept in
+    memory. A monitor thread polls the process every poll_interval seconds,
+    calls on_poll(run) so the caller can report progress, and kills the
+    process once timeout seconds have passed.
+    """
+
+    def __init__(self, args, stdout_path, timeout=None, poll_interval=0.25, on_poll=None):
+        self.args = [str(arg) for arg in args]
+        self.stdout_path = stdout_path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.on_poll = on_poll
+        self.returncode = None
+        self.timed_out = False
+        self.cancelled = False
+        self.error = None
+        self._process = None
+        self._start_time = None
+        self._end_time = None
+        self._done = threading.Event()
+
+    @property
+    def elapsed(self):
+        """Seconds the process has been running, or ran once it finished."""
+        if not self._start_time:
+            return 0.0
+        return (self._end_time or time.time()) - self._start_time
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    def start(self):
+        """Starts the process and its monitor thread."""
+        stdout_dir = os.path.dirname(self.stdout_path)
+        if stdout_dir:
+            os.makedirs(stdout_dir, exist_ok=True)
+
+        try:
+            with open(self.stdout_path, 'wb') as stdout_file:
+                self._process = subprocess.Popen(
+                    self.args,
+                    stdout=stdout_file,
+                    stderr=subprocess.STDOUT,
+                    stdin=subprocess.DEVNULL,
+                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+                )
+        except OSError as e:
+            self.error = e
+            self._done.set()
+            raise
+        self._start_time = time.time()
+        threading.Thread(target=self._monitor, name='PostProcessRun', daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds and returns True once the process has finished."""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Requests termination of the running process, a run that has not started yet never starts."""
+        self.cancelled = True
+        if self._process is None:
+            self._done.set()
+        self._terminate()
+
+    def _terminate(self):
+        if self._process and self._process.poll() is None:
+            try:
+                self._process.kill()
+            except OSError:
+                pass
+
+    def _monitor(self):
+        try:
+            while True:
+                try:
+                    self.returncode = self._process.wait(self.poll_interval)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+
+                if self.timeout is not None and self.elapsed > self.timeout:
+                    self.timed_out = True
+                    self._terminate()
+
+                self._notify()
+        except Exception as e:
+            self.error = e
+            self._terminate()
+        finally:
+            self._end_time = time.time()
+            self._done.set()
+            self._notify()
+
+    def _notify(self):
+        if self.on_poll:
+            try:
+                self.on_poll(self)
+            except Exception:
+                pass
+
+
+def default_worker_count():
+    """Leaves one core for Fusion itself."""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class PostProcessPool:
+    """Runs PostProcessRun jobs with at most max_workers processes at a time.
+
+    The pool has no thread of its own: the caller drives it with poll(), which
+    starts queued runs as slots free up, so it fits an event loop that must keep
+    pumping UI events between polls.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_worker_count()
+        self.pending = deque()
+        self.active = []
+        self.finished = []
+
+    @property
+    def done(self):
+        return not self.pending and not self.active
+
+    def submit(self, run):
+        """Queues a run, it starts on a later poll()."""
+        self.pending.append(run)
+        return run
+
+    def poll(self, timeout=0):
+        """Starts queued runs, waits up to timeout seconds for one to finish, returns True while work remains."""
+        while self.pending and len(self.active) < self.max_workers:
+            run = self.pending.popleft()
+            try:
+                run.start()
+            except OSError:
+                pass  # Recorded in run.error
+            self.active.append(run)
+
+        if self.active:
+            self.active[0].wait(timeout)
+        still_running = []
+        for run in self.active:
+            (self.finished if run.wait(0) else still_running).append(run)
+        self.active = still_running
+        return not self.done
+
+    def cancel(self):
+        """Stops active runs and drops queued ones."""
+        for run in list(self.pending) + self.active:
+            run.cancel()
+        self.finished.extend(self.pending)
+        self.pending.clear()
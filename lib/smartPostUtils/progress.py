@@ -0,0 +1,99 @@
+import time
+
+
+class OperationCancelled(Exception):
+    """Raised by Progress.check once the user has cancelled the run."""
+
+
+class Progress:
+    """Time rate-limited progress reporting with cancellation, independent of the UI toolkit.
+
+    A run is split into weighted stages. Within a stage the caller reports work in
+    its own unit (operations, bytes) with advance or update; the overall fraction
+    is derived from the stage weights. The UI callbacks run at most once per
+    interval seconds, so callers can report every operation or megabyte without
+    slowing the work down, and no fixed sleeps are needed to keep Fusion responsive.
+
+    Arguments:
+    update -- Called as update(message, fraction) with the overall fraction in [0, 1].
+    is_cancelled -- Returns True once the user asked to stop, e.g. a dialog's cancel button.
+    pump -- Processes pending UI events, e.g. adsk.doEvents.
+    interval -- Minimum seconds between UI updates and cancel checks.
+    stages -- Sequence of (name, weight) pairs in run order.
+    close -- Called once by close(), e.g. to hide the dialog.
+    """
+
+    def __init__(self, update=None, is_cancelled=None, pump=None, interval=0.1, stages=(), close=None):
+        self.update_callback = update
+        self.is_cancelled = is_cancelled
+        self.pump = pump
+        self.interval = interval
+        self.close_callback = close
+        self.cancelled = False
+
+        total_weight = sum(weight for _, weight in stages) or 1
+        self.stages = {}
+        offset = 0.0
+        for name, weight in stages:
+            self.stages[name] = (offset / total_weight, weight / total_weight)
+            offset += weight
+
+        self.stage = None
+        self.total = 0
+        self.done = 0
+        self.message = ''
+        self._last_poll = None
+
+    @property
+    def fraction(self):
+        start, share = self.stages.get(self.stage, (0.0, 0.0))
+        if self.total:
+            start += share * min(1.0, self.done / self.total)
+        return min(1.0, start)
+
+    def start_stage(self, name, total=0, message=None):
+        """Moves to the next stage; total is the amount of work it will report."""
+        self.stage = name
+        self.total = total
+        self.done = 0
+        if message is not None:
+            self.message = message
+        return self.poll(force=True)
+
+    def advance(self, amount=1, message=None):
+        """Reports amount more work done, returns False once cancelled."""
+        return self.update(self.done + amount, message)
+
+    def update(self, done, message=None):
+        """Reports the work done so far in the current stage, returns False once cancelled."""
+        self.done = done
+        if message is not None:
+            self.message = message
+        return self.poll()
+
+    def poll(self, force=False):
+        """Updates the UI and checks for cancellation when due, returns False once cancelled."""
+        now = time.monotonic()
+        if force or self._last_poll is None or now - self._last_poll >= self.interval:
+            self._last_poll = now
+            if self.pump:
+                self.pump()
+            if self.is_cancelled and self.is_cancelled():
+                self.cancelled = True
+            if self.update_callback:
+                self.update_callback(self.message, self.fraction)
+        return not self.cancelled
+
+    def check(self):
+        """Raises OperationCancelled once the user has cancelled, for loops that stop between steps."""
+        if not self.poll():
+            raise OperationCancelled("Cancelled by the user")
+
+    def quiet(self):
+        """Progress for nested work that keeps the UI responsive and cancellable without changing what it shows."""
+        return Progress(is_cancelled=lambda: not self.poll(), interval=self.interval)
+
+    def close(self):
+        if self.close_callback:
+            callback, self.close_callback = self.close_callback, None
+            callback()
@@ -0,0 +1,359 @@
+import os
+import re
+import time
+import shutil
+from itertools import zip_longest
+
+from .post_runner import PostProcessRun, PostProcessPool
+from .artifact_cache import make_key, file_digest
+from . import pipeline
+
+# Start of the tool element of an operation in the intermediate XML
+TOOL_TAG = b'<tool '
+TOOL_NUMBER = re.compile(rb"number=['\"]([^'\"]*)['\"]")
+
+# Leading block number of an NC line, e.g. N120
+SEQUENCE_NUMBER = re.compile(rb'^N(\d+) ?')
+
+# Bytes read from the start and end of each piece to find the program header and footer
+EDGE_BYTES = 64 * 1024
+
+
+def scan_operations(xml_path, chunk_size=pipeline.DEFAULT_CHUNK_SIZE):
+    """Locates the operations of a merged intermediate XML with one chunked scan.
+
+    Operations start at the areBothSpindlesGrabbed parameter, the same marker the
+    merge cuts at, so everything before the first one is program-level data.
+    Returns (prologue end, </nc> offset, [{'start', 'end', 'tool'}]).
+    """
+    with open(xml_path, 'rb') as f:
+        nc_end = pipeline.rfind_in_file(f, pipeline.NC_END_TAG, chunk_size)
+        if nc_end == -1:
+            raise ValueError(f"Not a valid NC XML (missing </nc> tag): {xml_path}")
+
+        operations = []
+        for offset, pattern in pipeline.find_all_in_file(f, pipeline.SPINDLE_PARAM_TAGS + (TOOL_TAG,), nc_end,
+                                                         chunk_size):
+            if pattern != TOOL_TAG:
+                if operations:
+                    operations[-1]['end'] = offset
+                operations.append({'start': offset, 'end': nc_end, 'tool': None})
+            elif operations and operations[-1]['tool'] is None:
+                f.seek(offset)
+                match = TOOL_NUMBER.search(f.readline(4096))
+                operations[-1]['tool'] = match.group(1) if match else b''
+
+    prologue_end = operations[0]['start'] if operations else nc_end
+    return prologue_end, nc_end, operations
+
+
+def plan_chunks(operations, max_chunks, split_sections=False):
+    """Groups operations into at most max_chunks byte ranges of similar size.
+
+    Pieces are only cut where the tool changes (or between any two operations with
+    split_sections), so each piece starts with a full tool change as it does in a
+    serial post. max_chunks None cuts at every such boundary, which keeps the pieces
+    the same when other parts of the program change. Returns [(start, end)] in
+    program order.
+    """
+    if not operations:
+        return []
+    boundaries = [index for index in range(1, len(operations))
+                  if split_sections or operations[index]['tool'] != operations[index - 1]['tool']]
+
+    first = operations[0]['start']
+    total = operations[-1]['end'] - first
+    cuts = list(boundaries) if max_chunks is None else []
+    for piece in range(1, max(1, max_chunks or 0)):
+        if not boundaries:
+            break
+        # The boundary closest to an even share of the program
+        target = first + total * piece / max_chunks
+        index = min(boundaries, key=lambda boundary: abs(operations[boundary]['start'] - target))
+        if index not in cuts:
+            cuts.append(index)
+    cuts.sort()
+
+    edges = [0] + cuts + [len(operations)]
+    return [(operations[start]['start'], operations[end - 1]['end']) for start, end in zip(edges, edges[1:])]
+
+
+def split_xml(xml_path, output_folder, max_chunks, split_sections=False, chunk_size=pipeline.DEFAULT_CHUNK_SIZE):
+    """Writes the pieces of a merged XML as standalone programs, returns their paths (one path: nothing to split).
+
+    max_chunks None writes one piece per tool (or per operation with split_sections).
+
+    Every piece gets the program prologue, its operations and the closing </nc> tag.
+    """
+    prologue_end, nc_end, operations = scan_operations(xml_path, chunk_size)
+    chunks = plan_chunks(operations, max_chunks, split_sections)
+    if len(chunks) < 2:
+        return [xml_path]
+
+    os.makedirs(output_folder, exist_ok=True)
+    name = os.path.splitext(os.path.basename(xml_path))[0]
+    separator = os.linesep.encode()
+    paths = []
+    with open(xml_path, 'rb') as src:
+        for index, (start, end) in enumerate(chunks):
+            path = os.path.join(output_folder, f"{name}.part{index + 1:02d}.xml")
+            with open(path, 'wb') as dst:
+                pipeline.copy_file_range(src, dst, 0, prologue_end, chunk_size)
+                start, end = pipeline.strip_file_range(src, start, end)
+                pipeline.copy_file_range(src, dst, start, end, chunk_size)
+                dst.write(separator + pipeline.NC_END_TAG)
+            paths.append(path)
+    return paths
+
+
+def read_edge_lines(path, from_end=False, max_bytes=EDGE_BYTES):
+    """Returns the complete lines in the first (or last) max_bytes of a file, line endings included."""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(0, size - max_bytes) if from_end else 0
+        f.seek(start)
+        data = f.read(max_bytes)
+    lines = data.splitlines(keepends=True)
+    # Drop the line cut by the window
+    if from_end and start > 0:
+        lines = lines[1:]
+    elif not from_end and len(data) < size and lines and not lines[-1].endswith(b'\n'):
+        lines = lines[:-1]
+    return lines
+
+
+def line_key(line):
+    """Compares NC lines without their block numbers, which restart in every piece."""
+    return SEQUENCE_NUMBER.sub(b'', line.rstrip(b'\r\n'))
+
+
+def common_line_count(lines, others):
+    count = len(lines)
+    for other in others:
+        matched = 0
+        for line, other_line in zip(lines, other):
+            if line_key(line) != line_key(other_line):
+                break
+            matched += 1
+        count = min(count, matched)
+    return count
+
+
+def stitch_nc_files(nc_files, output_file, renumber=True):
+    """Joins the NC output of program pieces into one program.
+
+    The program header is the run of lines every piece starts with and the footer
+    the run every piece ends with (block numbers ignored); they are kept once, from
+    the first and the last piece. A post property that already suppressed them in
+    the middle pieces leaves nothing to remove. With renumber, block numbers
+    continue across the pieces with the start and increment of the first piece.
+    Returns {'header_lines', 'footer_lines', 'renumbered'}.
+    """
+    heads = [read_edge_lines(path) for path in nc_files]
+    tails = [read_edge_lines(path, from_end=True) for path in nc_files]
+    header_lines = common_line_count(heads[0], heads[1:])
+    footer_lines = common_line_count(tails[-1][::-1], [tail[::-1] for tail in tails[:-1]])
+
+    numbers = [int(match.group(1)) for match in map(SEQUENCE_NUMBER.match, heads[0]) if match][:2]
+    sequence = None
+    if renumber and len(numbers) == 2 and numbers[1] > numbers[0]:
+        sequence = [numbers[0], numbers[1] - numbers[0]]
+
+    try:
+        with open(output_file, 'wb') as out:
+            for index, path in enumerate(nc_files):
+                start = sum(map(len, heads[index][:header_lines])) if index > 0 else 0
+                end = os.path.getsize(path)
+                if index < len(nc_files) - 1 and footer_lines:
+                    end -= sum(map(len, tails[index][-footer_lines:]))
+                with open(path, 'rb') as src:
+                    if sequence:
+                        copy_renumbered(src, out, start, end, sequence)
+                    else:
+                        pipeline.copy_file_range(src, out, start, max(start, end))
+    except Exception:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+
+    return {'header_lines': header_lines, 'footer_lines': footer_lines, 'renumbered': bool(sequence)}
+
+
+def copy_renumbered(src, out, start, end, sequence):
+    """Copies lines [start, end) and rewrites their block numbers from sequence = [next number, increment]."""
+    src.seek(start)
+    position = start
+    while position < end:
+        line = src.readline()
+        if not line:
+            break
+        line = line[:end - position]
+        position += len(line)
+        match = SEQUENCE_NUMBER.match(line)
+        if match:
+            line = b'N%d%s' % (sequence[0], line[match.end(1):])
+            sequence[0] += sequence[1]
+        out.write(line)
+
+
+def split_post(xml_path, nc_file, post_exe_path, post_processor, properties=(), max_chunks=None, max_workers=None,
+               split_sections=False, header_property=None, footer_property=None, renumber=True,
+               timeout_base=60, timeout_per_mb=2, poll_interval=0.25, on_poll=None, cache=None, cache_key=None):
+    """Posts a merged XML as pieces run in parallel and stitches their output into nc_file.
+
+    Pieces are cut at tool changes (see plan_chunks). header_property and
+    footer_property name boolean post properties that are set to false for the
+    pieces that must not write the program start or end, where the post has such
+    properties. on_poll(nc_bytes) is called while the pieces run and may return
+    False to cancel. Temporary pieces are removed; the logs of a failed piece are
+    kept in the work folder.
+
+    With cache (an ArtifactCache) the NC output of every piece is stored under the
+    digest of its XML, cache_key (the post, post.exe and properties) and its place
+    in the program. Pieces found there are spliced in without running post.exe,
+    so after an edit only the changed pieces are posted again. Use max_chunks None
+    to keep the pieces stable between runs.
+
+    Returns a result dict whose status is 'ok', 'cancelled', 'unsplittable' (fewer
+    than two pieces: post the program serially instead) or an error description.
+    """
+    start_time = time.time()
+    stem = os.path.splitext(nc_file)[0]
+    work_folder = f"{stem}_parts"
+    pool = PostProcessPool(max_workers)
+    if not cache:
+        max_chunks = max_chunks or pool.max_workers
+    result = {'status': 'pending', 'chunks': 0, 'cached': 0, 'seconds': 0.0, 'post_seconds': 0.0, 'xml_sizes': [],
+              'stitch': None, 'work_folder': work_folder}
+
+    xml_parts = split_xml(xml_path, work_folder, max_chunks, split_sections)
+    if xml_parts == [xml_path]:
+        result['status'] = 'unsplittable'
+        shutil.rmtree(work_folder, ignore_errors=True)
+        return result
+
+    jobs = []
+    for index, xml_part in enumerate(xml_parts):
+        part = os.path.splitext(xml_part)[0]
+        extra = []
+        if header_property and index > 0:
+            extra.extend(["--property", header_property, "false"])
+        if footer_property and index < len(xml_parts) - 1:
+            extra.extend(["--property", footer_property, "false"])
+        xml_size = os.path.getsize(xml_part)
+        result['xml_sizes'].append(xml_size)
+        job = {'xml': xml_part, 'nc': f"{part}.nc", 'log': f"{part}.log", 'stdout': f"{part}_stdout.log",
+               'run': None, 'key': None}
+        jobs.append(job)
+
+        if cache:
+            job['key'] = make_key('section', file_digest(xml_part), cache_key, extra)
+            if cache.get('section', job['key'], job['nc']):
+                result['cached'] += 1
+                continue
+        params = pipeline.build_post_command(post_exe_path, post_processor, xml_part, job['nc'],
+                                             list(properties) + extra, job['log'])
+        run = PostProcessRun(params, job['stdout'], pipeline.post_timeout(xml_size, timeout_base, timeout_per_mb),
+                             poll_interval)
+        job['run'] = pool.submit(run)
+    result['chunks'] = len(jobs)
+
+    cancelled = False
+    while pool.poll(poll_interval):
+        if on_poll and not cancelled:
+            written = sum(os.path.getsize(job['nc']) for job in jobs if os.path.exists(job['nc']))
+            if on_poll(written) is False:
+                cancelled = True
+                pool.cancel()
+    result['post_seconds'] = time.time() - start_time
+
+    failed = None
+    for index, job in enumerate(jobs):
+        status = pipeline.describe_run(job['run']) if job['run'] else 'ok'
+        if status == 'ok' and not os.path.exists(job['nc']):
+            status = "error: output NC file was not created"
+        if status != 'ok':
+            failed = (index, status)
+            break
+
+    try:
+        if cancelled:
+            result['status'] = 'cancelled'
+        elif failed:
+            result['status'] = f"piece {failed[0] + 1} of {len(jobs)} {failed[1]}"
+        else:
+            result['stitch'] = stitch_nc_files([job['nc'] for job in jobs], nc_file, renumber)
+            result['status'] = 'ok'
+            for job in jobs:
+                if job['key'] and job['run']:
+                    cache.put('section', job['key'], job['nc'])
+    finally:
+        for index, job in enumerate(jobs):
+            kept = (job['log'], job['stdout']) if failed and not cancelled and index == failed[0] else ()
+            for path in (job['xml'], job['nc'], job['log'], job['stdout']):
+                if path not in kept and os.path.exists(path):
+                    os.remove(path)
+        if not os.listdir(work_folder):
+            os.rmdir(work_folder)
+
+    result['seconds'] = time.time() - start_time
+    return result
+
+
+def compare_nc_files(path_a, path_b, ignore=None):
+    """Compares two NC files line by line, ignoring line endings and lines that match the ignore regex in both.
+
+    Returns None when they match, else (line number, line of a, line of b).
+    """
+    pattern = re.compile(ignore.encode() if isinstance(ignore, str) else ignore) if ignore else None
+    with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+        for number, (line_a, line_b) in enumerate(zip_longest(a, b), 1):
+            line_a = line_a.rstrip(b'\r\n') if line_a is not None else None
+            line_b = line_b.rstrip(b'\r\n') if line_b is not None else None
+            if line_a == line_b:
+                continue
+            if pattern and line_a is not None and line_b is not None and pattern.search(line_a) and pattern.search(line_b):
+                continue
+            return (number,
+                    line_a.decode('latin-1') if line_a is not None else None,
+                    line_b.decode('latin-1') if line_b is not None else None)
+    return None
+
+
+def verify_split_post(xml_path, nc_file, post_exe_path, post_processor, properties=(), ignore=None,
+                      timeout_base=60, timeout_per_mb=2, **split_options):
+    """Posts a merged XML in pieces to nc_file and serially to <name>.serial.nc, then compares the two.
+
+    Meant for sample programs, to check that a post gives identical output when
+    split before enabling the split post for it. Both NC files are kept.
+    Returns {'match', 'difference', 'serial_seconds', 'serial_nc', 'split'}.
+    """
+    stem = os.path.splitext(nc_file)[0]
+    serial_nc = f"{stem}.serial.nc"
+    serial_log = f"{stem}.serial.log"
+
+    params = pipeline.build_post_command(post_exe_path, post_processor, xml_path, serial_nc, properties, serial_log)
+    run = PostProcessRun(params, f"{stem}.serial_stdout.log",
+                         pipeline.post_timeout(os.path.getsize(xml_path), timeout_base, timeout_per_mb))
+    try:
+        run.start()
+    except OSError:
+        pass  # Recorded in run.error
+    run.wait()
+    status = pipeline.describe_run(run)
+    if status != 'ok':
+        raise RuntimeError(f"Serial post {status}, see {serial_log}")
+    for path in (serial_log, f"{stem}.serial_stdout.log"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    split = split_post(xml_path, nc_file, post_exe_path, post_processor, properties,
+                       timeout_base=timeout_base, timeout_per_mb=timeout_per_mb, **split_options)
+    difference = compare_nc_files(serial_nc, nc_file, ignore) if split['status'] == 'ok' else None
+    return {
+        'match': split['status'] == 'ok' and difference is None,
+        'difference': difference,
+        'serial_seconds': run.elapsed,
+        'serial_nc': serial_nc,
+        'split': split,
+    }
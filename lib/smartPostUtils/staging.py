@@ -0,0 +1,170 @@
+import os
+import time
+import errno
+import shutil
+import hashlib
+import threading
+
+# Name of the lock file that marks a workspace as in use by a running process
+LOCK_FILE_NAME = '.lock'
+
+# Workspaces without a lock file (a crash before it was created) are removed after this many seconds
+UNLOCKED_MAX_AGE = 3600
+
+
+def lock_file(file):
+    """Takes an exclusive, non-blocking lock on an open file, returns False when another process holds it.
+
+    The operating system releases the lock when the process ends, however it ends.
+    """
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class StagingWorkspace:
+    """Private scratch folder for the temporary files of one post run.
+
+    Per-operation and merged XML, logs and the NC file are written here, on a fast
+    local disk, and only the finished NC file is published to the output folder.
+    The workspace holds a lock on its lock file while it is open, so
+    clean_stale_workspaces can tell the folders of crashed runs from those still in
+    use and remove them.
+    """
+
+    def __init__(self, root, prefix='run'):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.path = os.path.join(root, f"{prefix}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{id(self):x}")
+        os.makedirs(self.path)
+        self._lock = open(os.path.join(self.path, LOCK_FILE_NAME), 'a+')
+        if not lock_file(self._lock):
+            self._lock.close()
+            raise OSError(f"Could not lock the staging folder {self.path}")
+
+    def file_path(self, name):
+        return os.path.join(self.path, name)
+
+    def close(self):
+        """Removes the workspace and everything left in it."""
+        if self._lock:
+            self._lock.close()
+            self._lock = None
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def clean_stale_workspaces(root, unlocked_max_age=UNLOCKED_MAX_AGE):
+    """Removes the workspaces of runs that ended without cleaning up, e.g. after a crash. Returns their paths."""
+    removed = []
+    if not os.path.isdir(root):
+        return removed
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        lock_path = os.path.join(path, LOCK_FILE_NAME)
+        if os.path.exists(lock_path):
+            try:
+                with open(lock_path, 'a+') as lock:
+                    if not lock_file(lock):
+                        continue  # Still in use
+            except OSError:
+                continue
+        elif time.time() - os.path.getmtime(path) < unlocked_max_age:
+            continue  # Possibly being created right now
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def publish_file(src, dst, chunk_size=1024 * 1024):
+    """Moves a finished file to its destination so that dst never exists partially written.
+
+    On the same volume this is an atomic rename. Otherwise (e.g. a network share)
+    the file is copied to a temporary name next to dst, flushed to disk, checked
+    against the source by size and SHA-1 and then renamed over dst; the source is
+    removed afterwards. Returns 'renamed' or 'copied'.
+    """
+    dst_dir = os.path.dirname(dst)
+    if dst_dir:
+        os.makedirs(dst_dir, exist_ok=True)
+    try:
+        os.replace(src, dst)
+        return 'renamed'
+    except OSError as e:
+        # Other volume, or the source is still open elsewhere (Windows refuses to move it then)
+        if e.errno not in (errno.EXDEV, errno.EACCES, errno.EPERM) and getattr(e, 'winerror', None) not in (17, 32):
+            raise
+
+    partial = f"{dst}.partial"
+    try:
+        digest = hashlib.sha1()
+        with open(src, 'rb') as source, open(partial, 'wb') as target:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                target.write(chunk)
+                digest.update(chunk)
+            target.flush()
+            os.fsync(target.fileno())
+        if os.path.getsize(partial) != os.path.getsize(src) or file_digest(partial, chunk_size) != digest.hexdigest():
+            raise IOError(f"Copy of {os.path.basename(src)} to {dst_dir} does not match the original")
+        os.replace(partial, dst)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    try:
+        os.remove(src)
+    except OSError:
+        pass  # Still open, e.g. by a DNC transfer; removed with its workspace
+    return 'copied'
+
+
+class PublishJob:
+    """Runs publish_file on a background thread, so a slow network copy does not block the caller."""
+
+    def __init__(self, src, dst, chunk_size=1024 * 1024):
+        self.src = src
+        self.dst = dst
+        self.chunk_size = chunk_size
+        self.method = None
+        self.error = None
+        self._done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='PublishJob', daemon=True).start()
+        return self
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds and returns True once the file is published (or failed)."""
+        return self._done.wait(timeout)
+
+    def _run(self):
+        try:
+            self.method = publish_file(self.src, self.dst, self.chunk_size)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
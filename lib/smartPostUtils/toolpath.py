@@ -0,0 +1,361 @@
+import os
+import re
+import json
+from array import array
+from xml.sax.saxutils import unescape
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Move kinds stored in Toolpath.kinds
+MOVE_RAPID = 0
+MOVE_LINEAR = 1
+MOVE_ARC_CW = 2
+MOVE_ARC_CCW = 3
+MOVE_CIRCULAR = 4
+
+MOVE_TAGS = {
+    b'rapid': MOVE_RAPID,
+    b'rapid5d': MOVE_RAPID,
+    b'linear': MOVE_LINEAR,
+    b'linear5d': MOVE_LINEAR,
+    b'arc-cw': MOVE_ARC_CW,
+    b'arc-ccw': MOVE_ARC_CCW,
+    b'circular': MOVE_CIRCULAR,
+}
+ARC_KINDS = (MOVE_ARC_CW, MOVE_ARC_CCW, MOVE_CIRCULAR)
+
+# Version of the binary cache layout written by Toolpath.save
+CACHE_FORMAT_VERSION = 1
+
+# Moves whose number text is buffered before it is converted to typed arrays
+BATCH_MOVES = 65536
+
+ELEMENT_PATTERN = re.compile(rb"<([\w-]+)")
+ATTRIBUTE_PATTERN = re.compile(rb"([\w-]+)='([^']*)'")
+
+# <tool> attributes kept as section metadata, converted to float where possible
+TOOL_ATTRIBUTES = ('type', 'number', 'diameter', 'corner-radius', 'flute-length', 'spindle-rpm', 'coolant')
+
+
+def require_numpy():
+    """Raises a clear error when the optional NumPy dependency is missing."""
+    if np is None:
+        raise ImportError("NumPy is required for toolpath analysis. Install it into Fusion's Python "
+                          "or run the analysis from a Python environment that has it.")
+
+
+class Toolpath:
+    """Columnar toolpath parsed from xml.cps intermediate XML.
+
+    Every move is one row in typed arrays instead of a Python object:
+    positions (float64 x, y, z end point), feeds (float32, modal feed carried
+    forward, NaN for rapids), kinds (uint8 MOVE_* code) and move_sections
+    (uint32 section index). Arcs additionally have one row in the arc table
+    (arc_rows, arc_centers, arc_normals, arc_sweeps; sweep is NaN when the
+    XML omits it). sections holds the <tool>/<context> metadata and the total
+    dwell seconds per section. 5-axis moves are stored by their tool tip position.
+    """
+
+    def __init__(self, positions, feeds, kinds, move_sections, arc_rows, arc_centers,
+                 arc_normals, arc_sweeps, sections, source=None):
+        self.positions = positions
+        self.feeds = feeds
+        self.kinds = kinds
+        self.move_sections = move_sections
+        self.arc_rows = arc_rows
+        self.arc_centers = arc_centers
+        self.arc_normals = arc_normals
+        self.arc_sweeps = arc_sweeps
+        self.sections = sections
+        self.source = source or {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def nbytes(self):
+        """Memory used by the move and arc arrays."""
+        return sum(column.nbytes for column in (
+            self.positions, self.feeds, self.kinds, self.move_sections,
+            self.arc_rows, self.arc_centers, self.arc_normals, self.arc_sweeps
+        ))
+
+    def start_positions(self):
+        """Start point of every move (the previous end point, NaN for the first move)."""
+        starts = np.empty_like(self.positions)
+        starts[0] = np.nan
+        starts[1:] = self.positions[:-1]
+        return starts
+
+    def section_moves(self, section_index):
+        """Returns the row range (start, stop) of a section's moves."""
+        start = self.sections[section_index]['first_move']
+        stop = self.sections[section_index + 1]['first_move'] if section_index + 1 < len(self.sections) else len(self)
+        return start, stop
+
+    def save(self, cache_path):
+        """Writes the toolpath to a binary .npz cache file."""
+        temp_path = f"{cache_path}.tmp.npz"
+        np.savez(
+            temp_path,
+            version=np.array(CACHE_FORMAT_VERSION),
+            positions=self.positions,
+            feeds=self.feeds,
+            kinds=self.kinds,
+            move_sections=self.move_sections,
+            arc_rows=self.arc_rows,
+            arc_centers=self.arc_centers,
+            arc_normals=self.arc_normals,
+            arc_sweeps=self.arc_sweeps,
+            sections=np.array(json.dumps(self.sections)),
+            source=np.array(json.dumps(self.source))
+        )
+        os.replace(temp_path, cache_path)
+
+    @classmethod
+    def load(cls, cache_path):
+        """Reads a toolpath written by save."""
+        require_numpy()
+        with np.load(cache_path, allow_pickle=False) as data:
+            if int(data['version']) != CACHE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported toolpath cache version in {cache_path}")
+            return cls(
+                data['positions'], data['feeds'], data['kinds'], data['move_sections'],
+                data['arc_rows'], data['arc_centers'], data['arc_normals'], data['arc_sweeps'],
+                json.loads(str(data['sections'])), json.loads(str(data['source']))
+            )
+
+    @classmethod
+    def parse(cls, xml_path):
+        """Parses an xml.cps intermediate file incrementally, one element line at a time."""
+        require_numpy()
+        builder = ToolpathBuilder()
+        with open(xml_path, 'rb') as f:
+            for line in f:
+                builder.feed_line(line)
+        return builder.build(source=describe_source(xml_path))
+
+
+class GrowingArray:
+    """One-dimensional typed array that is extended in place, batch by batch."""
+
+    def __init__(self, dtype):
+        self.values = np.empty(0, dtype=dtype)
+        self.count = 0
+
+    def extend(self, values):
+        end = self.count + len(values)
+        if end > len(self.values):
+            self.values.resize(max(end, len(self.values) * 3 // 2), refcheck=False)
+        self.values[self.count:end] = values
+        self.count = end
+
+    def finish(self):
+        """Trims the spare capacity and returns the values."""
+        self.values.resize(self.count, refcheck=False)
+        return self.values
+
+
+class ToolpathBuilder:
+    """Accumulates moves while the XML is read and converts them to typed arrays.
+
+    Numbers are kept as their XML text in byte buffers and parsed in bulk by NumPy
+    every BATCH_MOVES moves, which keeps the per-line work to a split and a few
+    appends and the memory to the typed arrays plus one batch of text.
+    """
+
+    def __init__(self):
+        self.positions = bytearray()
+        self.feeds = bytearray()
+        self.kinds = array('B')
+        self.arc_rows = array('q')
+        self.arc_centers = bytearray()
+        self.arc_normals = bytearray()
+        self.arc_sweeps = bytearray()
+        # Typed arrays the text buffers above are converted into, with the buffer each one is filled from
+        self.columns = {
+            'positions': (self.positions, GrowingArray(np.float64)),
+            'feeds': (self.feeds, GrowingArray(np.float32)),
+            'arc_centers': (self.arc_centers, GrowingArray(np.float64)),
+            'arc_normals': (self.arc_normals, GrowingArray(np.float32)),
+            'arc_sweeps': (self.arc_sweeps, GrowingArray(np.float32)),
+        }
+        self.sections = []
+        self.pending = {}
+        self.in_tool = False
+
+    def feed_line(self, line):
+        # xml.cps writes one element per line, starting at the first column
+        if line[:1] != b'<':
+            return
+        end = line.find(b' ')
+        tag = line[1:end] if end > 0 else line[1:].rstrip().rstrip(b'/>')
+
+        kind = MOVE_TAGS.get(tag)
+        if kind is not None:
+            self.add_move(kind, line)
+        elif tag == b'/tool':
+            self.in_tool = False
+        elif self.in_tool:
+            pass  # Holder <section> elements
+        elif tag == b'section':
+            self.start_section()
+        elif tag == b'dwell':
+            if not self.sections:
+                self.start_section()
+            self.sections[-1]['dwell'] += float(line.split(b"'")[1])
+        elif tag == b'tool':
+            attributes = dict(ATTRIBUTE_PATTERN.findall(line))
+            self.pending['tool'] = {name: to_number(attributes.get(name.encode(), b''))
+                                    for name in TOOL_ATTRIBUTES}
+            self.in_tool = not line.rstrip().endswith(b'/>')
+        elif tag == b'context':
+            attributes = dict(ATTRIBUTE_PATTERN.findall(line))
+            self.pending['unit'] = attributes.get(b'unit', b'millimeters').decode()
+            self.pending['work_offset'] = to_number(attributes.get(b'work-offset', b'0'))
+            self.pending['origin'] = [float(v) for v in attributes.get(b'origin', b'0 0 0').split()]
+        elif tag == b'parameter':
+            attributes = dict(ATTRIBUTE_PATTERN.findall(line))
+            if attributes.get(b'name') == b'operation-comment':
+                self.pending['comment'] = unescape(attributes.get(b'value', b'').decode('utf-8'),
+                                                   {'&apos;': "'", '&quot;': '"'})
+
+    def start_section(self):
+        section = {'first_move': len(self.kinds), 'tool': None, 'unit': None,
+                   'work_offset': None, 'origin': None, 'comment': None, 'dwell': 0.0}
+        if self.sections:
+            # Tool and context carry over when a section does not repeat them
+            previous = self.sections[-1]
+            section.update({key: previous[key] for key in ('tool', 'unit', 'work_offset', 'origin')})
+        section.update(self.pending)
+        self.sections.append(section)
+        self.pending = {}
+
+    def add_move(self, kind, line):
+        if not self.sections:
+            self.start_section()
+        # <tag to='x y z' name='value' .../> splits into names at even and values at odd indices
+        parts = line.split(b"'")
+        self.positions += parts[1]
+        self.positions += b' '
+
+        if len(parts) > 3:
+            attributes = dict(zip(parts[2::2], parts[3::2]))
+            self.feeds += attributes.get(b' feed=', b'nan')
+            if kind != MOVE_RAPID and kind != MOVE_LINEAR:
+                self.arc_rows.append(len(self.kinds))
+                self.arc_centers += attributes[b' center=']
+                self.arc_centers += b' '
+                self.arc_normals += attributes.get(b' normal=', b'0 0 1')
+                self.arc_normals += b' '
+                self.arc_sweeps += attributes.get(b' sweep=', b'nan')
+                self.arc_sweeps += b' '
+        else:
+            self.feeds += b'nan'
+        self.feeds += b' '
+        self.kinds.append(kind)
+        if len(self.kinds) % BATCH_MOVES == 0:
+            self.flush()
+
+    def flush(self):
+        """Converts the buffered number text of all columns to typed arrays."""
+        for text, column in self.columns.values():
+            column.extend(parse_numbers(text, column.values.dtype))
+            text.clear()
+
+    def column(self, name):
+        return self.columns[name][1].finish()
+
+    def build(self, source=None):
+        self.flush()
+        kinds = np.frombuffer(self.kinds, dtype=np.uint8).copy()
+        count = len(kinds)
+        first_moves = np.array([section['first_move'] for section in self.sections], dtype=np.int64)
+        move_sections = np.repeat(np.arange(len(first_moves), dtype=np.uint32),
+                                  np.diff(np.append(first_moves, count)))
+
+        # Feed is modal: carry the last programmed value forward until a rapid or a new section
+        feeds = self.column('feeds')
+        rapid = kinds == MOVE_RAPID
+        defined = ~np.isnan(feeds) | rapid
+        defined[first_moves[first_moves < count]] = True
+        source_rows = np.arange(count)
+        source_rows[~defined] = 0
+        np.maximum.accumulate(source_rows, out=source_rows)
+        feeds = feeds[source_rows]
+        feeds[rapid] = np.nan
+
+        return Toolpath(
+            self.column('positions').reshape(-1, 3),
+            feeds,
+            kinds,
+            move_sections,
+            np.frombuffer(self.arc_rows, dtype=np.int64).copy(),
+            self.column('arc_centers').reshape(-1, 3),
+            self.column('arc_normals').reshape(-1, 3),
+            self.column('arc_sweeps'),
+            self.sections,
+            source
+        )
+
+
+def parse_numbers(text, dtype):
+    """Parses whitespace separated numbers from a byte buffer into a typed array."""
+    if not text.strip():
+        return np.empty(0, dtype=dtype)
+    return np.fromstring(text.decode('ascii'), dtype=np.float64, sep=' ').astype(dtype, copy=False)
+
+
+def to_number(value):
+    """Converts an attribute value to float when it is numeric, otherwise returns the text (None when empty)."""
+    text = value.decode('utf-8') if isinstance(value, bytes) else value
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def describe_source(xml_path):
+    """Identifies an XML file by path, size and modification time."""
+    stat = os.stat(xml_path)
+    return {'path': os.path.abspath(xml_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_toolpath(xml_path, cache_path=None, digest=None):
+    """Returns the toolpath of an intermediate XML, reusing a binary cache of the same file.
+
+    Arguments:
+    xml_path -- The xml.cps intermediate (or merged) file.
+    cache_path -- Where to keep the binary cache. Defaults to <xml_path>.toolpath.npz.
+                  Pass False to disable caching.
+    digest -- Content digest of xml_path (see file_digest). When given, the cache is matched
+              by content instead of size and modification time, so it also fits a rewritten copy.
+    """
+    require_numpy()
+    if cache_path is None:
+        cache_path = f"{xml_path}.toolpath.npz"
+
+    source = describe_source(xml_path)
+    if digest:
+        source['digest'] = digest
+    if cache_path and os.path.exists(cache_path):
+        try:
+            toolpath = Toolpath.load(cache_path)
+            if digest:
+                if toolpath.source.get('digest') == digest:
+                    return toolpath
+            elif (toolpath.source.get('size'), toolpath.source.get('mtime')) == (source['size'], source['mtime']):
+                return toolpath
+        except (OSError, ValueError, KeyError):
+            pass
+
+    toolpath = Toolpath.parse(xml_path)
+    toolpath.source = source
+    if cache_path:
+        toolpath.save(cache_path)
+    return toolpath